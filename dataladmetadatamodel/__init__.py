@@ -12,19 +12,24 @@ JSONObject = Union[
 ]
 
 
-version = 2
+version = 3
 version_minor = 0
 version_string = f"{version}.{version_minor}"
 
+# Versions of stored objects that can be read. Version 3 stores metadata
+# blobs without an intermediate reference blob, and references without
+# type- and version-headers.
+supported_version_strings = ("2.0", version_string)
+
 
 def check_serialized_version(json_object: JSONObject):
     stored_class = json_object["@"]["type"]
     stored_version = json_object["@"]["version"]
-    if stored_version != version_string:
+    if stored_version not in supported_version_strings:
         raise ValueError(
             f"Unsupported metadata version ({stored_version}) in "
             f"stored {stored_class} object, expected version: "
-            f"{version_string}")
+            f"{' or '.join(supported_version_strings)}")
 
 
 from ._version import get_versions
@@ -38,11 +38,18 @@ class DatasetTree(MTreeProxy):
                                 path / datalad_root_record_name)
 
     def get_metadata_root_record(self,
-                                 path: MetadataPath
+                                 path: MetadataPath,
+                                 direct_lookup: bool = False
                                  ) -> Optional[MetadataRootRecord]:
-
+        """
+        Return the metadata root record of the dataset at path. If
+        direct_lookup is True, unmapped intermediate nodes are not
+        mapped in, and the returned record is not connected to this
+        tree, see MTreeNode.get_object_at_path.
+        """
         mrr = self.mtree.get_object_at_path(
-            path / datalad_root_record_name)
+            path / datalad_root_record_name,
+            direct_lookup)
 
         if mrr is None:
             return None
@@ -56,7 +63,7 @@ class DatasetTree(MTreeProxy):
                       ) -> List[Tuple[MetadataPath, MetadataRootRecord]]:
         return [
             (
-                MetadataPath("/".join(path.parts[:-1])),
+                path.parent,
                 cast(MetadataRootRecord, node)
             )
             for path, node in self.mtree.get_paths_recursive()
@@ -33,11 +33,22 @@ class FileTree(MTreeProxy):
 
         self.mtree.add_child_at(metadata, path)
 
+    def add_metadata_many(self,
+                          metadata_items: Iterable[Tuple[MetadataPath, Metadata]]):
+        """ Add multiple metadata objects at their paths at once """
+        self.mtree.add_children_at(metadata_items)
+
     def get_metadata(self,
-                     path: MetadataPath
+                     path: MetadataPath,
+                     direct_lookup: bool = False
                      ) -> Optional[Metadata]:
-
-        metadata = self.mtree.get_object_at_path(path)
+        """
+        Return the metadata at path. If direct_lookup is True, unmapped
+        intermediate nodes are not mapped in, and the returned metadata
+        object is not connected to this tree, see
+        MTreeNode.get_object_at_path.
+        """
+        metadata = self.mtree.get_object_at_path(path, direct_lookup)
 
         if metadata is None:
             return None
@@ -9,6 +9,10 @@ from typing import (
 )
 
 from dataladmetadatamodel.log import logger
+from dataladmetadatamodel.memorybudget import (
+    object_mapped,
+    object_purged,
+)
 from dataladmetadatamodel.modifiableobject import ModifiableObject
 from dataladmetadatamodel.mapper.reference import Reference
 
@@ -30,6 +34,12 @@ class MappableObject(ModifiableObject, metaclass=ABCMeta):
     Base class for objects that can be mapped onto a
     storage backend.
     """
+
+    __slots__ = ("realm", "reference", "mapped")
+
+    # Estimated memory size of a mapped object in bytes
+    base_size = 512
+
     def __init__(self,
                  realm: Optional[str] = None,
                  reference: Optional[Reference] = None):
@@ -88,47 +98,43 @@ class MappableObject(ModifiableObject, metaclass=ABCMeta):
                 backend_type: str = "git"
                 ) -> "MappableObject":
 
-        from dataladmetadatamodel.mapper import get_mapper
+        from dataladmetadatamodel.mapper.mapper import read_in_many
 
-        if self.mapped is False:
+        read_in_many([self], backend_type)
+        return self
 
-            assert self.realm is not None
-            assert self.reference is not None
+    def needs_map_in(self) -> bool:
+        """
+        Check whether the object has to be mapped in by a mapper.
+        Unmapped objects with a None-reference are handled here.
+        """
+        if self.mapped is True:
+            logger.debug(
+                f"read_in({self}): not needed, object is already mapped")
+            return False
 
-            # If the reference is a None-reference,
-            # we can handle this here.
-            if self.reference.is_none_reference():
-                assert self.reference.class_name == type(self).__name__
-                logger.warning(f"read_in({self}): None-reference in {self}")
-                self.purge_impl()
-                return self
+        assert self.realm is not None
+        assert self.reference is not None
 
-            # Ensure that the object is saved on the given realm
-            if not self.is_saved_on(self.realm):
-                logger.error(
-                    f"read_in({self}): trying to overwrite a modified object")
-                raise RuntimeError(
-                    "read_in({self}): tried to read over a modified object")
-
-            # The object is not mapped, but saved on self.realm,
-            # use the mappable object-specific mapper to read
-            # the object in.
-            get_mapper(
-                type(self).__name__,
-                backend_type).map_in(
-                    self,
-                    self.realm,
-                    self.reference)
-
-            # Mark the object as mapped.
-            self.mapped = True
-
-        else:
+        # If the reference is a None-reference,
+        # we can handle this here.
+        if self.reference.is_none_reference():
+            assert self.reference.class_name == type(self).__name__
+            logger.warning(f"read_in({self}): None-reference in {self}")
+            self.purge_impl()
+            return False
 
-            logger.debug(
-                f"read_in({self}): not needed, object is already mapped")
+        # Ensure that the object is saved on the given realm
+        if not self.is_saved_on(self.realm):
+            logger.error(
+                f"read_in({self}): trying to overwrite a modified object")
+            raise RuntimeError(
+                "read_in({self}): tried to read over a modified object")
 
-        return self
+        # The object is not mapped, but saved on self.realm,
+        # the mappable object-specific mapper has to read
+        # the object in.
+        return True
 
     def write_out(self,
                   destination_realm: Optional[str] = None,
@@ -194,6 +200,7 @@ class MappableObject(ModifiableObject, metaclass=ABCMeta):
                 force_write)
 
         self.set_saved_on(destination_realm)
+        object_mapped(self)
 
         assert isinstance(self.reference, Reference), \
             f"write_out({self}): object {self} has no valid " \
@@ -210,6 +217,8 @@ class MappableObject(ModifiableObject, metaclass=ABCMeta):
 
             self.purge_impl()
             self.mapped = False
+            self.invalidate_saved_status()
+            object_purged(self)
 
     def ensure_mapped(self,
                       backend_type="git") -> bool:
@@ -217,8 +226,17 @@ class MappableObject(ModifiableObject, metaclass=ABCMeta):
             self.read_in(backend_type)
             self.mapped = True
             return True
+        object_mapped(self)
         return False
 
+    def estimated_size(self) -> int:
+        """
+        Return a coarse estimate of the memory that the mapped object
+        uses, not including mapped sub-objects. It is used to enforce
+        memory budgets, see dataladmetadatamodel.memorybudget.
+        """
+        return self.base_size
+
     def deepcopy(self,
                  new_mapper_family: Optional[str] = None,
                  new_destination: Optional[str] = None,
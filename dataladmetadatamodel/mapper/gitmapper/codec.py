@@ -0,0 +1,277 @@
+"""
+Codecs for JSON-objects that are stored in blobs
+
+Metadata, version lists, and metadata root records are JSON-objects.
+A codec encodes them into the content of a blob, and decodes them from
+the content of a blob. The codec that is used for writing is selected
+with DATALAD_METADATAMODEL_CODEC or with set_codec(), JSON is the
+default. Blobs are decoded with the codec that wrote them:
+
+- JSON blobs are untagged, i.e. they start with "{" or "[".
+- All other codecs tag their blobs with a prefix that starts with a
+  NUL-byte, which never starts a JSON text.
+
+Additional codecs can be added with register_codec().
+"""
+import json
+import os
+import struct
+from typing import (
+    Dict,
+    List,
+    Tuple,
+)
+
+from dataladmetadatamodel import JSONObject
+
+
+class Codec:
+    """ Base class of codecs """
+    name: str = ""
+    tag: bytes = b""
+
+    def encode(self, json_object: JSONObject) -> bytes:
+        raise NotImplementedError
+
+    def decode(self, content: bytes) -> JSONObject:
+        raise NotImplementedError
+
+
+class JSONCodec(Codec):
+    name = "json"
+    tag = b""
+
+    def encode(self, json_object: JSONObject) -> bytes:
+        return json.dumps(json_object).encode()
+
+    def decode(self, content: bytes) -> JSONObject:
+        return json.loads(content)
+
+
+# Type codes of the compact codec, similar to MessagePack. Integers in
+# 0..127 are stored in a single byte.
+_NONE = 0xc0
+_FALSE = 0xc2
+_TRUE = 0xc3
+_FLOAT = 0xcb
+_INT = 0xd0
+_STR = 0xd9
+_STR_REF = 0xda
+_LIST = 0xdc
+_DICT = 0xde
+
+_double = struct.Struct(">d")
+
+
+def _encode_key(key) -> str:
+    # Convert keys like json.dumps does
+    if isinstance(key, str):
+        return key
+    return json.dumps(key)
+
+
+class CompactCodec(Codec):
+    """
+    A compact binary encoding of JSON-objects. Unsigned integers are
+    stored as variable-length integers, signed integers are zigzag-
+    encoded, floats are stored as 8-byte doubles. Every string is stored
+    once per blob, repeated strings, e.g. keys and type headers, are
+    stored as the index of their first occurrence.
+    """
+    name = "compact"
+    tag = b"\x00DLC\x01"
+
+    def encode(self, json_object: JSONObject) -> bytes:
+        output = bytearray(self.tag)
+        self._encode(json_object, output, dict())
+        return bytes(output)
+
+    def decode(self, content: bytes) -> JSONObject:
+        if not content.startswith(self.tag):
+            raise ValueError("content is not encoded by the compact codec")
+        json_object, position = self._decode(content, len(self.tag), [])
+        if position != len(content):
+            raise ValueError(
+                f"unexpected data at position {position} of "
+                f"compact encoded content")
+        return json_object
+
+    def _encode(self,
+                json_object: JSONObject,
+                output: bytearray,
+                strings: Dict[str, int]):
+
+        if isinstance(json_object, str):
+            self._encode_str(json_object, output, strings)
+        elif isinstance(json_object, dict):
+            output.append(_DICT)
+            _encode_varint(len(json_object), output)
+            for key, value in json_object.items():
+                self._encode_str(_encode_key(key), output, strings)
+                self._encode(value, output, strings)
+        elif isinstance(json_object, (list, tuple)):
+            output.append(_LIST)
+            _encode_varint(len(json_object), output)
+            for value in json_object:
+                self._encode(value, output, strings)
+        elif json_object is None:
+            output.append(_NONE)
+        elif json_object is True:
+            output.append(_TRUE)
+        elif json_object is False:
+            output.append(_FALSE)
+        elif isinstance(json_object, int):
+            if 0 <= json_object < 0x80:
+                output.append(json_object)
+            else:
+                output.append(_INT)
+                _encode_varint(
+                    json_object * 2 if json_object >= 0
+                    else -json_object * 2 - 1,
+                    output)
+        elif isinstance(json_object, float):
+            output.append(_FLOAT)
+            output += _double.pack(json_object)
+        else:
+            raise TypeError(
+                f"Object of type {type(json_object).__name__} is not "
+                f"JSON serializable")
+
+    @staticmethod
+    def _encode_str(value: str,
+                    output: bytearray,
+                    strings: Dict[str, int]):
+
+        index = strings.get(value, None)
+        if index is not None:
+            output.append(_STR_REF)
+            _encode_varint(index, output)
+        else:
+            strings[value] = len(strings)
+            encoded_value = value.encode()
+            output.append(_STR)
+            _encode_varint(len(encoded_value), output)
+            output += encoded_value
+
+    def _decode(self,
+                content: bytes,
+                position: int,
+                strings: List[str]) -> Tuple[JSONObject, int]:
+
+        type_code = content[position]
+        position += 1
+
+        if type_code < 0x80:
+            return type_code, position
+        if type_code == _STR_REF:
+            index, position = _decode_varint(content, position)
+            return strings[index], position
+        if type_code == _STR:
+            size, position = _decode_varint(content, position)
+            value = content[position:position + size].decode()
+            strings.append(value)
+            return value, position + size
+        if type_code == _DICT:
+            size, position = _decode_varint(content, position)
+            result = dict()
+            for _ in range(size):
+                key, position = self._decode(content, position, strings)
+                result[key], position = self._decode(content, position, strings)
+            return result, position
+        if type_code == _LIST:
+            size, position = _decode_varint(content, position)
+            result = [None] * size
+            for index in range(size):
+                result[index], position = self._decode(content, position, strings)
+            return result, position
+        if type_code == _INT:
+            value, position = _decode_varint(content, position)
+            return (value >> 1 if value & 1 == 0 else -(value >> 1) - 1), position
+        if type_code == _FLOAT:
+            return _double.unpack_from(content, position)[0], position + 8
+        if type_code == _NONE:
+            return None, position
+        if type_code == _TRUE:
+            return True, position
+        if type_code == _FALSE:
+            return False, position
+
+        raise ValueError(
+            f"unknown type code 0x{type_code:02x} at position "
+            f"{position - 1} of compact encoded content")
+
+
+def _encode_varint(value: int, output: bytearray):
+    while value >= 0x80:
+        output.append((value & 0x7f) | 0x80)
+        value >>= 7
+    output.append(value)
+
+
+def _decode_varint(content: bytes, position: int) -> Tuple[int, int]:
+    value = 0
+    shift = 0
+    while True:
+        byte = content[position]
+        position += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+codecs: Dict[str, Codec] = dict()
+
+
+def register_codec(codec: Codec):
+    if codec.name in codecs:
+        raise ValueError(f"codec {codec.name} is already registered")
+    if codec.name != JSONCodec.name and not codec.tag.startswith(b"\x00"):
+        raise ValueError(
+            f"tag of codec {codec.name} does not start with a NUL-byte: "
+            f"{codec.tag}")
+    if any(
+            codec.tag.startswith(other.tag) or other.tag.startswith(codec.tag)
+            for other in codecs.values()
+            if other.name != JSONCodec.name):
+        raise ValueError(
+            f"tag of codec {codec.name} is not distinguishable: {codec.tag}")
+    codecs[codec.name] = codec
+
+
+register_codec(JSONCodec())
+register_codec(CompactCodec())
+
+
+codec_name = os.environ.get("DATALAD_METADATAMODEL_CODEC", JSONCodec.name)
+
+
+def set_codec(name: str) -> str:
+    """ Select the codec for writing, return the previously selected codec """
+    global codec_name
+
+    if name not in codecs:
+        raise ValueError(
+            f"unknown codec: {name}, expected one of: "
+            f"{', '.join(codecs)}")
+    previous_name, codec_name = codec_name, name
+    return previous_name
+
+
+def get_codec() -> str:
+    return codec_name
+
+
+def encode_json_object(json_object: JSONObject) -> bytes:
+    """ Encode json_object with the selected codec """
+    return codecs[codec_name].encode(json_object)
+
+
+def decode_json_object(content: bytes) -> JSONObject:
+    """ Decode content with the codec that encoded it """
+    if content.startswith(b"\x00"):
+        for codec in codecs.values():
+            if codec.tag and content.startswith(codec.tag):
+                return codec.decode(content)
+        raise ValueError(f"unknown codec tag in content: {content[:8]}")
+    return codecs[JSONCodec.name].decode(content)
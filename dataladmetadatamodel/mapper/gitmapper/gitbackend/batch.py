@@ -0,0 +1,366 @@
+"""
+Long-lived git batch processes
+
+Some git commands, e.g. "git cat-file --batch", "git cat-file
+--batch-check", or "git mktree --batch", can process an arbitrary number
+of requests that are sent to their stdin. Using those commands saves one
+fork/exec per object access, which dominates the runtime when large trees
+are mapped in or out.
+
+Processes are kept in per-realm pools. A process is taken from the pool
+for the duration of a single request/response exchange and returned
+afterwards, which allows multiple threads to use the same realm
+concurrently.
+"""
+import atexit
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from tempfile import TemporaryFile
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
+
+from dataladmetadatamodel.log import logger
+
+
+# Maximum number of idle processes that are kept per realm and command
+max_idle_processes = 4
+
+# Maximum number of realms for which process pools are kept alive
+max_pooled_realms = 16
+
+# Number of requests that are sent to a batch process before the
+# responses are read. The requests of a chunk must fit into the pipe
+# buffer, otherwise git and this process might block each other.
+pipeline_chunk_size = 256
+
+
+class GitBatchProcess:
+    """
+    A git process that reads requests from stdin and writes
+    responses to stdout.
+
+    Errors that git writes to stderr are collected in a temporary
+    file, in order to prevent a blocked stderr-pipe from stalling
+    the process.
+    """
+    def __init__(self,
+                 repo_dir: str,
+                 command: str,
+                 arguments: List[str]):
+
+        from .subprocess import git_command_line
+
+        self.repo_dir = repo_dir
+        self.command = command
+        self.cmd_line = git_command_line(repo_dir, command, arguments)
+        self.stderr_file = TemporaryFile()
+        self.in_sync = True
+
+        logger.debug(f"gitbackend: starting batch process {self.cmd_line}")
+        self.process = subprocess.Popen(
+            self.cmd_line,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=self.stderr_file)
+
+    def is_usable(self) -> bool:
+        return self.in_sync and self.process.poll() is None
+
+    def send(self, request: bytes, flush: bool = True):
+        self.in_sync = False
+        try:
+            self.process.stdin.write(request)
+            if flush:
+                self.process.stdin.flush()
+        except BrokenPipeError:
+            # The process exited, e.g. because repo_dir is not a
+            # git repository.
+            self.fail("process exited")
+
+    def read_line(self) -> bytes:
+        line = self.process.stdout.readline()
+        if not line:
+            self.fail("unexpected end of output")
+        return line[:-1]
+
+    def read_bytes(self, size: int) -> bytes:
+        data = self.process.stdout.read(size)
+        if len(data) != size:
+            self.fail(f"expected {size} bytes, got {len(data)}")
+        return data
+
+    def fail(self, reason: str):
+        self.close(keep_stderr=True)
+        self.stderr_file.seek(0)
+        stderr = self.stderr_file.read().decode(errors="replace")
+        self.stderr_file.close()
+        error = RuntimeError(
+            f"Batch command failed ({reason}) "
+            f"{' '.join(self.cmd_line)}:\n"
+            f"STDERR:\n"
+            f"{stderr}")
+        error.stderr = stderr
+        raise error
+
+    def close(self, keep_stderr: bool = False):
+        self.in_sync = False
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.process.stdout.close()
+        if not keep_stderr:
+            self.stderr_file.close()
+
+
+class GitCatFileBatch(GitBatchProcess):
+    """
+    Read objects with "git cat-file --batch".
+
+    Every response is framed by a header line that contains
+    the object hash, the object type, and the object size.
+    The object content is returned as bytes.
+    """
+    def __init__(self, repo_dir: str):
+        super().__init__(repo_dir, "cat-file", ["--batch"])
+
+    def read_object(self, object_reference: str) -> Tuple[str, str, bytes]:
+        """ Return the object hash, the object type, and the content """
+        return self.read_objects([object_reference])[0]
+
+    def read_objects(self,
+                     object_references: List[str]
+                     ) -> List[Tuple[str, str, bytes]]:
+        """
+        Read multiple objects. The requests are pipelined, i.e. a chunk
+        of requests is sent before the responses are read.
+        """
+        for object_reference in object_references:
+            if "\n" in object_reference:
+                raise ValueError(
+                    f"invalid object reference: {repr(object_reference)}")
+
+        result = []
+        for start in range(0, len(object_references), pipeline_chunk_size):
+            chunk = object_references[start:start + pipeline_chunk_size]
+            self.send(b"".join(
+                object_reference.encode() + b"\n"
+                for object_reference in chunk))
+            errors = [
+                error
+                for error in (self._read_response(result) for _ in chunk)
+                if error is not None]
+            self.in_sync = True
+            if errors:
+                raise RuntimeError(
+                    f"Object not found in {self.repo_dir}: "
+                    + ", ".join(errors))
+        return result
+
+    def _read_response(self,
+                       result: List[Tuple[str, str, bytes]]
+                       ) -> Optional[str]:
+        header = self.read_line().decode()
+        if header.endswith(" missing") or header.endswith(" ambiguous"):
+            return header
+
+        object_hash, object_type, size = header.split(" ")
+        content = self.read_bytes(int(size))
+        self.read_bytes(1)
+        result.append((object_hash, object_type, content))
+        return None
+
+
+class GitCatFileBatchCheck(GitBatchProcess):
+    """
+    Look up objects with "git cat-file --batch-check", i.e.
+    without reading their content.
+    """
+    def __init__(self, repo_dir: str):
+        super().__init__(repo_dir, "cat-file", ["--batch-check"])
+
+    def check_object(self,
+                     object_reference: str
+                     ) -> Optional[Tuple[str, str]]:
+        """ Return the object hash and the object type, or None """
+        if "\n" in object_reference:
+            raise ValueError(
+                f"invalid object reference: {repr(object_reference)}")
+
+        self.send(object_reference.encode() + b"\n")
+        header = self.read_line().decode()
+        self.in_sync = True
+        if header.endswith(" missing") or header.endswith(" ambiguous"):
+            return None
+        object_hash, object_type, _ = header.split(" ")
+        return object_hash, object_type
+
+
+class GitMkTreeBatch(GitBatchProcess):
+    """
+    Write tree objects with "git mktree --batch --missing".
+
+    Every tree specification is terminated by an empty line,
+    git responds with the hash of the written tree.
+    """
+    def __init__(self, repo_dir: str):
+        super().__init__(repo_dir, "mktree", ["--batch", "--missing"])
+
+    def write_tree(self, tree_spec_lines: Iterable[str]) -> str:
+        request = "".join(line + "\n" for line in tree_spec_lines) + "\n"
+        self.send(request.encode())
+        object_hash = self.read_line().decode()
+        self.in_sync = True
+        return object_hash
+
+
+class BatchProcessPool:
+    def __init__(self,
+                 factory: Callable[[], GitBatchProcess],
+                 max_idle: int = max_idle_processes):
+
+        self.factory = factory
+        self.max_idle = max_idle
+        self.idle_processes: List[GitBatchProcess] = []
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def process(self):
+        with self.lock:
+            batch_process = (
+                self.idle_processes.pop()
+                if self.idle_processes
+                else None)
+
+        if batch_process is None or not batch_process.is_usable():
+            if batch_process is not None:
+                batch_process.close()
+            batch_process = self.factory()
+
+        try:
+            yield batch_process
+        finally:
+            self.release(batch_process)
+
+    def release(self, batch_process: GitBatchProcess):
+        if batch_process.is_usable():
+            with self.lock:
+                if len(self.idle_processes) < self.max_idle:
+                    self.idle_processes.append(batch_process)
+                    return
+        batch_process.close()
+
+    def shutdown(self):
+        with self.lock:
+            idle_processes, self.idle_processes = self.idle_processes, []
+        for batch_process in idle_processes:
+            batch_process.close()
+
+
+_pools: Dict[Tuple[str, str], BatchProcessPool] = OrderedDict()
+_pools_lock = threading.Lock()
+_pools_pid = os.getpid()
+
+
+def _get_pool(kind: str,
+              repo_dir: str,
+              factory: Callable[[], GitBatchProcess]) -> BatchProcessPool:
+
+    global _pools_pid
+
+    key = (kind, str(repo_dir))
+    evicted_pools = []
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            # Pipes of processes that were started by our parent
+            # process must not be used.
+            _pools.clear()
+            _pools_pid = os.getpid()
+
+        pool = _pools.get(key, None)
+        if pool is None:
+            pool = BatchProcessPool(factory)
+            _pools[key] = pool
+            while len(_pools) > max_pooled_realms:
+                evicted_pools.append(_pools.popitem(last=False)[1])
+        else:
+            _pools.move_to_end(key)
+
+    for evicted_pool in evicted_pools:
+        evicted_pool.shutdown()
+    return pool
+
+
+def get_cat_file_pool(repo_dir: str) -> BatchProcessPool:
+    return _get_pool(
+        "cat-file",
+        repo_dir,
+        lambda: GitCatFileBatch(str(repo_dir)))
+
+
+def cat_file(repo_dir: str, object_reference: str) -> Tuple[str, str, bytes]:
+    with get_cat_file_pool(repo_dir).process() as batch_process:
+        return batch_process.read_object(object_reference)
+
+
+def cat_file_many(repo_dir: str,
+                  object_references: List[str]
+                  ) -> List[Tuple[str, str, bytes]]:
+    with get_cat_file_pool(repo_dir).process() as batch_process:
+        return batch_process.read_objects(object_references)
+
+
+def get_cat_file_check_pool(repo_dir: str) -> BatchProcessPool:
+    return _get_pool(
+        "cat-file-check",
+        repo_dir,
+        lambda: GitCatFileBatchCheck(str(repo_dir)))
+
+
+def cat_file_check(repo_dir: str,
+                   object_reference: str
+                   ) -> Optional[Tuple[str, str]]:
+    with get_cat_file_check_pool(repo_dir).process() as batch_process:
+        return batch_process.check_object(object_reference)
+
+
+def get_mktree_pool(repo_dir: str) -> BatchProcessPool:
+    return _get_pool(
+        "mktree",
+        repo_dir,
+        lambda: GitMkTreeBatch(str(repo_dir)))
+
+
+def mktree(repo_dir: str, tree_spec_lines: Iterable[str]) -> str:
+    with get_mktree_pool(repo_dir).process() as batch_process:
+        return batch_process.write_tree(tree_spec_lines)
+
+
+def shutdown_batch_processes(repo_dir: Optional[str] = None):
+    """ Stop all pooled processes, or only those of the given realm """
+    with _pools_lock:
+        keys = [
+            key
+            for key in _pools.keys()
+            if repo_dir is None or key[1] == str(repo_dir)]
+        pools = [_pools.pop(key) for key in keys]
+
+    for pool in pools:
+        pool.shutdown()
+
+
+atexit.register(shutdown_batch_processes)
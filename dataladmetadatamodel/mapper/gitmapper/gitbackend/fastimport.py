@@ -0,0 +1,350 @@
+"""
+Write objects through a single "git fast-import" stream
+
+Within a fast-import session, all blobs and trees that are saved to a
+realm are streamed into one "git fast-import" process, which writes them
+into a single packfile. Reference updates are deferred until the stream
+is finished, i.e. until all objects are stored.
+
+fast-import creates trees only as part of commits. Trees are therefore
+kept in memory until the session ends. They are then created by a
+single commit on a temporary reference, whose root directory contains
+one directory per tree that is not contained in another tree of the
+session. The directory names are the expected tree hashes, which allows
+to verify the result.
+
+Objects that are written in a session can be read while the session is
+active: blobs are read from the fast-import process via "cat-blob",
+trees are read from memory, and references resolve to their pending
+values.
+
+Usage:
+
+    with fast_import_session(realm):
+        tree_version_list.write_out(realm)
+"""
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import (
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from dataladmetadatamodel.log import logger
+
+from .objectformat import (
+    encode_tree,
+    hash_object,
+    parse_tree,
+    quote_name,
+)
+
+
+empty_tree_hash = hash_object("tree", b"")
+
+temporary_ref_prefix = "refs/datalad-fast-import/"
+
+
+class FastImportSession:
+    def __init__(self, repo_dir: str):
+        from .batch import GitBatchProcess
+
+        self.repo_dir = repo_dir
+        self.blob_marks: Dict[str, int] = dict()
+        self.trees: Dict[str, bytes] = dict()
+        # Pending reference updates, a location of None deletes a reference
+        self.ref_updates: Dict[str, Optional[str]] = OrderedDict()
+        self.lock = threading.RLock()
+        self.process = GitBatchProcess(
+            repo_dir,
+            "fast-import",
+            ["--quiet", "--done", "--cat-blob-fd=1"])
+
+    # Writing
+
+    def save_blob(self, content: bytes) -> str:
+        object_hash = hash_object("blob", content)
+        with self.lock:
+            if object_hash not in self.blob_marks:
+                mark = len(self.blob_marks) + 1
+                self.process.send(
+                    f"blob\nmark :{mark}\ndata {len(content)}\n".encode()
+                    + content
+                    + b"\n",
+                    flush=False)
+                self.blob_marks[object_hash] = mark
+        return object_hash
+
+    def save_tree(self, entry_set: Iterable[Tuple[str, str, str, str]]) -> str:
+        content = encode_tree(entry_set)
+        object_hash = hash_object("tree", content)
+        with self.lock:
+            self.trees[object_hash] = content
+        return object_hash
+
+    def update_ref(self, ref_name: str, location: str):
+        with self.lock:
+            self.ref_updates.pop(ref_name, None)
+            self.ref_updates[ref_name] = location
+
+    def delete_ref(self, ref_name: str):
+        self.update_ref(ref_name, None)
+
+    # Reading
+
+    def resolve(self, object_reference: str) -> str:
+        """ Replace a reference name by its pending location """
+        name, suffix = object_reference, ""
+        if name.endswith("^{tree}"):
+            name, suffix = name[:-7], "^{tree}"
+
+        with self.lock:
+            if name not in self.ref_updates:
+                return object_reference
+            location = self.ref_updates[name]
+
+        if location is None:
+            raise RuntimeError(
+                f"Reference {name} was deleted in {self.repo_dir}")
+        return location + suffix
+
+    def read_object(self, object_hash: str) -> Optional[Tuple[str, bytes]]:
+        """ Read an object of this session, return None for other objects """
+        if object_hash.endswith("^{tree}"):
+            object_hash = object_hash[:-7]
+            if object_hash in self.blob_marks:
+                return None
+
+        with self.lock:
+            if object_hash in self.trees:
+                return "tree", self.trees[object_hash]
+
+            mark = self.blob_marks.get(object_hash, None)
+            if mark is None:
+                return None
+
+            self.process.send(f"cat-blob :{mark}\n".encode())
+            _, object_type, size = self.process.read_line().decode().split()
+            content = self.process.read_bytes(int(size))
+            self.process.read_bytes(1)
+            return object_type, content
+
+    def contains(self, object_hash: str) -> bool:
+        return object_hash in self.trees or object_hash in self.blob_marks
+
+    # Finishing
+
+    def _get_reproducible_trees(self) -> Set[str]:
+        """
+        Return the trees that fast-import will reproduce exactly. Those
+        are all non-empty trees that do not contain empty trees, because
+        fast-import drops empty directories.
+        """
+        reproducible: Dict[str, bool] = dict()
+
+        def is_reproducible(tree_hash: str) -> bool:
+            if tree_hash not in reproducible:
+                entries = parse_tree(self.trees[tree_hash])
+                reproducible[tree_hash] = len(entries) > 0 and all(
+                    is_reproducible(object_hash)
+                    if object_hash in self.trees
+                    else object_hash != empty_tree_hash
+                    for _, object_type, object_hash, _ in entries
+                    if object_type == "tree")
+            return reproducible[tree_hash]
+
+        return set(
+            tree_hash
+            for tree_hash in self.trees
+            if is_reproducible(tree_hash))
+
+    def _file_modifications(self,
+                            tree_hash: str,
+                            prefix: bytes) -> Iterable[bytes]:
+        for flag, object_type, object_hash, name in parse_tree(
+                self.trees[tree_hash]):
+
+            path = prefix + name
+            if object_type == "tree" and object_hash in self.trees:
+                yield from self._file_modifications(object_hash, path + b"/")
+            else:
+                mark = self.blob_marks.get(object_hash, None)
+                data_ref = f":{mark}" if mark is not None else object_hash
+                yield f"M {flag} {data_ref} {quote_name(path)}\n".encode()
+
+    def _write_trees(self, temporary_ref: str) -> List[str]:
+        """
+        Write all reproducible trees with a commit, return the hashes
+        of the trees that fast-import cannot reproduce.
+        """
+        reproducible_trees = self._get_reproducible_trees()
+        contained_trees = set(
+            object_hash
+            for tree_hash in reproducible_trees
+            for _, object_type, object_hash, _ in parse_tree(
+                self.trees[tree_hash])
+            if object_type == "tree")
+
+        root_trees = reproducible_trees - contained_trees
+        if root_trees:
+            self.process.send(
+                f"commit {temporary_ref}\n"
+                f"committer datalad <datalad> 0 +0000\n"
+                f"data 0\n".encode())
+            for tree_hash in sorted(root_trees):
+                self.process.send(
+                    b"".join(self._file_modifications(
+                        tree_hash,
+                        tree_hash.encode() + b"/")),
+                    flush=False)
+            self.process.send(b"\n")
+
+        return [
+            tree_hash
+            for tree_hash in self.trees
+            if tree_hash not in reproducible_trees]
+
+    def _verify_trees(self, temporary_ref: str):
+        from .subprocess import git_ls_tree
+        from ..utils import split_git_lstree_line
+
+        for line in git_ls_tree(self.repo_dir, temporary_ref):
+            _, _, object_hash, name = split_git_lstree_line(line)
+            if object_hash != name:
+                raise RuntimeError(
+                    f"fast-import created tree {object_hash} instead of "
+                    f"{name} in {self.repo_dir}")
+
+    def finish(self):
+        """
+        Finish the stream, store objects that fast-import cannot
+        reproduce, and apply the pending reference updates.
+        """
+        from .native import write_object
+        from .subprocess import (
+            git_delete_ref,
+            git_update_ref,
+        )
+        from ..utils import locked_backend
+
+        temporary_ref = temporary_ref_prefix + uuid.uuid4().hex
+        with self.lock:
+            irreproducible_trees = self._write_trees(temporary_ref)
+            self.process.send(b"done\n")
+            self.process.process.stdin.close()
+            if self.process.process.wait() != 0:
+                self.process.fail(
+                    f"exit code: {self.process.process.returncode}")
+            self.process.close()
+
+            logger.debug(
+                f"fast-import: wrote {len(self.blob_marks)} blobs and "
+                f"{len(self.trees)} trees to {self.repo_dir}")
+
+            for tree_hash in irreproducible_trees:
+                write_object(self.repo_dir, "tree", self.trees[tree_hash])
+
+            if len(irreproducible_trees) < len(self.trees):
+                try:
+                    self._verify_trees(temporary_ref)
+                finally:
+                    git_delete_ref(self.repo_dir, temporary_ref)
+
+            ref_updates, self.ref_updates = self.ref_updates, OrderedDict()
+
+        with locked_backend(Path(self.repo_dir)):
+            for ref_name, location in ref_updates.items():
+                if location is None:
+                    git_delete_ref(self.repo_dir, ref_name)
+                else:
+                    git_update_ref(self.repo_dir, ref_name, location)
+
+    def _get_temporary_packs(self) -> List[Path]:
+        """
+        Return the temporary pack files that the process has opened.
+        The open files are read from /proc, other platforms yield no
+        files.
+        """
+        fd_dir = Path(f"/proc/{self.process.process.pid}/fd")
+        try:
+            paths = [Path(os.readlink(fd)) for fd in fd_dir.iterdir()]
+        except OSError:
+            return []
+        return [path for path in paths if path.name.startswith("tmp_pack_")]
+
+    def abort(self):
+        """
+        Terminate the stream without updating any reference. The input
+        of fast-import ends without "done", which lets it exit with an
+        error. It then installs a pack with all objects that were
+        streamed so far, and writes a crash report, which is removed
+        here. The objects are not referenced and stay in the repository
+        until "git gc" removes them. If fast-import has to be killed,
+        its temporary pack file is removed, if it is known, otherwise
+        "git gc" will remove it as well.
+        """
+        with self.lock:
+            temporary_packs = self._get_temporary_packs()
+            self.process.close()
+            crash_report = (
+                Path(self.repo_dir)
+                / ".git"
+                / f"fast_import_crash_{self.process.process.pid}")
+            for path in [crash_report] + temporary_packs:
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+
+
+_sessions: Dict[str, FastImportSession] = dict()
+_session_depths: Dict[str, int] = dict()
+_sessions_lock = threading.Lock()
+
+
+def get_session(repo_dir: str) -> Optional[FastImportSession]:
+    return _sessions.get(str(repo_dir), None)
+
+
+@contextmanager
+def fast_import_session(repo_dir: str):
+    """
+    Stream all objects that are written to the realm "repo_dir" into
+    a single fast-import process. Sessions can be nested, the objects
+    are stored and the references are updated when the outermost
+    session ends. If an exception occurs, no reference is updated.
+    """
+    repo_dir = str(repo_dir)
+    with _sessions_lock:
+        session = _sessions.get(repo_dir, None)
+        if session is None:
+            session = FastImportSession(repo_dir)
+            _sessions[repo_dir] = session
+            _session_depths[repo_dir] = 0
+        _session_depths[repo_dir] += 1
+
+    success = False
+    try:
+        yield session
+        success = True
+    finally:
+        with _sessions_lock:
+            _session_depths[repo_dir] -= 1
+            is_outermost = _session_depths[repo_dir] == 0
+            if is_outermost:
+                del _sessions[repo_dir]
+                del _session_depths[repo_dir]
+
+        if is_outermost:
+            if success:
+                session.finish()
+            else:
+                session.abort()
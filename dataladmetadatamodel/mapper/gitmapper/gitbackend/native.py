@@ -0,0 +1,629 @@
+"""
+In-process git object reader and writer
+
+The reader resolves references and reads loose objects and
+packed objects directly from the object database of a repository,
+without executing git. Pack index and pack files are accessed
+through memory maps, deltified objects are resolved in-process.
+
+The writer writes loose objects. Objects are compressed into a
+temporary file that is atomically renamed to its final name.
+
+Only SHA-1 repositories are supported.
+"""
+import mmap
+import os
+import struct
+import threading
+import uuid
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import (
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+
+from .objectformat import (
+    hash_object,
+    object_header,
+)
+
+
+object_type_names = {
+    1: "commit",
+    2: "tree",
+    3: "blob",
+    4: "tag",
+}
+
+OFS_DELTA = 6
+REF_DELTA = 7
+
+hex_digits = set("0123456789abcdef")
+
+# Maximum number of delta base objects that are cached per store
+delta_base_cache_size = 256
+
+# Compression level of loose objects, git's default is 1
+loose_compression_level = 1
+
+# Durability of written loose objects:
+#  "none":   do not call fsync, i.e. rely on the operating system
+#  "object": fsync every object file and its directory after writing
+#  "batch":  fsync all objects that were written since the last
+#            call to sync_written_objects(), before references are
+#            updated
+fsync_policies = ("none", "object", "batch")
+
+
+def _is_hex_hash(name: str) -> bool:
+    return len(name) == 40 and all(c in hex_digits for c in name)
+
+
+def apply_delta(base: bytes, delta: bytes) -> bytes:
+    """ Apply a git delta to the given base object content """
+
+    def read_size(position: int) -> Tuple[int, int]:
+        size = shift = 0
+        while True:
+            byte = delta[position]
+            position += 1
+            size |= (byte & 0x7f) << shift
+            shift += 7
+            if not byte & 0x80:
+                return size, position
+
+    base_size, position = read_size(0)
+    if base_size != len(base):
+        raise ValueError(
+            f"delta base size mismatch: {base_size} != {len(base)}")
+
+    result_size, position = read_size(position)
+    result = bytearray()
+    delta_length = len(delta)
+    while position < delta_length:
+        opcode = delta[position]
+        position += 1
+        if opcode & 0x80:
+            offset = size = 0
+            for bit in range(4):
+                if opcode & (1 << bit):
+                    offset |= delta[position] << (8 * bit)
+                    position += 1
+            for bit in range(3):
+                if opcode & (0x10 << bit):
+                    size |= delta[position] << (8 * bit)
+                    position += 1
+            result += base[offset:offset + (size or 0x10000)]
+        elif opcode:
+            result += delta[position:position + opcode]
+            position += opcode
+        else:
+            raise ValueError("invalid delta opcode 0")
+
+    if len(result) != result_size:
+        raise ValueError(
+            f"delta result size mismatch: {len(result)} != {result_size}")
+    return bytes(result)
+
+
+class PackFile:
+    """ A memory-mapped pack file and its index (version 1 or 2) """
+    def __init__(self, index_path: Path):
+        self.index_path = index_path
+        self.pack_path = index_path.with_suffix(".pack")
+
+        with index_path.open("rb") as f:
+            self.index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        with self.pack_path.open("rb") as f:
+            self.pack = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.index[:4] == b"\377tOc":
+            version = struct.unpack(">I", self.index[4:8])[0]
+            if version != 2:
+                raise ValueError(
+                    f"unsupported pack index version {version}: {index_path}")
+            self.version = 2
+            fan_out_start = 8
+        else:
+            self.version = 1
+            fan_out_start = 0
+
+        self.fan_out = struct.unpack(
+            ">256I",
+            self.index[fan_out_start:fan_out_start + 1024])
+        self.object_count = self.fan_out[255]
+        self.table_start = fan_out_start + 1024
+
+        if self.version == 2:
+            self.crc_start = self.table_start + 20 * self.object_count
+            self.offset_start = self.crc_start + 4 * self.object_count
+            self.large_offset_start = self.offset_start + 4 * self.object_count
+
+    def close(self):
+        self.index.close()
+        self.pack.close()
+
+    def _hash_at(self, index: int) -> bytes:
+        if self.version == 2:
+            start = self.table_start + 20 * index
+        else:
+            start = self.table_start + 24 * index + 4
+        return self.index[start:start + 20]
+
+    def _offset_at(self, index: int) -> int:
+        if self.version == 1:
+            start = self.table_start + 24 * index
+            return struct.unpack(">I", self.index[start:start + 4])[0]
+
+        start = self.offset_start + 4 * index
+        offset = struct.unpack(">I", self.index[start:start + 4])[0]
+        if offset & 0x80000000:
+            start = self.large_offset_start + 8 * (offset & 0x7fffffff)
+            offset = struct.unpack(">Q", self.index[start:start + 8])[0]
+        return offset
+
+    def find_offset(self, binary_hash: bytes) -> Optional[int]:
+        first_byte = binary_hash[0]
+        low = self.fan_out[first_byte - 1] if first_byte > 0 else 0
+        high = self.fan_out[first_byte]
+        while low < high:
+            middle = (low + high) // 2
+            middle_hash = self._hash_at(middle)
+            if middle_hash < binary_hash:
+                low = middle + 1
+            elif middle_hash > binary_hash:
+                high = middle
+            else:
+                return self._offset_at(middle)
+        return None
+
+    def _decompress(self, position: int, size: int) -> bytes:
+        decompressor = zlib.decompressobj()
+        result = bytearray()
+        chunk_size = max(size, 4096)
+        while not decompressor.eof:
+            chunk = self.pack[position:position + chunk_size]
+            if not chunk:
+                raise ValueError(f"truncated pack file: {self.pack_path}")
+            result += decompressor.decompress(chunk)
+            position += chunk_size
+        if len(result) != size:
+            raise ValueError(
+                f"object size mismatch in {self.pack_path}: "
+                f"{len(result)} != {size}")
+        return bytes(result)
+
+    def read_entry(self, offset: int) -> Tuple[int, bytes, Optional[object]]:
+        """
+        Read the pack entry at offset. Return the entry type, the
+        decompressed entry data, and the delta base, i.e. an offset
+        for offset-deltas, or a binary hash for reference-deltas.
+        """
+        position = offset
+        byte = self.pack[position]
+        position += 1
+        entry_type = (byte >> 4) & 7
+        size = byte & 0x0f
+        shift = 4
+        while byte & 0x80:
+            byte = self.pack[position]
+            position += 1
+            size |= (byte & 0x7f) << shift
+            shift += 7
+
+        base = None
+        if entry_type == OFS_DELTA:
+            byte = self.pack[position]
+            position += 1
+            base_distance = byte & 0x7f
+            while byte & 0x80:
+                byte = self.pack[position]
+                position += 1
+                base_distance = ((base_distance + 1) << 7) | (byte & 0x7f)
+            base = offset - base_distance
+        elif entry_type == REF_DELTA:
+            base = self.pack[position:position + 20]
+            position += 20
+
+        return entry_type, self._decompress(position, size), base
+
+
+class NativeObjectStore:
+    """
+    Read objects from the object database of a single repository.
+    """
+    def __init__(self, repo_dir: str):
+        self.git_dir = Path(repo_dir) / ".git"
+        self.object_dirs = self._get_object_dirs(self.git_dir / "objects")
+        self.packs: Dict[Path, PackFile] = dict()
+        self.delta_base_cache: OrderedDict = OrderedDict()
+        self.unsynced_paths: List[Path] = []
+        self.lock = threading.RLock()
+        # Number of current users and eviction state, guarded by
+        # _stores_lock, see object_store()
+        self.users = 0
+        self.evicted = False
+        self._scan_packs()
+
+    @staticmethod
+    def _get_object_dirs(object_dir: Path) -> List[Path]:
+        object_dirs = [object_dir]
+        alternates = object_dir / "info" / "alternates"
+        if alternates.exists():
+            for line in alternates.read_text().splitlines():
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    alternate_dir = Path(line)
+                    if not alternate_dir.is_absolute():
+                        alternate_dir = object_dir / alternate_dir
+                    object_dirs.extend(
+                        NativeObjectStore._get_object_dirs(alternate_dir))
+        return object_dirs
+
+    def _scan_packs(self) -> bool:
+        """ Add new pack files, return True if packs were added """
+        added = False
+        for object_dir in self.object_dirs:
+            pack_dir = object_dir / "pack"
+            if not pack_dir.is_dir():
+                continue
+            for index_path in pack_dir.glob("*.idx"):
+                if index_path not in self.packs:
+                    if index_path.with_suffix(".pack").exists():
+                        self.packs[index_path] = PackFile(index_path)
+                        added = True
+        return added
+
+    def close(self):
+        with self.lock:
+            for pack in self.packs.values():
+                pack.close()
+            self.packs = dict()
+            self.sync_written_objects()
+
+    # Reference resolution
+
+    def _read_packed_refs(self) -> Dict[str, str]:
+        packed_refs = dict()
+        packed_refs_path = self.git_dir / "packed-refs"
+        if packed_refs_path.exists():
+            for line in packed_refs_path.read_text().splitlines():
+                if not line or line[0] in "#^":
+                    continue
+                object_hash, ref_name = line.split(" ", 1)
+                packed_refs[ref_name] = object_hash
+        return packed_refs
+
+    def _resolve_ref(self, ref_name: str, depth: int = 0) -> Optional[str]:
+        if depth > 5:
+            raise RuntimeError(f"symbolic reference loop at {ref_name}")
+
+        ref_path = self.git_dir / ref_name
+        if ref_path.is_file():
+            content = ref_path.read_text().strip()
+            if content.startswith("ref: "):
+                return self._resolve_ref(content[5:], depth + 1)
+            return content
+        return self._read_packed_refs().get(ref_name, None)
+
+    def _peel(self, object_hash: str, target_type: str) -> str:
+        while True:
+            object_type, content = self._read_by_hash(object_hash)
+            if object_type == target_type:
+                return object_hash
+            if object_type == "commit" and target_type == "tree":
+                object_hash = content[5:45].decode()
+            elif object_type == "tag":
+                object_hash = content[7:47].decode()
+            else:
+                raise RuntimeError(
+                    f"cannot peel {object_type} {object_hash} "
+                    f"to {target_type}")
+
+    def resolve(self, name: str) -> Optional[str]:
+        """ Return the object hash for a hash, ref name, or rev^{type} """
+        if name.endswith("}") and "^{" in name:
+            name, target_type = name[:-1].rsplit("^{", 1)
+            object_hash = self.resolve(name)
+            if object_hash is None:
+                return None
+            return self._peel(object_hash, target_type)
+
+        if _is_hex_hash(name):
+            return name
+
+        for candidate in (
+                name,
+                f"refs/{name}",
+                f"refs/tags/{name}",
+                f"refs/heads/{name}",
+                f"refs/remotes/{name}",
+                f"refs/remotes/{name}/HEAD"):
+            object_hash = self._resolve_ref(candidate)
+            if object_hash is not None:
+                return object_hash
+        return None
+
+    # Object reading
+
+    def _read_loose(self, object_hash: str) -> Optional[Tuple[str, bytes]]:
+        for object_dir in self.object_dirs:
+            object_path = object_dir / object_hash[:2] / object_hash[2:]
+            try:
+                compressed = object_path.read_bytes()
+            except FileNotFoundError:
+                continue
+            data = zlib.decompress(compressed)
+            null_index = data.index(b"\x00")
+            object_type, size = data[:null_index].decode().split(" ")
+            content = data[null_index + 1:]
+            if len(content) != int(size):
+                raise ValueError(f"corrupt loose object: {object_path}")
+            return object_type, content
+        return None
+
+    def _find_in_packs(self,
+                       binary_hash: bytes
+                       ) -> Optional[Tuple[PackFile, int]]:
+        for pack in self.packs.values():
+            offset = pack.find_offset(binary_hash)
+            if offset is not None:
+                return pack, offset
+        return None
+
+    def _read_packed(self,
+                     pack: PackFile,
+                     offset: int) -> Tuple[str, bytes]:
+
+        # Collect the delta chain until a non-delta base is found
+        chain = []
+        while True:
+            cached = self.delta_base_cache.get((pack.pack_path, offset))
+            if cached is not None:
+                self.delta_base_cache.move_to_end((pack.pack_path, offset))
+                object_type, content = cached
+                break
+
+            entry_type, data, base = pack.read_entry(offset)
+            if entry_type == OFS_DELTA:
+                chain.append((pack, offset, data))
+                offset = base
+            elif entry_type == REF_DELTA:
+                chain.append((pack, offset, data))
+                base_location = self._find_in_packs(base)
+                if base_location is None:
+                    object_type, content = self._read_by_hash(base.hex())
+                    break
+                pack, offset = base_location
+            else:
+                object_type = object_type_names[entry_type]
+                content = data
+                if chain:
+                    self._cache_delta_base(
+                        (pack.pack_path, offset),
+                        (object_type, content))
+                break
+
+        for delta_pack, delta_offset, delta in reversed(chain):
+            content = apply_delta(content, delta)
+            self._cache_delta_base(
+                (delta_pack.pack_path, delta_offset),
+                (object_type, content))
+
+        return object_type, content
+
+    def _cache_delta_base(self, key, value):
+        self.delta_base_cache[key] = value
+        while len(self.delta_base_cache) > delta_base_cache_size:
+            self.delta_base_cache.popitem(last=False)
+
+    def _read_by_hash(self, object_hash: str) -> Tuple[str, bytes]:
+        result = self._lookup_by_hash(object_hash)
+        if result is None:
+            raise RuntimeError(
+                f"Object not found in {self.git_dir}: {object_hash}")
+        return result
+
+    def _lookup_by_hash(self,
+                        object_hash: str
+                        ) -> Optional[Tuple[str, bytes]]:
+
+        binary_hash = bytes.fromhex(object_hash)
+        location = self._find_in_packs(binary_hash)
+        if location is not None:
+            return self._read_packed(*location)
+
+        result = self._read_loose(object_hash)
+        if result is not None:
+            return result
+
+        # Objects might have been packed since the last scan
+        if self._scan_packs():
+            location = self._find_in_packs(binary_hash)
+            if location is not None:
+                return self._read_packed(*location)
+        return None
+
+    def read_object(self, name: str) -> Tuple[str, str, bytes]:
+        """ Return the object hash, the object type, and the content """
+        with self.lock:
+            object_hash = self.resolve(name)
+            if object_hash is None:
+                raise RuntimeError(
+                    f"Object not found in {self.git_dir}: {name}")
+            object_type, content = self._read_by_hash(object_hash)
+            return object_hash, object_type, content
+
+    def object_exists(self, name: str) -> bool:
+        with self.lock:
+            try:
+                object_hash = self.resolve(name)
+            except RuntimeError:
+                return False
+            if object_hash is None:
+                return False
+
+            binary_hash = bytes.fromhex(object_hash)
+            if self._find_in_packs(binary_hash) is not None:
+                return True
+            for object_dir in self.object_dirs:
+                if (object_dir / object_hash[:2] / object_hash[2:]).exists():
+                    return True
+            return (
+                self._scan_packs()
+                and self._find_in_packs(binary_hash) is not None)
+
+    # Object writing
+
+    def contains(self, object_hash: str) -> bool:
+        if self._find_in_packs(bytes.fromhex(object_hash)) is not None:
+            return True
+        return any(
+            (object_dir / object_hash[:2] / object_hash[2:]).exists()
+            for object_dir in self.object_dirs)
+
+    def write_object(self,
+                     object_type: str,
+                     content: bytes,
+                     fsync_policy: str = "none") -> str:
+        """ Write a loose object, unless it exists, return its hash """
+        object_hash = hash_object(object_type, content)
+        with self.lock:
+            if self.contains(object_hash):
+                return object_hash
+
+            object_dir = self.object_dirs[0]
+            if not object_dir.is_dir():
+                raise RuntimeError(
+                    f"not a git repository: {self.git_dir.parent}")
+
+            fan_out_dir = object_dir / object_hash[:2]
+            fan_out_dir.mkdir(exist_ok=True)
+
+            compressor = zlib.compressobj(loose_compression_level)
+            temp_path = fan_out_dir / f"tmp_obj_{uuid.uuid4().hex}"
+            with temp_path.open("wb") as f:
+                f.write(compressor.compress(
+                    object_header(object_type, len(content))))
+                f.write(compressor.compress(content))
+                f.write(compressor.flush())
+                if fsync_policy == "object":
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            os.chmod(temp_path, 0o444)
+            object_path = fan_out_dir / object_hash[2:]
+            try:
+                os.replace(temp_path, object_path)
+            except PermissionError:
+                # On some platforms an existing read-only object, that
+                # was written concurrently, cannot be replaced.
+                os.unlink(temp_path)
+                if not object_path.exists():
+                    raise
+
+            if fsync_policy == "object":
+                _fsync_directory(fan_out_dir)
+            elif fsync_policy == "batch":
+                self.unsynced_paths.append(object_path)
+
+        return object_hash
+
+    def sync_written_objects(self):
+        with self.lock:
+            unsynced_paths, self.unsynced_paths = self.unsynced_paths, []
+        for directory in set(path.parent for path in unsynced_paths):
+            _fsync_directory(directory)
+        for path in unsynced_paths:
+            with path.open("rb") as f:
+                os.fsync(f.fileno())
+
+
+def _fsync_directory(directory: Path):
+    if os.name != "posix":
+        return
+    directory_fd = os.open(str(directory), os.O_RDONLY)
+    try:
+        os.fsync(directory_fd)
+    finally:
+        os.close(directory_fd)
+
+
+# Maximum number of repositories for which stores are kept open. Stores
+# that exceed the limit are evicted, and closed when they are no longer
+# used, i.e. when all reads and writes on them are done.
+max_open_stores = 16
+
+_stores: Dict[str, NativeObjectStore] = OrderedDict()
+_stores_lock = threading.Lock()
+
+
+def _release_store(store: NativeObjectStore):
+    """ Close the store, if it was evicted and is no longer used """
+    if store.evicted and store.users == 0:
+        store.close()
+
+
+@contextmanager
+def object_store(repo_dir: str):
+    """ Use the store of repo_dir, which is not closed while it is used """
+    repo_dir = str(repo_dir)
+    with _stores_lock:
+        store = _stores.get(repo_dir, None)
+        if store is None:
+            store = NativeObjectStore(repo_dir)
+            _stores[repo_dir] = store
+            while len(_stores) > max_open_stores:
+                evicted_store = _stores.popitem(last=False)[1]
+                evicted_store.evicted = True
+                _release_store(evicted_store)
+        else:
+            _stores.move_to_end(repo_dir)
+        store.users += 1
+
+    try:
+        yield store
+    finally:
+        with _stores_lock:
+            store.users -= 1
+            _release_store(store)
+
+
+def close_object_stores():
+    with _stores_lock:
+        for store in _stores.values():
+            store.evicted = True
+            _release_store(store)
+        _stores.clear()
+
+
+def read_object(repo_dir: str, object_reference: str) -> Tuple[str, str, bytes]:
+    with object_store(repo_dir) as store:
+        return store.read_object(object_reference)
+
+
+def object_exists(repo_dir: str, object_reference: str) -> bool:
+    if not os.path.isdir(os.path.join(str(repo_dir), ".git")):
+        return False
+    with object_store(repo_dir) as store:
+        return store.object_exists(object_reference)
+
+
+def write_object(repo_dir: str,
+                 object_type: str,
+                 content: bytes,
+                 fsync_policy: str = "none") -> str:
+    with object_store(repo_dir) as store:
+        return store.write_object(object_type, content, fsync_policy)
+
+
+def sync_written_objects(repo_dir: str):
+    with _stores_lock:
+        store = _stores.get(str(repo_dir), None)
+    if store is not None:
+        store.sync_written_objects()
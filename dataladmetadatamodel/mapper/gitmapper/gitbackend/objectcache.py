@@ -0,0 +1,148 @@
+"""
+Process-wide cache of git objects
+
+Git objects are immutable, the content of an object, and everything that
+is derived from the content, e.g. a decoded JSON-object or a tree listing,
+is therefore valid as long as the object hash is the same. The object
+cache keeps recently read objects, and decoded objects, by object hash.
+It is shared by all realms and all threads.
+
+The size of the cache is limited by the total size of its entries. The
+size of an object is the size of its content, the size of a decoded
+object is estimated from the size of its content. The least recently used
+entries are evicted if the size limit is exceeded. The limit is set with
+DATALAD_METADATAMODEL_OBJECT_CACHE_SIZE, or with set_object_cache_size(),
+and defaults to 64 MiB. A limit of 0 disables the cache.
+
+Decoded objects are shared by all readers of an object and must not be
+modified.
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import (
+    Any,
+    Dict,
+    Optional,
+    Tuple,
+)
+
+
+# Decoded objects are estimated to use this multiple of their content size
+decoded_size_factor = 4
+
+# Only object hashes identify immutable objects, names of references,
+# or expressions like "<hash>:<path>", are never cached.
+_object_hash_pattern = re.compile(r"^[0-9a-f]{40}(?:[0-9a-f]{24})?$")
+
+
+@dataclass
+class CacheStatistics:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    size: int = 0
+    entries: int = 0
+
+
+class ObjectCache:
+    """ Least-recently-used cache of objects with a size limit """
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.size = 0
+        self.entries: Dict[Tuple[str, str], Tuple[Any, int]] = OrderedDict()
+        self.statistics = CacheStatistics()
+        self.lock = threading.Lock()
+
+    def get(self, kind: str, object_hash: str) -> Optional[Any]:
+        """ Return the cached value or None """
+        key = kind, object_hash
+        with self.lock:
+            entry = self.entries.get(key, None)
+            if entry is None:
+                self.statistics.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.statistics.hits += 1
+            return entry[0]
+
+    def add(self, kind: str, object_hash: str, value: Any, size: int):
+        if size > self.max_size:
+            return
+        key = kind, object_hash
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.size -= entry[1]
+            self.entries[key] = value, size
+            self.size += size
+            self._evict()
+
+    def resize(self, max_size: int):
+        with self.lock:
+            self.max_size = max_size
+            self._evict()
+
+    def _evict(self):
+        while self.size > self.max_size:
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.size -= evicted_size
+            self.statistics.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def get_statistics(self) -> CacheStatistics:
+        with self.lock:
+            return CacheStatistics(
+                self.statistics.hits,
+                self.statistics.misses,
+                self.statistics.evictions,
+                self.size,
+                len(self.entries))
+
+
+object_cache = ObjectCache(int(os.environ.get(
+    "DATALAD_METADATAMODEL_OBJECT_CACHE_SIZE",
+    64 * 1024 * 1024)))
+
+
+def is_object_hash(object_reference: str) -> bool:
+    return _object_hash_pattern.match(object_reference) is not None
+
+
+def set_object_cache_size(max_size: int) -> int:
+    """ Set the size limit of the cache, return the previous limit """
+    previous_size = object_cache.max_size
+    object_cache.resize(max_size)
+    return previous_size
+
+
+def get_object_cache_size() -> int:
+    return object_cache.max_size
+
+
+def get_object_cache_statistics() -> CacheStatistics:
+    return object_cache.get_statistics()
+
+
+def clear_object_cache():
+    object_cache.clear()
+
+
+def get_cached(kind: str, object_reference: str) -> Optional[Any]:
+    """ Return the cached value for an object hash, or None """
+    if object_cache.max_size == 0 or not is_object_hash(object_reference):
+        return None
+    return object_cache.get(kind, object_reference)
+
+
+def add_cached(kind: str, object_reference: str, value: Any, size: int):
+    """ Cache the value for an object hash, other references are ignored """
+    if object_cache.max_size == 0 or not is_object_hash(object_reference):
+        return
+    object_cache.add(kind, object_reference, value, size)
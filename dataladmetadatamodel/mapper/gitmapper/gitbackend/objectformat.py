@@ -0,0 +1,124 @@
+"""
+Helpers to encode and decode git objects and to format them like
+the porcelain git commands do.
+"""
+import codecs
+import hashlib
+from typing import (
+    Iterable,
+    List,
+    Tuple,
+    Union,
+)
+
+
+tree_entry_types = {
+    "40000": "tree",
+    "160000": "commit",
+}
+
+c_style_escapes = {
+    0x07: "\\a",
+    0x08: "\\b",
+    0x09: "\\t",
+    0x0a: "\\n",
+    0x0b: "\\v",
+    0x0c: "\\f",
+    0x0d: "\\r",
+    0x22: '\\"',
+    0x5c: "\\\\",
+}
+
+
+def quote_name(name: bytes) -> str:
+    """
+    Quote a name in the same way as git does with core.quotePath
+    enabled. Names that do not require quoting are returned as is.
+    """
+    if all(0x20 <= c < 0x7f and c not in (0x22, 0x5c) for c in name):
+        return name.decode()
+
+    result = ['"']
+    for c in name:
+        if c in c_style_escapes:
+            result.append(c_style_escapes[c])
+        elif 0x20 <= c < 0x7f:
+            result.append(chr(c))
+        else:
+            result.append(f"\\{c:03o}")
+    result.append('"')
+    return "".join(result)
+
+
+def parse_tree(content: bytes) -> List[Tuple[str, str, str, bytes]]:
+    """
+    Parse the content of a git tree object into tuples of
+    the form: (flag, object-type, object-hash, name)
+    """
+    entries = []
+    position = 0
+    content_length = len(content)
+    while position < content_length:
+        space_index = content.index(b" ", position)
+        null_index = content.index(b"\x00", space_index)
+        mode = content[position:space_index].decode()
+        name = content[space_index + 1:null_index]
+        object_hash = content[null_index + 1:null_index + 21].hex()
+        entries.append((
+            mode.rjust(6, "0"),
+            tree_entry_types.get(mode, "blob"),
+            object_hash,
+            name))
+        position = null_index + 21
+    return entries
+
+
+def format_tree_lines(content: bytes) -> List[str]:
+    """
+    Return the lines that "git cat-file -p" would print for the tree
+    object with the given content.
+    """
+    return [
+        f"{flag} {object_type} {object_hash}\t{quote_name(name)}"
+        for flag, object_type, object_hash, name in parse_tree(content)
+    ]
+
+
+def unquote_name(name: str) -> bytes:
+    """ Inverse of quote_name, also accepts unquoted names """
+    if len(name) > 1 and name.startswith('"') and name.endswith('"'):
+        return codecs.escape_decode(name[1:-1].encode())[0]
+    return name.encode()
+
+
+def object_header(object_type: str, size: int) -> bytes:
+    return f"{object_type} {size}".encode() + b"\x00"
+
+
+def hash_object(object_type: str, content: bytes) -> str:
+    hasher = hashlib.sha1(object_header(object_type, len(content)))
+    hasher.update(content)
+    return hasher.hexdigest()
+
+
+def encode_content(content: Union[str, bytes]) -> bytes:
+    return content.encode() if isinstance(content, str) else bytes(content)
+
+
+def encode_tree(entry_set: Iterable[Tuple[str, str, str, str]]) -> bytes:
+    """
+    Encode tree entries of the form (flag, object-type, object-hash, name),
+    as they are given to "git mktree", into the content of a tree object.
+    Names might be quoted.
+    """
+    entries = []
+    for flag, node_type, object_hash, name in entry_set:
+        name = unquote_name(name)
+        # Git sorts directory entries as if their names had a trailing "/"
+        sort_key = name + b"/" if node_type == "tree" else name
+        mode = f"{int(flag, 8):o}".encode()
+        entries.append((sort_key, mode, name, bytes.fromhex(object_hash)))
+
+    return b"".join(
+        mode + b" " + name + b"\x00" + binary_hash
+        for _, mode, name, binary_hash in sorted(entries))
@@ -1,6 +1,10 @@
-import json
+import os
 import shlex
 import subprocess
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from tempfile import TemporaryDirectory
 from typing import (
     Any,
     Dict,
@@ -14,6 +18,92 @@ from typing import (
 from dataladmetadatamodel.log import logger
 from dataladmetadatamodel.mapper.reference import Reference
 
+from .fastimport import get_session
+from .objectcache import (
+    add_cached,
+    decoded_size_factor,
+    get_cached,
+)
+from ..codec import (
+    decode_json_object,
+    encode_json_object,
+)
+from ..writecache import get_write_cache
+from .objectformat import (
+    encode_content,
+    encode_tree,
+    format_tree_lines,
+    parse_tree,
+)
+
+
+# Objects can either be read by long-lived git processes ("subprocess"),
+# or by the in-process object reader ("native").
+object_readers = ("subprocess", "native")
+object_reader = os.environ.get(
+    "DATALAD_METADATAMODEL_OBJECT_READER",
+    "subprocess")
+
+# Objects can either be written by git processes ("subprocess"), or
+# by the in-process loose object writer ("native").
+object_writers = ("subprocess", "native")
+object_writer = os.environ.get(
+    "DATALAD_METADATAMODEL_OBJECT_WRITER",
+    "native")
+
+# The fsync-policy of the native writer, see native.fsync_policies
+fsync_policy = os.environ.get(
+    "DATALAD_METADATAMODEL_FSYNC_POLICY",
+    "none")
+
+
+# Objects that were loaded by git_prefetched_objects, per thread
+_prefetched = threading.local()
+
+
+def _check_choice(kind: str, value: str, choices: Tuple[str, ...]):
+    if value not in choices:
+        raise ValueError(
+            f"unknown {kind}: {value}, expected one of: "
+            f"{', '.join(choices)}")
+
+
+def set_object_reader(reader: str) -> str:
+    """ Select the object reader, return the previously selected reader """
+    global object_reader
+
+    _check_choice("object reader", reader, object_readers)
+    previous_reader, object_reader = object_reader, reader
+    return previous_reader
+
+
+def get_object_reader() -> str:
+    return object_reader
+
+
+def set_object_writer(writer: str) -> str:
+    """ Select the object writer, return the previously selected writer """
+    global object_writer
+
+    _check_choice("object writer", writer, object_writers)
+    previous_writer, object_writer = object_writer, writer
+    return previous_writer
+
+
+def get_object_writer() -> str:
+    return object_writer
+
+
+def set_fsync_policy(policy: str) -> str:
+    """ Select the fsync-policy, return the previously selected policy """
+    from .native import fsync_policies
+
+    global fsync_policy
+
+    _check_choice("fsync policy", policy, fsync_policies)
+    previous_policy, fsync_policy = fsync_policy, policy
+    return previous_policy
+
 
 def execute(arguments: Union[str, List[str]],
             stdin_content: Optional[Union[str, bytes]] = None) -> Any:
@@ -33,7 +123,16 @@ def checked_execute(arguments: Union[str, List[str]],
                     stdin_content: Optional[Union[str, bytes]] = None
                     ) -> Tuple[List[str], List[str]]:
 
-    result = execute(arguments, stdin_content)
+    result = _checked_result(arguments, execute(arguments, stdin_content))
+    return (
+        result.stdout.decode().splitlines(),
+        result.stderr.decode().splitlines())
+
+
+def _checked_result(arguments: Union[str, List[str]],
+                    result: subprocess.CompletedProcess
+                    ) -> subprocess.CompletedProcess:
+
     if result.returncode != 0:
         error = RuntimeError(
             f"Command failed (exit code: {result.returncode}) "
@@ -45,9 +144,7 @@ def checked_execute(arguments: Union[str, List[str]],
         error.stdout = result.stdout.decode()
         error.stderr = result.stderr.decode()
         raise error
-    return (
-        result.stdout.decode().splitlines(),
-        result.stderr.decode().splitlines())
+    return result
 
 
 def git_command_line(repo_dir: str,
@@ -81,15 +178,158 @@ def adapt_for_remote(repo_dir: str, object_reference: str) -> str:
     return repo_dir
 
 
+def _get_pending_stores(repo_dir: str) -> List:
+    """
+    Return the active write cache and the active fast-import session
+    of the realm, i.e. the stores that hold objects and references
+    that are not yet written to the realm. Writes go to the first store.
+    """
+    return [
+        store
+        for store in (get_write_cache(repo_dir), get_session(repo_dir))
+        if store is not None]
+
+
+def git_load_object(repo_dir: str,
+                    object_reference: str) -> Tuple[str, bytes]:
+    """
+    Read an object with the selected object reader, i.e. from a
+    long-lived "git cat-file --batch" process or in-process.
+    Return the object type and the object content.
+    """
+    prefetched_objects = getattr(_prefetched, "objects", None)
+    if prefetched_objects:
+        result = prefetched_objects.get((str(repo_dir), object_reference))
+        if result is not None:
+            return result
+
+    result = get_cached("object", object_reference)
+    if result is not None:
+        return result
+
+    for store in _get_pending_stores(repo_dir):
+        object_reference = store.resolve(object_reference)
+        result = store.read_object(object_reference)
+        if result is not None:
+            return result
+
+    repo_dir = adapt_for_remote(repo_dir, object_reference)
+    if object_reader == "native":
+        from .native import read_object
+    else:
+        from .batch import cat_file as read_object
+
+    _, object_type, content = read_object(repo_dir, object_reference)
+    add_cached("object", object_reference, (object_type, content), len(content))
+    return object_type, content
+
+
+def git_load_objects(repo_dir: str,
+                     object_references: List[str]
+                     ) -> List[Tuple[str, bytes]]:
+    """
+    Read multiple objects with a single batched request. Return the
+    object types and the object contents, in the order of the given
+    references.
+    """
+    if Reference.is_remote(repo_dir):
+        return [
+            git_load_object(repo_dir, object_reference)
+            for object_reference in object_references
+        ]
+
+    result: List[Optional[Tuple[str, bytes]]] = [None] * len(object_references)
+    missing = []
+    pending_stores = _get_pending_stores(repo_dir)
+    for index, object_reference in enumerate(object_references):
+        result[index] = get_cached("object", object_reference)
+        if result[index] is not None:
+            continue
+        for store in pending_stores:
+            object_reference = store.resolve(object_reference)
+            result[index] = store.read_object(object_reference)
+            if result[index] is not None:
+                break
+        else:
+            missing.append((index, object_reference))
+
+    if missing:
+        if object_reader == "native":
+            from .native import read_object
+            loaded_objects = [
+                read_object(repo_dir, object_reference)
+                for _, object_reference in missing
+            ]
+        else:
+            from .batch import cat_file_many
+            loaded_objects = cat_file_many(
+                repo_dir,
+                [object_reference for _, object_reference in missing])
+
+        for (index, object_reference), (_, object_type, content) in zip(
+                missing,
+                loaded_objects):
+            result[index] = object_type, content
+            add_cached("object", object_reference, result[index], len(content))
+    return result
+
+
+@contextmanager
+def git_prefetched_objects(repo_dir: str, object_references: List[str]):
+    """
+    Load the given objects with a single batched request. Within
+    the context, loading any of these objects in the current thread
+    does not access the repository.
+    """
+    previous_objects = getattr(_prefetched, "objects", None)
+    prefetched_objects = dict(previous_objects or {})
+    prefetched_objects.update({
+        (str(repo_dir), object_reference): loaded_object
+        for object_reference, loaded_object in zip(
+            object_references,
+            git_load_objects(repo_dir, object_references))
+    })
+    _prefetched.objects = prefetched_objects
+    try:
+        yield
+    finally:
+        _prefetched.objects = previous_objects
+
+
+def git_load_bytes(repo_dir: str, object_reference: str) -> bytes:
+    return git_load_object(repo_dir, object_reference)[1]
+
+
 def git_load_str(repo_dir: str, object_reference: str) -> str:
     repo_dir = adapt_for_remote(repo_dir, object_reference)
-    cmd_line = git_command_line(repo_dir, "show", [object_reference])
-    return git_text_result(cmd_line)
+    object_type, content = git_load_object(repo_dir, object_reference)
+    if object_type != "blob":
+        # Keep the pretty-printed representation for non-blob objects
+        cmd_line = git_command_line(repo_dir, "show", [object_reference])
+        return git_text_result(cmd_line)
+    return decode_text(content)
+
+
+def decode_text(content: bytes) -> str:
+    """ Decode blob content like git_load_str does """
+    return "\n".join(content.decode().splitlines())
 
 
 def git_load_json(repo_dir: str, object_reference: str) -> Union[Dict, List]:
-    repo_dir = adapt_for_remote(repo_dir, object_reference)
-    return json.loads(git_load_str(repo_dir, object_reference))
+    """
+    Load and decode a JSON-object. The result is shared through the object
+    cache and must not be modified.
+    """
+    json_object = get_cached("json", object_reference)
+    if json_object is None:
+        content = git_load_bytes(repo_dir, object_reference)
+        json_object = decode_json_object(content)
+        add_cached(
+            "json",
+            object_reference,
+            json_object,
+            len(content) * decoded_size_factor)
+    return json_object
 
 
 def git_init(repo_dir: str) -> None:
@@ -99,21 +339,39 @@ def git_init(repo_dir: str) -> None:
 
 def git_object_exists_locally(repo_dir: str,
                               object_reference: str) -> bool:
+    for store in _get_pending_stores(repo_dir):
+        object_reference = store.resolve(object_reference)
+        if store.contains(object_reference):
+            return True
+
+    if object_reader == "native":
+        from .native import object_exists
+        return object_exists(repo_dir, object_reference)
+
     cmd_line = git_command_line(repo_dir, "cat-file", ["-e", object_reference])
     return execute(cmd_line).returncode == 0
 
 
 def git_read_tree_node(repo_dir: str,
                        object_reference: str) -> List[str]:
-    repo_dir = adapt_for_remote(repo_dir, object_reference)
-    cmd_line = git_command_line(repo_dir, "cat-file", ["-p", object_reference])
-    return checked_execute(cmd_line)[0]
+    lines = get_cached("tree", object_reference)
+    if lines is None:
+        object_type, content = git_load_object(repo_dir, object_reference)
+        if object_type != "tree":
+            raise RuntimeError(
+                f"Object {object_reference} in {repo_dir} is not a tree, "
+                f"but a {object_type}")
+        lines = tuple(format_tree_lines(content))
+        add_cached(
+            "tree",
+            object_reference,
+            lines,
+            len(content) * decoded_size_factor)
+    return list(lines)
 
 
 def git_ls_tree(repo_dir: str, object_reference: str) -> List[str]:
-    repo_dir = adapt_for_remote(repo_dir, object_reference)
-    cmd_line = git_command_line(repo_dir, "ls-tree", [object_reference])
-    return checked_execute(cmd_line)[0]
+    return git_read_tree_node(repo_dir, object_reference + "^{tree}")
 
 
 def git_ls_tree_recursive(repo_dir: str,
@@ -127,12 +385,193 @@ def git_ls_tree_recursive(repo_dir: str,
     return checked_execute(cmd_line)[0]
 
 
-def git_save_str(repo_dir: str, content: str) -> str:
+def git_resolve_path(repo_dir: str,
+                     tree_reference: str,
+                     path: str) -> Optional[Tuple[str, str]]:
+    """
+    Return the object type and the object hash of the entry at path
+    in the tree tree_reference, or None if there is no such entry.
+
+    The subprocess reader resolves "<tree>:<path>" with a single
+    request to a long-lived "git cat-file --batch-check" process. The
+    native reader, and paths of pending objects, are resolved by
+    reading the trees on the path, without mapping them.
+    """
+    if object_reader == "native" or "\n" in path or _get_pending_stores(repo_dir):
+        return _walk_path(repo_dir, tree_reference, path)
+
+    from .batch import cat_file_check
+
+    repo_dir = adapt_for_remote(repo_dir, tree_reference)
+    result = cat_file_check(repo_dir, f"{tree_reference}:{path}")
+    if result is None:
+        return None
+    object_hash, object_type = result
+    return object_type, object_hash
+
+
+def _walk_path(repo_dir: str,
+               tree_reference: str,
+               path: str) -> Optional[Tuple[str, str]]:
+
+    object_type, object_hash = "tree", tree_reference
+    for name in path.encode().split(b"/"):
+        if object_type != "tree":
+            return None
+        object_type, content = git_load_object(repo_dir, object_hash)
+        if object_type != "tree":
+            return None
+        for _, entry_type, entry_hash, entry_name in parse_tree(content):
+            if entry_name == name:
+                object_type, object_hash = entry_type, entry_hash
+                break
+        else:
+            return None
+    return object_type, object_hash
+
+
+def git_read_tree_recursive(repo_dir: str,
+                            object_reference: str
+                            ) -> List[Tuple[str, str, str, str]]:
+    """
+    Return all entries of the tree object_reference and of its sub-trees
+    as tuples of the form: (flag, object-type, object-hash, path). The
+    entries are ordered like the output of "git ls-tree -r -t", paths
+    are not quoted.
+
+    The entries are read with a single "git ls-tree" call, unless the
+    native reader is selected or objects are pending. In that case the
+    trees are read level by level with batched requests.
+    """
+    if object_reader == "native" or _get_pending_stores(repo_dir):
+        return _walk_tree(repo_dir, object_reference)
+
+    repo_dir = adapt_for_remote(repo_dir, object_reference)
+    cmd_line = git_command_line(
+        repo_dir,
+        "ls-tree",
+        ["-r", "-t", "-z", object_reference])
+    result = _checked_result(cmd_line, execute(cmd_line))
+
+    entries = []
+    for record in result.stdout.split(b"\x00"):
+        if record:
+            info, path = record.split(b"\t", 1)
+            flag, object_type, object_hash = info.decode().split()
+            entries.append((flag, object_type, object_hash, path.decode()))
+    return entries
+
+
+def git_read_trees_recursive(repo_dir: str,
+                             object_references: List[str]
+                             ) -> List[List[Tuple[str, str, str, str]]]:
+    """
+    Return the entries of every tree in object_references, like
+    git_read_tree_recursive. A single tree is listed with one
+    "git ls-tree" call, multiple trees are read together, level by
+    level, with batched requests.
+    """
+    if len(object_references) == 1:
+        return [git_read_tree_recursive(repo_dir, object_references[0])]
+    return _walk_trees(repo_dir, object_references)
+
+
+def _walk_tree(repo_dir: str,
+               object_reference: str
+               ) -> List[Tuple[str, str, str, str]]:
+    return _walk_trees(repo_dir, [object_reference])[0]
+
+
+def _walk_trees(repo_dir: str,
+                object_references: List[str]
+                ) -> List[List[Tuple[str, str, str, str]]]:
+
+    tree_entries: Dict[str, List[Tuple[str, str, str, bytes]]] = dict()
+    level = list(dict.fromkeys(object_references))
+    while level:
+        next_level = []
+        for tree_hash, (object_type, content) in zip(
+                level,
+                git_load_objects(repo_dir, level)):
+
+            if object_type != "tree":
+                raise RuntimeError(
+                    f"Object {tree_hash} in {repo_dir} is not a tree, "
+                    f"but a {object_type}")
+            tree_entries[tree_hash] = parse_tree(content)
+            next_level.extend(
+                object_hash
+                for _, entry_type, object_hash, _ in tree_entries[tree_hash]
+                if entry_type == "tree" and object_hash not in tree_entries)
+        level = list(dict.fromkeys(next_level))
+
+    return [
+        _get_tree_listing(tree_entries, object_reference)
+        for object_reference in object_references
+    ]
+
+
+def _get_tree_listing(tree_entries: Dict[str, List[Tuple[str, str, str, bytes]]],
+                      object_reference: str
+                      ) -> List[Tuple[str, str, str, str]]:
+
+    # Emit the entries depth-first, every sub-tree entry is
+    # followed by the entries of the sub-tree.
+    entries = []
+    stack = [(iter(tree_entries[object_reference]), "")]
+    while stack:
+        tree_iterator, prefix = stack[-1]
+        entry = next(tree_iterator, None)
+        if entry is None:
+            stack.pop()
+            continue
+        flag, object_type, object_hash, name = entry
+        path = prefix + name.decode()
+        entries.append((flag, object_type, object_hash, path))
+        if object_type == "tree":
+            stack.append((iter(tree_entries[object_hash]), path + "/"))
+    return entries
+
+
+def git_save_object(repo_dir: str,
+                    object_type: str,
+                    content: Union[str, bytes]) -> str:
+    """ Write an object with the native writer and return its hash """
+    from .native import write_object
+
+    return write_object(
+        repo_dir,
+        object_type,
+        encode_content(content),
+        fsync_policy)
+
+
+def git_save_str(repo_dir: str, content: Union[str, bytes]) -> str:
+    pending_stores = _get_pending_stores(repo_dir)
+    if pending_stores:
+        return pending_stores[0].save_blob(encode_content(content))
+
+    if object_writer == "native":
+        return git_save_object(repo_dir, "blob", content)
+
     cmd_line = git_command_line(repo_dir, "hash-object", ["-w", "--stdin"])
     return checked_execute(cmd_line, stdin_content=content)[0][0]
 
 
 def git_save_file_list(repo_dir: str, file_list: List[str]) -> List[str]:
+    pending_stores = _get_pending_stores(repo_dir)
+    if pending_stores:
+        return [
+            pending_stores[0].save_blob(Path(file_name).read_bytes())
+            for file_name in file_list
+        ]
+
+    if object_writer == "native":
+        return [
+            git_save_object(repo_dir, "blob", Path(file_name).read_bytes())
+            for file_name in file_list
+        ]
+
     cmd_line = git_command_line(
         repo_dir,
         "hash-object",
@@ -142,34 +581,80 @@ def git_save_file_list(repo_dir: str, file_list: List[str]) -> List[str]:
         stdin_content="\n".join(file_list))[0]
 
 
+def git_save_blobs(repo_dir: str,
+                   blobs: List[Union[str, bytes]]) -> List[str]:
+    """
+    Write a list of blobs and return their hashes. The subprocess
+    writer writes all blobs with a single call to git hash-object.
+    """
+    pending_stores = _get_pending_stores(repo_dir)
+    if pending_stores:
+        return [
+            pending_stores[0].save_blob(encode_content(blob))
+            for blob in blobs
+        ]
+
+    if object_writer == "native":
+        return [
+            git_save_object(repo_dir, "blob", blob)
+            for blob in blobs
+        ]
+
+    with TemporaryDirectory() as temp_dir:
+        file_list = []
+        for index, blob in enumerate(blobs):
+            temp_file_path = Path(temp_dir) / str(index)
+            temp_file_path.write_bytes(encode_content(blob))
+            file_list.append(str(temp_file_path))
+        return git_save_file_list(repo_dir, file_list)
+
+
 def git_save_json(repo_dir: str, json_object: Union[Dict, List]) -> str:
-    return git_save_str(repo_dir, json.dumps(json_object))
+    """ Write json_object with the selected codec, see codec.py """
+    return git_save_str(repo_dir, encode_json_object(json_object))
 
 
 def git_save_tree_node(repo_dir: str,
                        entry_set: Iterable[Tuple[str, str, str, str]]
                        ) -> str:
+    """
+    Write a tree object and return its hash. The subprocess writer
+    uses a long-lived "git mktree --batch" process.
+    """
+    pending_stores = _get_pending_stores(repo_dir)
+    if pending_stores:
+        return pending_stores[0].save_tree(entry_set)
+
+    if object_writer == "native":
+        return git_save_object(repo_dir, "tree", encode_tree(entry_set))
+
+    from .batch import mktree
 
-    tree_spec = "\n".join([
-        f"{flag} {node_type} {object_hash}\t{name}"
-        for flag, node_type, object_hash, name in entry_set
-    ]) + "\n"
-    cmd_line = git_command_line(repo_dir, "mktree", ["--missing", ])
-    return checked_execute(cmd_line, stdin_content=tree_spec)[0][0]
+    return mktree(
+        repo_dir,
+        [
+            f"{flag} {node_type} {object_hash}\t{name}"
+            for flag, node_type, object_hash, name in entry_set
+        ])
 
 
 def git_save_tree(repo_dir: str,
                   entry_set: Iterable[Tuple[str, str, str, str]]
                   ) -> str:
-    tree_spec = "\n".join([
-        f"{flag} {node_type} {object_hash}\t{name}"
-        for flag, node_type, object_hash, name in entry_set
-    ]) + "\n"
-    cmd_line = git_command_line(repo_dir, "mktree", ["--missing", ])
-    return checked_execute(cmd_line, stdin_content=tree_spec)[0][0]
+    return git_save_tree_node(repo_dir, entry_set)
 
 
 def git_update_ref(repo_dir: str, ref_name: str, location: str) -> None:
+    pending_stores = _get_pending_stores(repo_dir)
+    if pending_stores:
+        pending_stores[0].update_ref(ref_name, location)
+        return
+
+    # Make sure that objects are persisted before they become reachable
+    if fsync_policy == "batch":
+        from .native import sync_written_objects
+        sync_written_objects(repo_dir)
+
     cmd_line = git_command_line(
         repo_dir,
         "update-ref",
@@ -178,6 +663,11 @@ def git_update_ref(repo_dir: str, ref_name: str, location: str) -> None:
 
 
 def git_delete_ref(repo_dir: str, ref_name: str) -> None:
+    pending_stores = _get_pending_stores(repo_dir)
+    if pending_stores:
+        pending_stores[0].delete_ref(ref_name)
+        return
+
     cmd_line = git_command_line(
         repo_dir,
         "update-ref",
@@ -1,14 +1,13 @@
 import hashlib
-from pathlib import Path
-from tempfile import TemporaryDirectory
 from typing import (
     Dict,
     List,
+    Optional,
     Tuple,
     Union,
 )
 
-from .gitbackend.subprocess import git_save_file_list
+from .gitbackend.subprocess import git_save_blobs
 
 
 def hash_blob(blob: Union[str, bytes]) -> str:
@@ -29,9 +28,8 @@ class GitBlobCache:
         self.realm = realm
         self.maxsize = maxsize
         self.cached_objects: List[Tuple[Union[str, bytes], str]] = list()
+        self.cached_blobs: Dict[str, Union[str, bytes]] = dict()
         self.flushed_objects: Dict[Union[str, bytes], str] = dict()
-        self.temporary_directory = TemporaryDirectory()
-        self.temp_dir_path = Path(self.temporary_directory.name)
 
         # Assert after member initialisation, so in case of an
         # exception the destructor does still work
@@ -40,7 +38,6 @@ class GitBlobCache:
     def __del__(self):
         if len(self.cached_objects) > 0:
             raise RuntimeError("deleting a non-flushed JSON object cache")
-        self.temporary_directory.cleanup()
 
     def cache_blob(self,
                    realm: str,
@@ -52,35 +49,37 @@ class GitBlobCache:
         if len(self.cached_objects) == self.maxsize:
             self.flush()
         expected_hash = hash_blob(blob)
-        self.cached_objects.append((blob, expected_hash))
+        if expected_hash not in self.cached_blobs:
+            self.cached_objects.append((blob, expected_hash))
+            self.cached_blobs[expected_hash] = blob
         return expected_hash
 
+    def get_blob(self, blob_hash: str) -> Optional[Union[str, bytes]]:
+        """ Return a cached blob that is not yet flushed, or None """
+        return self.cached_blobs.get(blob_hash, None)
+
     def flush(self):
         """
         Write all cached objects to a git repository,
         associate the objects with their hash in
         self.cached_objects.
 
-        Writing is done by creating files in a
-        temporary directory and calling git hash-object
-        with the list of files.
+        Writing is done by a single call to git_save_blobs.
 
         :return: None
         """
         def check_hash(hash: str, expected_hash: str):
             assert hash == expected_hash
 
-        file_list = []
-        for index, (blob, expected_hash) in enumerate(self.cached_objects):
-            temp_file_path = self.temp_dir_path / str(index)
-            with temp_file_path.open("tw") as f:
-                f.write(blob)
-            file_list.append(str(temp_file_path))
+        if not self.cached_objects:
+            return
 
-        hash_values = git_save_file_list(self.realm, file_list)
-        assert len(hash_values) == len(file_list), \
-            f"hash value list length ({len(hash_values)}) and file list length " \
-            f"({len(file_list)}) differ.\n{hash_values}\n{file_list}"
+        hash_values = git_save_blobs(
+            self.realm,
+            [blob for blob, _ in self.cached_objects])
+        assert len(hash_values) == len(self.cached_objects), \
+            f"hash value list length ({len(hash_values)}) and blob list " \
+            f"length ({len(self.cached_objects)}) differ.\n{hash_values}"
 
         hash_dict = {
             blob: hash_values[index]
@@ -89,3 +88,4 @@ class GitBlobCache:
         }
         self.flushed_objects.update(hash_dict)
         self.cached_objects = []
+        self.cached_blobs = dict()
@@ -0,0 +1,32 @@
+from typing import (
+    ContextManager,
+    List,
+)
+
+from .gitbackend.subprocess import git_prefetched_objects
+from .writecache import write_cache
+from ..mapper import Mapper
+
+
+class GitMapper(Mapper):
+    """
+    Base class of all git mappers. Objects that are written while
+    an object is mapped out are kept in the realm's write cache,
+    which is flushed when the outermost map_out call returns.
+    """
+    def write_scope(self, realm: str) -> ContextManager:
+        return write_cache(realm)
+
+    def map_in_many(self,
+                    mappable_objects: List["MappableObject"],
+                    realm: str) -> None:
+
+        # Load the git objects of all mappable objects at once,
+        # map_in will find them in the prefetched objects.
+        with git_prefetched_objects(
+                realm,
+                [
+                    mappable_object.reference.location
+                    for mappable_object in mappable_objects
+                ]):
+            super().map_in_many(mappable_objects, realm)
@@ -1,53 +1,189 @@
-from typing import Dict
+"""
+Mapping of metadata objects to git-blobs
 
-from dataladmetadatamodel.mapper.gitmapper.objectreference import add_blob_reference
+Metadata objects are stored in one of two layouts, which is selected
+with DATALAD_METADATAMODEL_METADATA_LAYOUT or with set_metadata_layout(),
+"blob" is the default:
+
+- "blob": the metadata object, including all instance sets, is stored
+  in a single blob.
+- "tree": every instance set is stored in an individual blob. The
+  metadata blob only contains the locations of the instance set blobs.
+  Instance sets are loaded when they are accessed, and only modified
+  instance sets are written. A git-tree that contains the instance set
+  blobs is written for every metadata object. The instance set trees
+  are collected per realm, and kept reachable by a single git-tree that
+  contains them. This tree is written and added to the object references
+  when an enclosing tree is written out, e.g. a file tree, or when the
+  object references of the realm are flushed.
+
+Both layouts are read independently of the selected layout.
+"""
+import os
+import threading
+from typing import (
+    Dict,
+    List,
+    Set,
+)
+from urllib.parse import quote
+
+from dataladmetadatamodel import (
+    JSONObject,
+    check_serialized_version,
+    version_string,
+)
+from dataladmetadatamodel.mapper.gitmapper.codec import (
+    decode_json_object,
+    encode_json_object,
+)
 from dataladmetadatamodel.mapper.gitmapper.gitbackend.subprocess import (
-    git_load_str,
+    _check_choice,
+    git_load_bytes,
+    git_load_objects,
+    git_prefetched_objects,
+    git_save_json,
     git_save_str,
+    git_save_tree_node,
+)
+from dataladmetadatamodel.mapper.gitmapper.gitmapper import GitMapper
+from dataladmetadatamodel.mapper.gitmapper.objectreference import (
+    _get_realm_key,
+    add_tree_reference,
 )
 from dataladmetadatamodel.mapper.mapper import Mapper
 from dataladmetadatamodel.mapper.reference import Reference
 
-from .gitblobcache import GitBlobCache
+from . import writecache
 
 
-class MetadataGitMapper(Mapper):
+class Strings:
+    INSTANCE_SET_LOCATIONS = "instance_set_locations"
+    INSTANCE_SET_TREE = "instance_set_tree"
 
-    metadata_caches: Dict[str, GitBlobCache] = dict()
 
-    @classmethod
-    def get_cache(cls, realm: str):
-        return cls.metadata_caches.get(realm, None)
+metadata_layouts = ("blob", "tree")
+metadata_layout = os.environ.get(
+    "DATALAD_METADATAMODEL_METADATA_LAYOUT",
+    "blob")
+
+
+def set_metadata_layout(layout: str) -> str:
+    """ Select the metadata layout, return the previously selected layout """
+    global metadata_layout
+
+    _check_choice("metadata layout", layout, metadata_layouts)
+    previous_layout, metadata_layout = metadata_layout, layout
+    return previous_layout
+
+
+def get_metadata_layout() -> str:
+    return metadata_layout
+
+
+# Instance set trees that are not yet contained in a referenced tree,
+# per realm
+_instance_set_trees: Dict[str, Set[str]] = dict()
+_instance_set_trees_lock = threading.Lock()
+
+
+def _add_instance_set_tree(tree_location: str, realm: str):
+    with _instance_set_trees_lock:
+        _instance_set_trees.setdefault(
+            _get_realm_key(realm),
+            set()).add(tree_location)
+
+
+def add_instance_set_tree_reference(realm: str):
+    """
+    Write a tree that contains the instance set trees, which were
+    written to realm since the last call, and add it to the object
+    references of realm.
+    """
+    with _instance_set_trees_lock:
+        tree_locations = _instance_set_trees.pop(_get_realm_key(realm), None)
+    if not tree_locations:
+        return
+
+    try:
+        add_tree_reference(
+            git_save_tree_node(
+                realm,
+                [
+                    ("040000", "tree", tree_location, tree_location)
+                    for tree_location in tree_locations
+                ]),
+            realm)
+    except BaseException:
+        with _instance_set_trees_lock:
+            _instance_set_trees.setdefault(
+                _get_realm_key(realm),
+                set()).update(tree_locations)
+        raise
+
+
+class MetadataGitMapper(GitMapper):
 
     @classmethod
     def cache_realm(cls, realm: str):
-        if cls.get_cache(realm) is not None:
-            raise RuntimeError(f"already caching realm: {realm}")
-        cls.metadata_caches[realm] = GitBlobCache(realm)
+        writecache.cache_realm(realm)
 
     @classmethod
     def flush_realm(cls, realm: str):
-        cache = cls.get_cache(realm)
-        if cache is None:
-            raise RuntimeError(f"realm is not cached: {realm}")
-        cache.flush()
-        del cls.metadata_caches[realm]
+        writecache.flush_realm(realm)
 
     def map_in_impl(self,
                     metadata: "Metadata",
                     realm: str,
-                    meta_reference: Reference) -> None:
+                    reference: Reference) -> None:
 
         from dataladmetadatamodel.metadata import Metadata
-        from dataladmetadatamodel.mapper.reference import Reference
 
         assert isinstance(metadata, Metadata)
 
-        reference = Reference.from_json_str(
-            git_load_str(realm, meta_reference.location))
+        content = git_load_bytes(realm, reference.location)
+        if _is_stored_reference(content):
+            content = git_load_bytes(
+                realm,
+                Reference.from_json_str(content).location)
+
+        json_object = decode_json_object(content)
+        if Strings.INSTANCE_SET_LOCATIONS not in json_object:
+            metadata.init_from_json_obj(json_object)
+            return
+
+        check_serialized_version(json_object)
+        assert json_object["@"]["type"] == "Metadata"
+        for extractor_name, location in json_object[
+                Strings.INSTANCE_SET_LOCATIONS].items():
+            metadata.instance_sets.set_stored(
+                extractor_name,
+                realm,
+                location,
+                _load_instance_sets)
 
-        metadata.init_from_json(
-            git_load_str(realm, reference.location))
+    def map_in_many(self,
+                    metadata_objects: List["Metadata"],
+                    realm: str) -> None:
+
+        # Version 2 stores metadata in two blobs, a reference blob
+        # and the metadata blob. Load all blobs that are referenced
+        # by the metadata objects at once, and then the metadata blobs
+        # of version 2 reference blobs.
+        locations = [
+            metadata.reference.location
+            for metadata in metadata_objects
+        ]
+        with git_prefetched_objects(realm, locations):
+            metadata_locations = [
+                Reference.from_json_str(content).location
+                for content in (
+                    git_load_bytes(realm, location)
+                    for location in locations)
+                if _is_stored_reference(content)
+            ]
+            with git_prefetched_objects(realm, metadata_locations):
+                Mapper.map_in_many(self, metadata_objects, realm)
 
     def map_out_impl(self,
                      metadata: "Metadata",
@@ -57,62 +193,67 @@ class MetadataGitMapper(Mapper):
         from dataladmetadatamodel.metadata import Metadata
         assert isinstance(metadata, Metadata)
 
-        cache = self.get_cache(realm)
-        if cache is None:
-            return self.map_out_impl_immediate(metadata, realm, force_write)
-        else:
-            return self.map_out_impl_cached(cache, metadata, realm)
-
-    def map_out_impl_immediate(self,
-                               metadata: "Metadata",
-                               realm: str,
-                               force_write: bool) -> Reference:
-
-        # Save metadata object and add it to the
-        # blob-references. That is necessary because
-        # metadata blobs are only referenced in
-        # persisted Reference-objects, i.e. in
-        # JSON-strings that are stored in the
-        # repository.
-        metadata_blob_location = git_save_str(realm, metadata.to_json())
-        add_blob_reference(metadata_blob_location)
-
-        # Save reference. NB we don't add the metadata reference to the object
-        # tree here. Our "owner" will do that if necessary. For example, the
-        # "MetadataRootRecord"-mapper will save the reference if it is used for
-        # dataset-level metadata. It will not save it, if it is used for
-        # file-level metadata, because that is reachable in a git-tree that is
-        # added to the object tree.
-        metadata_reference_blob_location = git_save_str(
-            realm,
-            Reference(
-                "Metadata",
-                metadata_blob_location).to_json_str())
-
-        # Return reference to reference, although it specifies
-        # the class Metadata, it points actually to a
-        # persisted Reference object. But this is only known
-        # internally in this mapper.
+        if metadata_layout == "tree":
+            return self._map_out_instance_sets(metadata, realm)
+
+        # Save the metadata object and return a reference to the metadata
+        # blob. NB we don't add the blob to the object references here. Our
+        # "owner" will do that if necessary. For example, the
+        # "MetadataRootRecord"-mapper will add the blob if it is used for
+        # dataset-level metadata. It will not add it, if it is used for
+        # file-level metadata, because that is reachable in a git-tree that
+        # is added to the object references.
         return Reference(
             "Metadata",
-            metadata_reference_blob_location)
+            git_save_str(
+                realm,
+                encode_json_object(metadata.to_json_obj())))
 
-    def map_out_impl_cached(self,
-                            cache: GitBlobCache,
-                            metadata: "Metadata",
-                            realm: str) -> Reference:
+    @staticmethod
+    def _map_out_instance_sets(metadata: "Metadata",
+                               realm: str) -> Reference:
 
-        # Cache metadata, and cache a reference object. the
-        # following code is "cache"-equivalent to the immediate case
-        metadata_blob_location = cache.cache_blob(realm, metadata.to_json())
-        add_blob_reference(metadata_blob_location)
+        # Write the modified instance sets, and the tree that keeps
+        # all instance sets reachable. The tree is referenced with the
+        # enclosing tree, see add_instance_set_tree_reference().
+        instance_sets = metadata.instance_sets
+        locations = dict()
+        for extractor_name in instance_sets:
+            location = instance_sets.get_stored_location(extractor_name, realm)
+            if location is None:
+                location = git_save_json(
+                    realm,
+                    instance_sets.get_json_obj(extractor_name))
+                instance_sets.set_saved(extractor_name, realm, location)
+            locations[extractor_name] = location
 
-        metadata_reference_blob_location = cache.cache_blob(
-            realm,
-            Reference(
-                "Metadata",
-                metadata_blob_location).to_json_str())
+        json_object = {
+            "@": dict(type="Metadata", version=version_string),
+            Strings.INSTANCE_SET_LOCATIONS: locations
+        }
+        if locations:
+            tree_location = git_save_tree_node(
+                realm,
+                [
+                    ("100644", "blob", location, quote(extractor_name, safe=""))
+                    for extractor_name, location in locations.items()
+                ])
+            _add_instance_set_tree(tree_location, realm)
+            json_object[Strings.INSTANCE_SET_TREE] = tree_location
 
-        return Reference(
-            "Metadata",
-            metadata_reference_blob_location)
+        return Reference("Metadata", git_save_json(realm, json_object))
+
+
+def _load_instance_sets(realm: str, locations: List[str]) -> List[JSONObject]:
+    return [
+        decode_json_object(content)
+        for _, content in git_load_objects(realm, locations)
+    ]
+
+
+def _is_stored_reference(content: bytes) -> bool:
+    """
+    Check whether content is a version 2 reference blob. Those are
+    written by json.dumps and start with the reference header.
+    """
+    return content.startswith(b'{"@": {"type": "Reference"')
@@ -8,7 +8,10 @@ from dataladmetadatamodel.mapper.gitmapper.objectreference import (
     add_blob_reference,
     add_tree_reference,
 )
-from dataladmetadatamodel.mapper.mapper import Mapper
+from dataladmetadatamodel.mapper.gitmapper.gitmapper import GitMapper
+from dataladmetadatamodel.mapper.gitmapper.metadatamapper import (
+    add_instance_set_tree_reference,
+)
 from dataladmetadatamodel.mapper.reference import Reference
 
 
@@ -20,7 +23,7 @@ class Strings:
     FILE_TREE = "file_tree"
 
 
-class MetadataRootRecordGitMapper(Mapper):
+class MetadataRootRecordGitMapper(GitMapper):
     def map_in_impl(self,
                     metadata_root_record: "MetadataRootRecord",
                     realm: str,
@@ -76,7 +79,7 @@ class MetadataRootRecordGitMapper(Mapper):
                 "git",
                 force_write)
             if not file_tree_reference.is_none_reference():
-                add_tree_reference(file_tree_reference.location)
+                add_tree_reference(file_tree_reference.location, realm)
 
         if mrr.dataset_level_metadata is None:
             dataset_level_metadata_reference = Reference.get_none_reference("Metadata")
@@ -85,7 +88,8 @@ class MetadataRootRecordGitMapper(Mapper):
                 realm,
                 "git",
                 force_write)
-            add_blob_reference(dataset_level_metadata_reference.location)
+            add_blob_reference(dataset_level_metadata_reference.location, realm)
+            add_instance_set_tree_reference(realm)
 
         json_object = {
             Strings.DATASET_IDENTIFIER: str(mrr.dataset_identifier),
@@ -0,0 +1,102 @@
+"""
+Migration of git-realms to the current storage version
+
+Objects that are stored in an older, but supported, version are read
+transparently, and written in the current version when they are
+modified. The migration rewrites all objects of a realm in the current
+version, i.e. it reads all objects that are reachable from the tree
+version list and from the UUID set of the realm, marks them as modified,
+and writes them out.
+
+Version 3 stores metadata blobs without an intermediate reference blob,
+a migration from version 2 therefore halves the number of blobs that
+are read for file-level metadata. The objects of the old version are
+not deleted, they stay reachable through the object reference store.
+
+All objects of the realm are kept in memory during the migration.
+
+Usage:
+
+    python -m dataladmetadatamodel.mapper.gitmapper.migration <realm>
+"""
+import argparse
+import logging
+from pathlib import Path
+from typing import (
+    List,
+    Union,
+)
+
+from dataladmetadatamodel.mappableobject import MappableObject
+from dataladmetadatamodel.mapper.mapper import read_in_many
+from dataladmetadatamodel.mtreenode import MTreeNode
+from dataladmetadatamodel.mtreeproxy import MTreeProxy
+
+from .objectreference import object_reference_session
+
+
+logger = logging.getLogger("datalad.metalad.gitmapper.migration")
+
+
+def _touch_all(mappable_object: MappableObject) -> int:
+    """
+    Read in mappable_object and all its sub-objects, level by level, and
+    mark them as modified. Return the number of objects.
+    """
+    count = 0
+    level: List[MappableObject] = [mappable_object]
+    while level:
+        level = [
+            current.mtree if isinstance(current, MTreeProxy) else current
+            for current in level]
+
+        next_level = []
+        for current in read_in_many(level):
+            current.touch()
+            # Tree nodes only report children that were accessed
+            if isinstance(current, MTreeNode):
+                next_level.extend(current.child_nodes.values())
+            else:
+                next_level.extend(current.modifiable_sub_objects)
+
+        count += len(level)
+        level = next_level
+    return count
+
+
+def migrate_realm(realm: Union[str, Path]) -> bool:
+    """
+    Rewrite all objects of realm in the current storage version. Return
+    False if the realm contains no metadata.
+    """
+    from dataladmetadatamodel.common import get_top_level_metadata_objects
+
+    realm = str(realm)
+    tree_version_list, uuid_set = get_top_level_metadata_objects("git", realm)
+    if tree_version_list is None or uuid_set is None:
+        return False
+
+    count = _touch_all(tree_version_list) + _touch_all(uuid_set)
+    logger.info(f"migrating {count} objects in {realm}")
+
+    with object_reference_session(realm):
+        tree_version_list.write_out(realm)
+        uuid_set.write_out(realm)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Rewrite the metadata in git-realms in the current "
+                    "storage version")
+    parser.add_argument("realm", nargs="+", help="path of a git-realm")
+    arguments = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    for realm in arguments.realm:
+        if not migrate_realm(realm):
+            logger.warning(f"no metadata found in {realm}")
+
+
+if __name__ == "__main__":
+    main()
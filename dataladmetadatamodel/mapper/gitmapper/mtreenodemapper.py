@@ -1,25 +1,36 @@
 import codecs
+from typing import (
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
 
 from .gitbackend.subprocess import (
     git_read_tree_node,
+    git_read_trees_recursive,
+    git_resolve_path,
     git_save_tree_node,
 )
+from .gitmapper import GitMapper
 from .utils import split_git_lstree_line
-from ..mapper import Mapper
 from ..reference import Reference
 
 
-class MTreeNodeGitMapper(Mapper):
+class MTreeNodeGitMapper(GitMapper):
 
     def map_in_impl(self,
                     mtree_node: "MTreeNode",
                     realm: str,
                     reference: Reference) -> None:
 
-        from dataladmetadatamodel.mtreenode import MTreeNode
+        from dataladmetadatamodel.mtreenode import (
+            ChildNodes,
+            MTreeNode,
+        )
 
         if reference.is_none_reference():
-            mtree_node.child_nodes = dict()
+            mtree_node.child_nodes = ChildNodes(mtree_node)
             return
 
         assert isinstance(mtree_node, MTreeNode)
@@ -27,25 +38,91 @@ class MTreeNodeGitMapper(Mapper):
         lines = git_read_tree_node(realm,
                                    reference.location)
 
+        # Children are kept as stored entries until they are accessed
+        entries = []
         for line in lines:
             flag, node_type, hash_value, name = split_git_lstree_line(line)
             if name.startswith('"'):
                 name = codecs.escape_decode(name[1:-1])[0].decode("utf-8")
+            if node_type not in ("tree", "blob"):
+                raise ValueError(f"unknown git tree entry type: {node_type}")
+            entries.append((name, node_type == "tree", hash_value))
+
+        mtree_node.child_nodes = ChildNodes(mtree_node)
+        mtree_node.child_nodes.set_stored(realm, entries)
+
+    def read_stored_trees_many(self,
+                               mtree_nodes: List["MTreeNode"],
+                               realm: str
+                               ) -> Dict[str, List[Tuple[str, bool, str]]]:
+
+        locations = list(dict.fromkeys(
+            mtree_node.reference.location
+            for mtree_node in mtree_nodes
+            if not mtree_node.reference.is_none_reference()))
+        if not locations:
+            return dict()
+
+        # All trees are listed together, the listings are split into
+        # the entries of the individual trees.
+        stored_trees = dict()
+        for location, listing in zip(
+                locations,
+                git_read_trees_recursive(realm, locations)):
+
+            tree_locations = {"": location}
+            tree_entries = {"": []}
+            for _, node_type, hash_value, path in listing:
+                if node_type not in ("tree", "blob"):
+                    raise ValueError(f"unknown git tree entry type: {node_type}")
+                parent_path, _, name = path.rpartition("/")
+                tree_entries[parent_path].append(
+                    (name, node_type == "tree", hash_value))
+                if node_type == "tree":
+                    tree_locations[path] = hash_value
+                    tree_entries[path] = []
+
+            for path, entries in tree_entries.items():
+                stored_trees.setdefault(tree_locations[path], entries)
+        return stored_trees
+
+    def map_in_object_at_path(self,
+                              mtree_node: "MTreeNode",
+                              realm: str,
+                              reference: Reference,
+                              path: "MetadataPath"
+                              ) -> Optional["MappableObject"]:
+
+        if reference.is_none_reference():
+            return None
 
-            if node_type == "tree":
-                child = MTreeNode(
-                    leaf_class=mtree_node.leaf_class,
-                    realm=realm,
-                    reference=Reference("MTreeNode", hash_value))
+        result = git_resolve_path(realm, reference.location, str(path))
+        if result is None:
+            return None
 
-            elif node_type == "blob":
-                child = mtree_node.leaf_class.get_empty_instance(
-                    realm=realm,
-                    reference=Reference(mtree_node.leaf_class_name, hash_value))
+        node_type, hash_value = result
+        return self._create_child(mtree_node, realm, node_type, hash_value)
 
-            else:
-                raise ValueError(f"unknown git tree entry type: {node_type}")
-            mtree_node.child_nodes[name] = child
+    @staticmethod
+    def _create_child(mtree_node: "MTreeNode",
+                      realm: str,
+                      node_type: str,
+                      hash_value: str) -> "MappableObject":
+
+        from dataladmetadatamodel.mtreenode import MTreeNode
+
+        if node_type == "tree":
+            return MTreeNode(
+                leaf_class=mtree_node.leaf_class,
+                realm=realm,
+                reference=Reference.intern("MTreeNode", hash_value))
+
+        elif node_type == "blob":
+            return mtree_node.leaf_class.get_empty_instance(
+                realm=realm,
+                reference=Reference.intern(mtree_node.leaf_class_name, hash_value))
+
+        raise ValueError(f"unknown git tree entry type: {node_type}")
 
     def map_out_impl(self,
                      mtree_node: "MTreeNode",
@@ -59,17 +136,34 @@ class MTreeNodeGitMapper(Mapper):
         if not mtree_node.child_nodes:
             return Reference.get_none_reference("MTreeNode")
 
-        for child_node in mtree_node.child_nodes.values():
+        # Children that were not accessed are written with their stored
+        # object hash, if they are stored in realm.
+        stored_entries = mtree_node.child_nodes.get_stored_entries(realm)
+        if stored_entries is None:
+            stored_entries = []
+            child_items = list(mtree_node.child_nodes.items())
+        else:
+            child_items = list(mtree_node.child_nodes.accessed_items())
+
+        for _, child_node in child_items:
             child_node.write_out(realm)
 
         dir_entries = [
+            (
+                "040000" if is_tree else "100644",
+                "tree" if is_tree else "blob",
+                object_hash,
+                self.escape_double_quotes(child_name)
+            )
+            for child_name, is_tree, object_hash in stored_entries
+        ] + [
             (
                 "040000" if isinstance(child_node, MTreeNode) else "100644",
                 "tree" if isinstance(child_node, MTreeNode) else "blob",
                 child_node.reference.location,
                 self.escape_double_quotes(child_name)
             )
-            for child_name, child_node in mtree_node.child_nodes.items()
+            for child_name, child_node in child_items
         ]
         mtree_node_location = git_save_tree_node(realm, dir_entries)
         return Reference("MTreeNode", mtree_node_location)
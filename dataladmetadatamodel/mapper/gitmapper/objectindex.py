@@ -0,0 +1,422 @@
+"""
+Sorted fan-out index format for the object reference store
+
+The object reference store keeps all objects of a metadata model
+reachable from a single git reference. In the index format, the
+reference points to a tree with a "base"-segment and up to
+"max_delta_segments" delta segments:
+
+    base
+    delta-000001
+    delta-000002
+    ...
+
+Every segment is a tree that contains:
+
+    index       a blob with the sorted hashes of the segment, see
+                ObjectIndex
+    objects     a tree with sub-trees "00" to "ff" that contain the
+                referenced objects, named by their hash. They keep the
+                referenced objects reachable.
+
+A flush writes the new references, i.e. references that are not in any
+segment, into a new delta segment. If the number of delta segments
+exceeds "max_delta_segments", the delta segments are merged into the
+base segment. Only those "objects"-sub-trees of the base segment that
+receive new references are rewritten.
+"""
+import struct
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import (
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from .gitbackend.objectformat import parse_tree
+from .gitbackend.subprocess import (
+    git_load_objects,
+    git_save_str,
+    git_save_tree_node,
+    git_update_ref,
+)
+from .treeupdater import EntryType
+
+
+index_magic = b"DLOI"
+index_version = 1
+
+# Number of delta segments that are kept before they are merged into
+# the base segment.
+max_delta_segments = 8
+
+# Number of decoded indices that are kept in memory. Index blobs are
+# immutable, they are cached by their hash.
+max_cached_indices = 64
+
+
+_header = struct.Struct(">4sBB2x")
+_fan_out = struct.Struct(">256I")
+
+_entry_types = {
+    EntryType.File: 0,
+    EntryType.Directory: 1,
+}
+
+_tree_entry_elements = {
+    EntryType.File: ("100644", "blob"),
+    EntryType.Directory: ("040000", "tree"),
+}
+
+
+class ObjectIndex:
+    """
+    A sorted list of fixed-width binary object hashes with a 256-entry
+    fan-out table, similar to the index of a git pack file. The encoded
+    index has the following layout, integers are big-endian:
+
+        header      magic "DLOI", version (1 byte), hash width
+                    in bytes (1 byte), 2 reserved bytes
+        fan-out     256 unsigned 32-bit integers, entry i is the
+                    number of hashes whose first byte is at most i
+        hashes      the sorted binary hashes
+        types       one byte per hash: 0 for blobs, 1 for trees
+
+    Lookups are performed on the encoded content, i.e. an index is not
+    decoded into individual hashes.
+    """
+    def __init__(self, content: bytes):
+        if len(content) < _header.size + _fan_out.size:
+            raise ValueError("object index is too short")
+
+        magic, version, self.hash_width = _header.unpack_from(content)
+        if magic != index_magic or version != index_version:
+            raise ValueError(
+                f"unsupported object index: magic {magic}, "
+                f"version {version}")
+
+        self.fan_out = _fan_out.unpack_from(content, _header.size)
+        self.hashes_start = _header.size + _fan_out.size
+        self.types_start = self.hashes_start + len(self) * self.hash_width
+        if len(content) != self.types_start + len(self):
+            raise ValueError("object index has an invalid size")
+        self.content = content
+
+    def __len__(self) -> int:
+        return self.fan_out[255]
+
+    def __contains__(self, object_hash: str) -> bool:
+        return self.find(object_hash) is not None
+
+    @staticmethod
+    def from_entries(entries: Iterable[Tuple[EntryType, str]]
+                     ) -> "ObjectIndex":
+        return ObjectIndex(encode_index(entries))
+
+    def get_hash(self, position: int) -> bytes:
+        start = self.hashes_start + position * self.hash_width
+        return self.content[start:start + self.hash_width]
+
+    def get_type(self, position: int) -> EntryType:
+        if self.content[self.types_start + position] == 0:
+            return EntryType.File
+        return EntryType.Directory
+
+    def get_range(self, first_byte: int) -> Tuple[int, int]:
+        """ Return the positions of the hashes that start with first_byte """
+        start = self.fan_out[first_byte - 1] if first_byte > 0 else 0
+        return start, self.fan_out[first_byte]
+
+    def find(self, object_hash: str) -> Optional[int]:
+        """ Return the position of object_hash, or None """
+        binary_hash = bytes.fromhex(object_hash)
+        if len(binary_hash) != self.hash_width:
+            return None
+
+        low, high = self.get_range(binary_hash[0])
+        while low < high:
+            middle = (low + high) // 2
+            current_hash = self.get_hash(middle)
+            if current_hash < binary_hash:
+                low = middle + 1
+            elif current_hash > binary_hash:
+                high = middle
+            else:
+                return middle
+        return None
+
+    def entries(self,
+                first_byte: Optional[int] = None
+                ) -> Iterable[Tuple[EntryType, str]]:
+        """
+        Yield all entries of the index, or the entries whose hash
+        starts with first_byte, in hash order.
+        """
+        start, end = (
+            self.get_range(first_byte)
+            if first_byte is not None
+            else (0, len(self)))
+
+        for position in range(start, end):
+            yield self.get_type(position), self.get_hash(position).hex()
+
+
+def encode_index(entries: Iterable[Tuple[EntryType, str]]) -> bytes:
+    """ Encode the given entries, duplicates are removed """
+    binary_entries = sorted({
+        bytes.fromhex(object_hash): entry_type
+        for entry_type, object_hash in entries
+    }.items())
+
+    hash_width = len(binary_entries[0][0]) if binary_entries else 20
+    fan_out = [0] * 256
+    for binary_hash, _ in binary_entries:
+        if len(binary_hash) != hash_width:
+            raise ValueError(
+                f"hashes of different width in object index: "
+                f"{binary_hash.hex()}")
+        fan_out[binary_hash[0]] += 1
+    for first_byte in range(1, 256):
+        fan_out[first_byte] += fan_out[first_byte - 1]
+
+    return b"".join([
+        _header.pack(index_magic, index_version, hash_width),
+        _fan_out.pack(*fan_out),
+        b"".join(binary_hash for binary_hash, _ in binary_entries),
+        bytes(_entry_types[entry_type] for _, entry_type in binary_entries)
+    ])
+
+
+_index_cache: Dict[str, ObjectIndex] = OrderedDict()
+_index_cache_lock = threading.Lock()
+
+
+def _load_indices(realm: Path,
+                  index_hashes: List[str]
+                  ) -> List[ObjectIndex]:
+
+    with _index_cache_lock:
+        indices = {
+            index_hash: _index_cache[index_hash]
+            for index_hash in index_hashes
+            if index_hash in _index_cache}
+
+    missing = [
+        index_hash
+        for index_hash in index_hashes
+        if index_hash not in indices]
+
+    for index_hash, (_, content) in zip(
+            missing,
+            git_load_objects(str(realm), missing)):
+        indices[index_hash] = ObjectIndex(content)
+        _cache_index(index_hash, indices[index_hash])
+
+    return [indices[index_hash] for index_hash in index_hashes]
+
+
+def _cache_index(index_hash: str, index: ObjectIndex):
+    with _index_cache_lock:
+        _index_cache[index_hash] = index
+        while len(_index_cache) > max_cached_indices:
+            _index_cache.popitem(last=False)
+
+
+def _read_trees(realm: Path,
+                tree_hashes: List[str]
+                ) -> List[Dict[str, Tuple[str, str]]]:
+    """ Return the entries of the given trees as: name -> (type, hash) """
+    return [
+        {
+            name.decode(): (entry_type, entry_hash)
+            for _, entry_type, entry_hash, name in parse_tree(content)
+        }
+        for _, content in git_load_objects(str(realm), tree_hashes)]
+
+
+@dataclass
+class Segment:
+    name: str
+    tree_hash: str
+    index_hash: str
+    objects_hash: str
+    index: Optional[ObjectIndex] = None
+
+
+def read_segments(realm: Path, reference: str) -> List[Segment]:
+    """
+    Read the segments of the store at reference, the base segment
+    comes first. Raise RuntimeError if the store does not exist.
+    """
+    root_entries = _read_trees(realm, [reference])[0]
+    names = sorted(root_entries, key=lambda name: name != "base")
+    segment_entries = _read_trees(
+        realm,
+        [root_entries[name][1] for name in names])
+
+    segments = [
+        Segment(
+            name,
+            root_entries[name][1],
+            entries["index"][1],
+            entries["objects"][1])
+        for name, entries in zip(names, segment_entries)]
+
+    for segment, index in zip(
+            segments,
+            _load_indices(
+                realm,
+                [segment.index_hash for segment in segments])):
+        segment.index = index
+    return segments
+
+
+def _write_objects_tree(realm: Path,
+                        index: ObjectIndex,
+                        first_bytes: Iterable[int],
+                        previous_entries: Optional[Dict] = None
+                        ) -> str:
+    """
+    Write the objects-tree of a segment. The sub-trees of first_bytes are
+    written from index, all other sub-trees are taken from
+    previous_entries.
+    """
+    sub_trees = {
+        name: ("040000", "tree", sub_tree_hash, name)
+        for name, (_, sub_tree_hash) in (previous_entries or {}).items()}
+
+    for first_byte in first_bytes:
+        sub_trees[f"{first_byte:02x}"] = (
+            "040000",
+            "tree",
+            git_save_tree_node(
+                str(realm),
+                [
+                    _tree_entry_elements[entry_type] + (object_hash, object_hash)
+                    for entry_type, object_hash in index.entries(first_byte)
+                ]),
+            f"{first_byte:02x}")
+
+    return git_save_tree_node(str(realm), sub_trees.values())
+
+
+def _write_segment(realm: Path,
+                   index: ObjectIndex,
+                   first_bytes: Iterable[int],
+                   previous_objects: Optional[Dict] = None
+                   ) -> str:
+
+    index_hash = git_save_str(str(realm), index.content)
+    _cache_index(index_hash, index)
+    objects_hash = _write_objects_tree(
+        realm,
+        index,
+        first_bytes,
+        previous_objects)
+
+    return git_save_tree_node(
+        str(realm),
+        [
+            ("100644", "blob", index_hash, "index"),
+            ("040000", "tree", objects_hash, "objects")
+        ])
+
+
+def _first_bytes(index: ObjectIndex) -> Set[int]:
+    return {
+        first_byte
+        for first_byte in range(256)
+        if index.get_range(first_byte)[0] != index.get_range(first_byte)[1]}
+
+
+def add_indexed_references(realm: Path,
+                           reference: str,
+                           references: Iterable[Tuple[EntryType, str]]
+                           ) -> int:
+    """
+    Add references to the index store at reference, create the store if
+    it does not exist. Return the number of references that were new.
+    """
+    try:
+        segments = read_segments(realm, reference)
+    except RuntimeError:
+        segments = []
+
+    new_references = [
+        (entry_type, object_hash)
+        for entry_type, object_hash in set(references)
+        if not any(object_hash in segment.index for segment in segments)]
+
+    if not new_references:
+        return 0
+
+    delta_index = ObjectIndex.from_entries(new_references)
+    delta_names = [
+        segment.name
+        for segment in segments
+        if segment.name != "base"]
+
+    root_entries = {
+        segment.name: segment.tree_hash
+        for segment in segments}
+
+    if len(delta_names) + 1 > max_delta_segments:
+        base_segments = [
+            segment
+            for segment in segments
+            if segment.name == "base"]
+
+        merged_index = ObjectIndex.from_entries(
+            entry
+            for index in [segment.index for segment in segments] + [delta_index]
+            for entry in index.entries())
+
+        changed_first_bytes = _first_bytes(delta_index)
+        for segment in segments:
+            if segment.name != "base":
+                changed_first_bytes |= _first_bytes(segment.index)
+
+        previous_objects = (
+            _read_trees(realm, [base_segments[0].objects_hash])[0]
+            if base_segments
+            else None)
+
+        root_entries = {
+            "base": _write_segment(
+                realm,
+                merged_index,
+                changed_first_bytes,
+                previous_objects)
+        }
+    else:
+        next_number = max(
+            [int(name[len("delta-"):]) for name in delta_names] or [0]) + 1
+        root_entries[f"delta-{next_number:06d}"] = _write_segment(
+            realm,
+            delta_index,
+            _first_bytes(delta_index))
+
+    tree_hash = git_save_tree_node(
+        str(realm),
+        [
+            ("040000", "tree", segment_hash, name)
+            for name, segment_hash in root_entries.items()
+        ])
+    git_update_ref(str(realm), reference, tree_hash)
+    return len(new_references)
+
+
+def read_indexed_references(realm: Path,
+                            reference: str
+                            ) -> List[Tuple[EntryType, str]]:
+    """ Return all references of the index store at reference """
+    return [
+        entry
+        for segment in read_segments(realm, reference)
+        for entry in segment.index.entries()]
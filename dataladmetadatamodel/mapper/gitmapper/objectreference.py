@@ -1,40 +1,160 @@
 import enum
 import logging
+import os
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 from typing import (
+    Dict,
+    Iterable,
+    List,
+    Optional,
     Set,
     Tuple,
+    Union,
 )
 
 from ...mapper.reference import none_location
+from .gitbackend.subprocess import _check_choice
 from .treeupdater import EntryType
 from .utils import split_git_lstree_line
 
 
 logger = logging.getLogger("datalad.metalad.gitmapper.objectreference")
 
-cached_object_references: Set[Tuple[EntryType, str]] = set()
-
 
 class GitReference(enum.Enum):
     TREE_VERSION_LIST = "refs/datalad/dataset-tree-version-list"
     UUID_SET = "refs/datalad/dataset-uuid-set"
     OBJECT_REFERENCES = "refs/datalad/object-references-2.0"
+    OBJECT_INDEX = "refs/datalad/object-references-index"
     LEGACY_TREES = "refs/datalad/object-references/trees"
     LEGACY_BLOBS = "refs/datalad/object-references/blobs"
 
 
-checked_legacy_stores = set()
+class ObjectReferences:
+    """
+    Accumulates the object references of a realm until they are
+    flushed to the reference store of the realm.
+    """
+    def __init__(self):
+        self.references: Set[Tuple[EntryType, str]] = set()
+        self.lock = threading.Lock()
+        # Flushes of a realm are serialized, flushes of different
+        # realms can proceed concurrently.
+        self.flush_lock = threading.Lock()
+        self.legacy_stores_checked = False
+        self.tree_store_checked = False
+
+    def __contains__(self, entry: Tuple[EntryType, str]) -> bool:
+        with self.lock:
+            return entry in self.references
+
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self.references)
+
+    def update(self, entries: Iterable[Tuple[EntryType, str]]):
+        with self.lock:
+            self.references.update(entries)
+
+    def take(self) -> Set[Tuple[EntryType, str]]:
+        """ Remove and return all references """
+        with self.lock:
+            references, self.references = self.references, set()
+        return references
+
+
+# Object references per realm. References that are added without a realm
+# are kept under None, they are flushed into the next flushed realm.
+_object_references: Dict[Optional[str], ObjectReferences] = dict()
+_object_references_lock = threading.Lock()
+
+# Realms of the active object reference sessions, per thread
+_sessions = threading.local()
+
+
+def _get_realm_key(realm: Optional[Union[str, Path]]) -> Optional[str]:
+    """
+    Return the key of realm in the accumulators. Different spellings of
+    a realm, e.g. relative paths or symlinks, yield the same key.
+    """
+    return os.path.realpath(str(realm)) if realm is not None else None
+
+
+def get_object_references(realm: Optional[Union[str, Path]]
+                          ) -> ObjectReferences:
+    """ Return the references of realm that are not yet flushed """
+    key = _get_realm_key(realm)
+    with _object_references_lock:
+        object_references = _object_references.get(key, None)
+        if object_references is None:
+            object_references = ObjectReferences()
+            _object_references[key] = object_references
+    return object_references
+
+
+@contextmanager
+def object_reference_session(realm: Union[str, Path]):
+    """
+    Assign references that are added in the current thread without a
+    realm to realm, and flush the references of realm, if the session
+    ends without an error.
+    """
+    realms = getattr(_sessions, "realms", None)
+    if realms is None:
+        realms = _sessions.realms = []
+
+    realms.append(str(realm))
+    try:
+        yield get_object_references(realm)
+    finally:
+        realms.pop()
+    flush_object_references(Path(realm))
+
+
+def _get_session_realm() -> Optional[str]:
+    realms = getattr(_sessions, "realms", None)
+    return realms[-1] if realms else None
+
+
+# Object references are either stored in a tree of hash-prefix
+# directories ("tree"), or in sorted index segments ("index"), see
+# objectindex. Existing tree stores are migrated to the index format.
+object_reference_formats = ("tree", "index")
+object_reference_format = os.environ.get(
+    "DATALAD_METADATAMODEL_OBJECT_REFERENCE_FORMAT",
+    "tree")
+
+
+def set_object_reference_format(reference_format: str) -> str:
+    """ Select the store format, return the previously selected format """
+    global object_reference_format
+
+    _check_choice(
+        "object reference format",
+        reference_format,
+        object_reference_formats)
+    previous_format, object_reference_format = (
+        object_reference_format,
+        reference_format)
+    return previous_format
+
+
+def get_object_reference_format() -> str:
+    return object_reference_format
 
 
 def add_object_reference(entry_type: EntryType,
-                         object_hash: str):
+                         object_hash: str,
+                         realm: Optional[Union[str, Path]] = None):
 
     if object_hash == none_location:
         logger.warning("attempt to add a None-reference")
         return
 
-    cached_object_references.add((entry_type, object_hash))
+    get_object_references(realm or _get_session_realm()).update(
+        [(entry_type, object_hash)])
 
 
 def add_legacy_store_entries_from(realm: Path,
@@ -51,8 +171,9 @@ def add_legacy_store_entries_from(realm: Path,
         logger.info(f"converting legacy reference store at {realm} (ref: "
                     f"{reference.value}) to new format")
 
-        for entry in legacy_entries:
-            cached_object_references.add((entry_type, entry[2]))
+        get_object_references(realm).update(
+            (entry_type, entry[2])
+            for entry in legacy_entries)
         return True
     except RuntimeError:
         return False
@@ -62,8 +183,9 @@ def add_legacy_store_entries(realm: Path) -> Tuple[bool, bool]:
     """
     Add legacy store entries to the cache, if they exist
     """
-    if realm not in checked_legacy_stores:
-        checked_legacy_stores.add(realm)
+    object_references = get_object_references(realm)
+    if not object_references.legacy_stores_checked:
+        object_references.legacy_stores_checked = True
 
         legacy_trees_added = add_legacy_store_entries_from(
             realm,
@@ -80,6 +202,46 @@ def add_legacy_store_entries(realm: Path) -> Tuple[bool, bool]:
     return False, False
 
 
+def _read_tree_store_entries(realm: Path) -> List[Tuple[EntryType, str]]:
+    """
+    Read the references from a tree store, i.e. from the leaves of the
+    "abc/def/ghi/rest"-trees. The trees are read level by level.
+    """
+    from .gitbackend.objectformat import parse_tree
+    from .gitbackend.subprocess import git_load_objects
+
+    level = [GitReference.OBJECT_REFERENCES.value]
+    for _ in range(4):
+        entries = [
+            (entry_type, object_hash)
+            for _, content in git_load_objects(str(realm), level)
+            for _, entry_type, object_hash, _ in parse_tree(content)]
+        level = [object_hash for _, object_hash in entries]
+
+    return [
+        (
+            EntryType.Directory if entry_type == "tree" else EntryType.File,
+            object_hash
+        )
+        for entry_type, object_hash in entries]
+
+
+def add_tree_store_entries(realm: Path) -> bool:
+    """
+    Add the entries of an existing tree store to the cache, in order
+    to migrate them into the index store.
+    """
+    object_references = get_object_references(realm)
+    if not object_references.tree_store_checked:
+        object_references.tree_store_checked = True
+        try:
+            object_references.update(_read_tree_store_entries(realm))
+            return True
+        except RuntimeError:
+            return False
+    return False
+
+
 def remove_legacy_store_reference(realm: Path, reference: GitReference):
     from .gitbackend.subprocess import git_delete_ref
 
@@ -90,55 +252,101 @@ def remove_legacy_store_reference(realm: Path, reference: GitReference):
 
 
 def flush_object_references(realm: Path):
-    global cached_object_references
-
+    """
+    Write the references of realm, and the references that were added
+    without a realm, to the reference store of realm.
+    """
+    from ..gitmapper.metadatamapper import add_instance_set_tree_reference
+    from ..gitmapper.utils import locked_backend
+    from ..gitmapper.writecache import write_cache
+
+    add_instance_set_tree_reference(str(realm))
+
+    object_references = get_object_references(realm)
+    with object_references.flush_lock:
+        legacy_trees_added, legacy_blobs_added = add_legacy_store_entries(realm)
+        tree_store_added = (
+            object_reference_format == "index"
+            and add_tree_store_entries(realm))
+
+        references = object_references.take()
+        references |= get_object_references(None).take()
+        try:
+            if references:
+                # Cache the new object reference trees, in order to update
+                # the reference after all trees are written.
+                with locked_backend(realm), write_cache(str(realm)):
+                    if object_reference_format == "index":
+                        _flush_to_index_store(realm, references)
+                    else:
+                        _flush_to_tree_store(realm, references)
+        except BaseException:
+            # Keep the taken references, including those that were read
+            # from legacy stores, for the next flush, and check the
+            # legacy stores again, in order to remove them after the
+            # next successful write.
+            object_references.update(references)
+            object_references.legacy_stores_checked = False
+            object_references.tree_store_checked = False
+            raise
+
+        if legacy_trees_added is True:
+            remove_legacy_store_reference(realm, GitReference.LEGACY_TREES)
+        if legacy_blobs_added is True:
+            remove_legacy_store_reference(realm, GitReference.LEGACY_BLOBS)
+        if tree_store_added is True:
+            remove_legacy_store_reference(realm, GitReference.OBJECT_REFERENCES)
+
+
+def _flush_to_tree_store(realm: Path,
+                         references: Set[Tuple[EntryType, str]]):
     from .gitbackend.subprocess import git_update_ref
     from ..gitmapper.treeupdater import (
         PathInfo,
         _get_dir,
         add_paths,
     )
-    from ..gitmapper.utils import locked_backend
 
-    legacy_trees_added, legacy_blobs_added = add_legacy_store_entries(realm)
+    path_infos = [
+        PathInfo(
+            [
+                object_hash[0:3],
+                object_hash[3:6],
+                object_hash[6:9],
+                object_hash[9:],
+            ],
+            object_hash,
+            entry_type)
+        for entry_type, object_hash in references
+    ]
 
-    if cached_object_references:
-        path_infos = [
-            PathInfo(
-                [
-                    object_hash[0:3],
-                    object_hash[3:6],
-                    object_hash[6:9],
-                    object_hash[9:],
-                ],
-                object_hash,
-                entry_type)
-            for entry_type, object_hash in cached_object_references
-        ]
+    try:
+        root_entries = _get_dir(realm, GitReference.OBJECT_REFERENCES.value)
+    except RuntimeError:
+        root_entries = []
 
-        with locked_backend(realm):
-            try:
-                root_entries = _get_dir(realm, GitReference.OBJECT_REFERENCES.value)
-            except RuntimeError:
-                root_entries = []
+    tree_hash = add_paths(realm, path_infos, root_entries)
+    git_update_ref(str(realm), GitReference.OBJECT_REFERENCES.value, tree_hash)
 
-            tree_hash = add_paths(realm, path_infos, root_entries)
-            git_update_ref(str(realm), GitReference.OBJECT_REFERENCES.value, tree_hash)
 
-        cached_object_references = set()
+def _flush_to_index_store(realm: Path,
+                          references: Set[Tuple[EntryType, str]]):
+    from .objectindex import add_indexed_references
 
-    if legacy_trees_added is True:
-        remove_legacy_store_reference(realm, GitReference.LEGACY_TREES)
-    if legacy_blobs_added is True:
-        remove_legacy_store_reference(realm, GitReference.LEGACY_BLOBS)
+    add_indexed_references(
+        realm,
+        GitReference.OBJECT_INDEX.value,
+        references)
 
 
-def add_tree_reference(object_hash: str):
-    add_object_reference(EntryType.Directory, object_hash)
+def add_tree_reference(object_hash: str,
+                       realm: Optional[Union[str, Path]] = None):
+    add_object_reference(EntryType.Directory, object_hash, realm)
 
 
-def add_blob_reference(object_hash: str):
-    add_object_reference(EntryType.File, object_hash)
+def add_blob_reference(object_hash: str,
+                       realm: Optional[Union[str, Path]] = None):
+    add_object_reference(EntryType.File, object_hash, realm)
 
 
 def remove_object_reference(*args, **kwargs):
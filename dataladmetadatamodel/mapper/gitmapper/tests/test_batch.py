@@ -0,0 +1,227 @@
+import subprocess
+import threading
+from pathlib import Path
+
+import pytest
+
+from ..gitbackend.batch import (
+    GitCatFileBatch,
+    cat_file,
+    cat_file_many,
+    get_cat_file_pool,
+    get_mktree_pool,
+    shutdown_batch_processes,
+)
+from ..gitbackend.subprocess import (
+    git_load_bytes,
+    git_load_objects,
+    git_load_str,
+    git_ls_tree,
+    git_read_tree_node,
+    git_read_tree_recursive,
+    git_save_tree_node,
+    set_object_reader,
+    set_object_writer,
+)
+from ..utils import split_git_lstree_line
+
+
+file_names = [
+    "a a",
+    '"quoted"',
+    "back\\slash",
+    "tab\tname",
+    "🐶🐷",
+]
+
+
+@pytest.fixture
+def subprocess_writer():
+    previous_writer = set_object_writer("subprocess")
+    yield
+    set_object_writer(previous_writer)
+
+
+def _git(realm: Path, *arguments, stdin: bytes = None) -> bytes:
+    return subprocess.run(
+        ["git", "-C", str(realm)] + list(arguments),
+        input=stdin,
+        stdout=subprocess.PIPE,
+        check=True).stdout
+
+
+def _create_repo(realm: Path) -> Path:
+    subprocess.run(["git", "init", str(realm)], check=True)
+    for index, file_name in enumerate(file_names):
+        (realm / file_name).write_text(f"content {index}\n")
+    _git(realm, "add", ".")
+    _git(realm, "commit", "-m", "create repo")
+    return realm
+
+
+def test_blob_reading(tmp_path):
+    realm = _create_repo(tmp_path)
+    binary_content = bytes(range(256)) * 3
+    blob_hash = _git(
+        realm, "hash-object", "-w", "--stdin",
+        stdin=binary_content).decode().strip()
+
+    object_hash, object_type, content = cat_file(str(realm), blob_hash)
+    assert (object_hash, object_type) == (blob_hash, "blob")
+    assert content == binary_content
+    assert git_load_bytes(str(realm), blob_hash) == binary_content
+
+    text_hash = _git(
+        realm, "hash-object", "-w", "--stdin",
+        stdin=b"line 1\nline 2\n").decode().strip()
+    assert git_load_str(str(realm), text_hash) == "line 1\nline 2"
+    shutdown_batch_processes(str(realm))
+
+
+def test_missing_object(tmp_path):
+    realm = _create_repo(tmp_path)
+    with get_cat_file_pool(str(realm)).process() as batch_process:
+        with pytest.raises(RuntimeError):
+            batch_process.read_object("0" * 40)
+        assert batch_process.is_usable()
+        assert batch_process.read_object("HEAD")[1] == "commit"
+
+    with pytest.raises(RuntimeError):
+        git_ls_tree(str(realm), "refs/does/not/exist")
+    shutdown_batch_processes(str(realm))
+
+
+def test_exited_process(tmp_path):
+    # git exits immediately if the directory is not a repository
+    batch_process = GitCatFileBatch(str(tmp_path / "no-repo"))
+    batch_process.process.wait()
+    with pytest.raises(RuntimeError):
+        batch_process.read_object("HEAD")
+    assert not batch_process.is_usable()
+
+
+def test_pipelined_reading(tmp_path):
+    realm = _create_repo(tmp_path)
+    blob_hashes = _git(
+        realm, "ls-tree", "--format=%(objectname)", "HEAD").decode().split()
+
+    # More requests than fit into one pipelined chunk
+    references = (blob_hashes + ["HEAD"]) * 100
+    results = cat_file_many(str(realm), references)
+    assert [result[0] for result in results[:len(blob_hashes)]] == blob_hashes
+    assert results[len(blob_hashes)][1] == "commit"
+    assert len(results) == len(references)
+    assert git_load_objects(str(realm), references) == [
+        (object_type, content)
+        for _, object_type, content in results]
+
+    with pytest.raises(RuntimeError):
+        cat_file_many(str(realm), blob_hashes + ["0" * 40] + blob_hashes)
+    assert cat_file(str(realm), blob_hashes[0])[1] == "blob"
+    shutdown_batch_processes(str(realm))
+
+
+def test_recursive_tree_reading(tmp_path):
+    realm = _create_repo(tmp_path)
+    (realm / "sub").mkdir()
+    (realm / "sub" / "tab\tname").write_text("sub content\n")
+    _git(realm, "add", ".")
+    _git(realm, "commit", "-m", "add sub-directory")
+
+    expected = [
+        tuple(info.split()) + (path,)
+        for info, path in (
+            record.split("\t", 1)
+            for record in _git(
+                realm, "ls-tree", "-r", "-t", "-z", "HEAD^{tree}"
+            ).decode().split("\x00")
+            if record)]
+    assert any(entry[1] == "tree" for entry in expected)
+
+    assert git_read_tree_recursive(str(realm), "HEAD^{tree}") == expected
+    previous_reader = set_object_reader("native")
+    try:
+        assert git_read_tree_recursive(str(realm), "HEAD^{tree}") == expected
+    finally:
+        set_object_reader(previous_reader)
+    shutdown_batch_processes(str(realm))
+
+
+def test_tree_lines_match_git(tmp_path):
+    realm = _create_repo(tmp_path)
+    (realm / "sub dir").mkdir()
+    (realm / "sub dir" / "x").write_text("x")
+    _git(realm, "add", ".")
+    _git(realm, "commit", "-m", "add sub dir")
+
+    tree_hash = _git(realm, "rev-parse", "HEAD^{tree}").decode().strip()
+    expected = _git(realm, "cat-file", "-p", tree_hash).decode().splitlines()
+    assert git_read_tree_node(str(realm), tree_hash) == expected
+
+    expected = _git(realm, "ls-tree", "HEAD").decode().splitlines()
+    assert git_ls_tree(str(realm), "HEAD") == expected
+    shutdown_batch_processes(str(realm))
+
+
+def test_process_reuse(tmp_path):
+    realm = _create_repo(tmp_path)
+    pool = get_cat_file_pool(str(realm))
+
+    with pool.process() as batch_process:
+        first_process = batch_process
+    for _ in range(10):
+        cat_file(str(realm), "HEAD")
+    with pool.process() as batch_process:
+        assert batch_process is first_process
+    shutdown_batch_processes(str(realm))
+
+
+def test_concurrent_reading(tmp_path):
+    realm = _create_repo(tmp_path)
+    tree_hash = _git(realm, "rev-parse", "HEAD^{tree}").decode().strip()
+    expected = git_read_tree_node(str(realm), tree_hash)
+
+    results = []
+
+    def reader():
+        for _ in range(20):
+            results.append(git_read_tree_node(str(realm), tree_hash))
+
+    threads = [threading.Thread(target=reader) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 80
+    assert all(result == expected for result in results)
+    shutdown_batch_processes(str(realm))
+
+
+def test_tree_writing(tmp_path, subprocess_writer):
+    realm = _create_repo(tmp_path)
+    tree_hash = _git(realm, "rev-parse", "HEAD^{tree}").decode().strip()
+    lines = git_read_tree_node(str(realm), tree_hash)
+    entries = [split_git_lstree_line(line) for line in lines]
+
+    for _ in range(3):
+        assert git_save_tree_node(str(realm), entries) == tree_hash
+
+    empty_tree_hash = _git(
+        realm, "hash-object", "-t", "tree", "--stdin",
+        stdin=b"").decode().strip()
+    assert git_save_tree_node(str(realm), []) == empty_tree_hash
+    shutdown_batch_processes(str(realm))
+
+
+def test_tree_writing_error(tmp_path, subprocess_writer):
+    realm = _create_repo(tmp_path)
+    pool = get_mktree_pool(str(realm))
+
+    with pytest.raises(RuntimeError):
+        git_save_tree_node(str(realm), [("100644", "blob", "xyz", "a")])
+    assert pool.idle_processes == []
+
+    entries = [("100644", "blob", "1" * 40, "a")]
+    assert len(git_save_tree_node(str(realm), entries)) == 40
+    shutdown_batch_processes(str(realm))
@@ -0,0 +1,133 @@
+import json
+import subprocess
+
+import pytest
+
+from ..codec import (
+    Codec,
+    codecs,
+    decode_json_object,
+    encode_json_object,
+    register_codec,
+    set_codec,
+)
+from ..gitbackend.subprocess import git_load_bytes
+from ...reference import Reference
+from ....metadata import (
+    ExtractorConfiguration,
+    Metadata,
+)
+
+
+json_objects = [
+    None,
+    True,
+    False,
+    0,
+    127,
+    128,
+    -1,
+    -(2 ** 70),
+    2 ** 70,
+    1.5,
+    -0.0,
+    1e300,
+    "",
+    "a string",
+    "🐶🐷\x00\n",
+    [],
+    {},
+    [1, [2, [3, {"a": None}]], "a", "a"],
+    {"@": {"type": "T", "version": "3.0"}, "list": [{"@": {"type": "T"}}]},
+]
+
+
+def _create_metadata() -> Metadata:
+    metadata = Metadata()
+    for index in range(3):
+        metadata.add_extractor_run(
+            1.2 + index,
+            f"extractor_{index}",
+            "test-tool",
+            "test-tool@test.com",
+            ExtractorConfiguration("v3.4", {"p1": str(index)}),
+            {"key1": "this is metadata", "index": index})
+    return metadata
+
+
+@pytest.fixture(params=list(codecs))
+def codec(request):
+    previous_codec = set_codec(request.param)
+    yield codecs[request.param]
+    set_codec(previous_codec)
+
+
+def test_round_trip(codec):
+    for json_object in json_objects:
+        content = encode_json_object(json_object)
+        assert content.startswith(codec.tag)
+        assert decode_json_object(content) == json_object
+
+    # Keys are converted like json.dumps converts them
+    assert decode_json_object(encode_json_object({1: "a", None: "b"})) == \
+        {"1": "a", "null": "b"}
+
+
+def test_compact_size():
+    json_object = _create_metadata().to_json_obj()
+    json_size = len(codecs["json"].encode(json_object))
+    compact_size = len(codecs["compact"].encode(json_object))
+    assert compact_size < json_size // 2
+
+
+def test_invalid_content():
+    content = codecs["compact"].encode({"a": [1, 2, 3]})
+    with pytest.raises(ValueError):
+        decode_json_object(content + b"\xc0")
+    with pytest.raises(ValueError):
+        decode_json_object(b"\x00XYZ" + content)
+    with pytest.raises(ValueError):
+        codecs["compact"].decode(b"{}")
+    with pytest.raises(TypeError):
+        codecs["compact"].encode({"a": {1, 2}})
+    with pytest.raises(ValueError):
+        set_codec("unknown")
+
+
+def test_registration():
+    class TestCodec(Codec):
+        name = "compact"
+        tag = b"\x00TEST"
+
+    with pytest.raises(ValueError):
+        register_codec(TestCodec())
+
+    TestCodec.name = "test"
+    TestCodec.tag = b"TEST"
+    with pytest.raises(ValueError):
+        register_codec(TestCodec())
+
+    TestCodec.tag = codecs["compact"].tag + b"\x01"
+    with pytest.raises(ValueError):
+        register_codec(TestCodec())
+    assert "test" not in codecs
+
+
+def test_mixed_codecs(tmp_path):
+    subprocess.run(["git", "init", str(tmp_path)], check=True)
+    realm = str(tmp_path)
+
+    references = []
+    for codec_name in codecs:
+        previous_codec = set_codec(codec_name)
+        try:
+            references.append(_create_metadata().write_out(realm))
+        finally:
+            set_codec(previous_codec)
+
+    assert json.loads(git_load_bytes(realm, references[0].location)) == \
+        json.loads(_create_metadata().to_json())
+    for reference in references:
+        assert Metadata(realm=realm, reference=Reference(
+            "Metadata",
+            reference.location)).read_in() == _create_metadata()
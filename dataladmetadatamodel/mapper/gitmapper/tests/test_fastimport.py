@@ -0,0 +1,190 @@
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from dataladmetadatamodel.metadatapath import MetadataPath
+from dataladmetadatamodel.tests.utils import (
+    create_dataset_tree,
+    get_uuid,
+)
+from dataladmetadatamodel.uuidset import UUIDSet
+from dataladmetadatamodel.versionlist import (
+    TreeVersionList,
+    VersionList,
+    VersionRecord,
+)
+from ..gitbackend.fastimport import (
+    empty_tree_hash,
+    fast_import_session,
+    get_session,
+)
+from ..gitbackend.subprocess import (
+    git_load_str,
+    git_ls_tree,
+    git_object_exists_locally,
+    git_read_tree_node,
+    git_save_str,
+    git_save_tree_node,
+    git_update_ref,
+)
+from ..objectreference import flush_object_references
+
+
+def _git(realm: Path, *arguments) -> str:
+    return subprocess.run(
+        ["git", "-C", str(realm)] + list(arguments),
+        stdout=subprocess.PIPE,
+        check=True).stdout.decode()
+
+
+def _init(realm: Path) -> Path:
+    subprocess.run(["git", "init", str(realm)], check=True)
+    return realm
+
+
+def _loose_objects(realm: Path):
+    return [
+        path
+        for path in (realm / ".git" / "objects").glob("??/*")
+        if path.parent.name not in ("info", "pack")]
+
+
+def _write_model(realm: Path):
+    dataset_tree = create_dataset_tree()
+    tree_version_list = TreeVersionList(initial_set={
+        "v1": {
+            MetadataPath(""): VersionRecord(
+                "0.1",
+                MetadataPath(""),
+                dataset_tree)
+        }
+    })
+    uuid_set = UUIDSet(initial_set={
+        get_uuid(0): VersionList(initial_set={
+            "v1": {
+                MetadataPath("a"): VersionRecord(
+                    "0.1",
+                    MetadataPath("a"),
+                    dataset_tree.get_metadata_root_record(MetadataPath("d1")))
+            }
+        })
+    })
+    tree_version_list.write_out(str(realm))
+    uuid_set.write_out(str(realm))
+    flush_object_references(realm)
+
+
+def test_model_write_out(tmp_path):
+    plain_realm = _init(tmp_path / "plain")
+    _write_model(plain_realm)
+
+    fast_import_realm = _init(tmp_path / "fast-import")
+    # Prevent fast-import from exploding small packs into loose objects
+    _git(fast_import_realm, "config", "fastimport.unpackLimit", "0")
+    with fast_import_session(str(fast_import_realm)):
+        _write_model(fast_import_realm)
+        # Nothing is written and no reference is updated before
+        # the session ends.
+        assert _git(fast_import_realm, "for-each-ref") == ""
+
+    assert _git(fast_import_realm, "for-each-ref") == \
+        _git(plain_realm, "for-each-ref")
+    assert _loose_objects(fast_import_realm) == []
+    assert len(list(
+        (fast_import_realm / ".git" / "objects" / "pack").glob("*.pack"))) == 1
+    _git(fast_import_realm, "fsck", "--strict", "--no-dangling")
+
+
+def test_read_through(tmp_path):
+    realm = _init(tmp_path)
+    with fast_import_session(str(realm)) as session:
+        with fast_import_session(str(realm)) as inner_session:
+            assert inner_session is session
+
+        blob_hash = git_save_str(str(realm), "content\n")
+        sub_tree_hash = git_save_tree_node(
+            str(realm),
+            [("100644", "blob", blob_hash, '"tab\\tname"')])
+        empty_hash = git_save_tree_node(str(realm), [])
+        tree_hash = git_save_tree_node(
+            str(realm),
+            [
+                ("040000", "tree", sub_tree_hash, "sub"),
+                ("040000", "tree", empty_hash, "empty"),
+            ])
+        git_update_ref(str(realm), "refs/datalad/test", tree_hash)
+
+        assert empty_hash == empty_tree_hash
+        assert get_session(str(realm)) is session
+        assert git_load_str(str(realm), blob_hash) == "content"
+        assert git_object_exists_locally(str(realm), sub_tree_hash)
+        lines = git_ls_tree(str(realm), "refs/datalad/test")
+        assert lines == [
+            f"040000 tree {empty_hash}\tempty",
+            f"040000 tree {sub_tree_hash}\tsub"]
+
+    assert get_session(str(realm)) is None
+    assert git_read_tree_node(str(realm), sub_tree_hash) == [
+        f'100644 blob {blob_hash}\t"tab\\tname"']
+    assert git_ls_tree(str(realm), "refs/datalad/test") == lines
+    assert _git(realm, "for-each-ref", "--format=%(refname)") == \
+        "refs/datalad/test\n"
+    _git(realm, "fsck", "--strict")
+
+
+def test_abort(tmp_path):
+    realm = _init(tmp_path)
+    with pytest.raises(ValueError):
+        with fast_import_session(str(realm)):
+            blob_hashes = [
+                git_save_str(str(realm), f"content {index}")
+                for index in range(200)]
+            git_update_ref(
+                str(realm),
+                "refs/datalad/test",
+                git_save_tree_node(str(realm), []))
+            raise ValueError("abort")
+
+    assert get_session(str(realm)) is None
+    assert _git(realm, "for-each-ref") == ""
+
+    # Neither a crash report nor a temporary pack file is left behind
+    assert list((realm / ".git").glob("fast_import_crash_*")) == []
+    assert list((realm / ".git" / "objects" / "pack").glob("tmp_*")) == []
+
+    # The streamed objects are installed in a pack, but they are not
+    # referenced, and "git gc" removes them.
+    pack_dir = realm / ".git" / "objects" / "pack"
+    assert len(list(pack_dir.glob("pack-*.pack"))) == 1
+    assert all(
+        git_object_exists_locally(str(realm), blob_hash)
+        for blob_hash in blob_hashes)
+    _git(realm, "gc", "--quiet", "--prune=now")
+    assert list(pack_dir.glob("pack-*.pack")) == []
+    assert not any(
+        subprocess.run(
+            ["git", "-C", str(realm), "cat-file", "-e", blob_hash]
+        ).returncode == 0
+        for blob_hash in blob_hashes)
+
+
+def test_abort_killed(tmp_path, monkeypatch):
+    realm = _init(tmp_path)
+    with pytest.raises(ValueError):
+        with fast_import_session(str(realm)) as session:
+            # Reading the blob back ensures that fast-import has
+            # created its temporary pack file
+            blob_hash = git_save_str(str(realm), "content\n")
+            assert git_load_str(str(realm), blob_hash) == "content"
+            assert list((realm / ".git" / "objects" / "pack").glob("tmp_*"))
+            # Kill fast-import instead of letting it exit
+            monkeypatch.setattr(
+                session.process.process.stdin,
+                "close",
+                session.process.process.kill)
+            raise ValueError("abort")
+
+    assert list((realm / ".git").glob("fast_import_crash_*")) == []
+    if Path("/proc/self/fd").is_dir():
+        assert list((realm / ".git" / "objects" / "pack").glob("tmp_*")) == []
@@ -1,4 +1,7 @@
+import copy
 import json
+import subprocess
+import tempfile
 import unittest
 from pathlib import Path
 from typing import cast
@@ -7,22 +10,26 @@ from unittest import mock
 from .... import version_string
 from ....tests.utils import get_location
 from dataladmetadatamodel.mapper import get_mapper
-from dataladmetadatamodel.mapper.gitmapper.metadatamapper import MetadataGitMapper
-from dataladmetadatamodel.mapper.gitmapper.objectreference import flush_object_references
+from dataladmetadatamodel.mapper.gitmapper import metadatamapper
+from dataladmetadatamodel.mapper.gitmapper.gitbackend.subprocess import git_save_str
+from dataladmetadatamodel.mapper.gitmapper.metadatamapper import (
+    MetadataGitMapper,
+    set_metadata_layout,
+)
+from dataladmetadatamodel.filetree import FileTree
+from dataladmetadatamodel.mapper.gitmapper.objectreference import (
+    GitReference,
+    flush_object_references,
+    get_object_references,
+)
+from dataladmetadatamodel.mapper.gitmapper.utils import create_git_repo
+from dataladmetadatamodel.mapper.mapper import read_in_many
+from dataladmetadatamodel.mapper.reference import Reference
 from dataladmetadatamodel.metadata import (
     ExtractorConfiguration,
     Metadata
 )
-
-
-expected_reference_object = {
-    "@": {
-        "type": "Reference",
-        "version": version_string
-    },
-    "class_name": "Metadata",
-    "location": get_location(1)
-}
+from dataladmetadatamodel.metadatapath import MetadataPath
 
 
 expected_metadata_object = {
@@ -73,6 +80,27 @@ expected_metadata_object = {
 }
 
 
+def _set_version(json_object, version: str):
+    if isinstance(json_object, dict):
+        if "@" in json_object:
+            json_object["@"]["version"] = version
+        for value in json_object.values():
+            _set_version(value, version)
+    elif isinstance(json_object, list):
+        for value in json_object:
+            _set_version(value, version)
+
+
+def _add_extractor_run(metadata: Metadata, extractor_name: str, content: str):
+    metadata.add_extractor_run(
+        1.2,
+        extractor_name,
+        "test-tool",
+        "test-tool@test.com",
+        ExtractorConfiguration("v3.4", {"p1": "1"}),
+        {"key1": content})
+
+
 class TestMetadataMapper(unittest.TestCase):
 
     def test_basic_unmapping(self):
@@ -101,13 +129,142 @@ class TestMetadataMapper(unittest.TestCase):
             reference = metadata.write_out(realm, "git")
             flush_object_references(Path("/tmp/t1"))
 
-            self.assertEqual(len(save_str.call_args_list), 2)
+            # Version 3 writes no reference blob
+            self.assertEqual(reference.location, get_location(1))
+            self.assertEqual(len(save_str.call_args_list), 1)
             self.assertEqual(
                 json.loads(save_str.call_args_list[0][0][1]),
                 expected_metadata_object)
+
+    def test_version_2_reading(self):
+        with tempfile.TemporaryDirectory() as td:
+            realm = td
+            create_git_repo(Path(realm), {"readme.md": "test repo"})
+
+            v2_metadata_object = copy.deepcopy(expected_metadata_object)
+            _set_version(v2_metadata_object, "2.0")
+            metadata_location = git_save_str(
+                realm,
+                json.dumps(v2_metadata_object))
+            reference_location = git_save_str(
+                realm,
+                json.dumps({
+                    "@": {"type": "Reference", "version": "2.0"},
+                    "class_name": "Metadata",
+                    "location": metadata_location
+                }))
+
+            v2_metadata = Metadata(
+                realm=realm,
+                reference=Reference("Metadata", reference_location))
+            v3_metadata = Metadata(
+                realm=realm,
+                reference=Metadata.from_json(
+                    json.dumps(expected_metadata_object)).write_out(realm))
+
+            read_in_many([v2_metadata, v3_metadata])
+            self.assertEqual(v2_metadata, v3_metadata)
             self.assertEqual(
-                json.loads(save_str.call_args_list[1][0][1]),
-                expected_reference_object)
+                Metadata(
+                    realm=realm,
+                    reference=Reference("Metadata", reference_location)
+                ).read_in(),
+                v3_metadata)
+
+    def test_tree_layout(self):
+        previous_layout = set_metadata_layout("tree")
+        try:
+            with tempfile.TemporaryDirectory() as td:
+                realm = td
+                create_git_repo(Path(realm), {"readme.md": "test repo"})
+
+                metadata = Metadata()
+                for index in range(3):
+                    _add_extractor_run(metadata, f"extractor_{index}", "a")
+                reference = metadata.write_out(realm)
+                flush_object_references(Path(realm))
+
+                # Only the accessed instance set is loaded
+                stored_metadata = Metadata(realm=realm, reference=reference)
+                with mock.patch(
+                        "dataladmetadatamodel.mapper.gitmapper"
+                        ".metadatamapper.git_load_objects",
+                        wraps=metadatamapper.git_load_objects) as load_objects:
+
+                    stored_metadata.read_in()
+                    self.assertEqual(
+                        list(stored_metadata.extractors),
+                        ["extractor_0", "extractor_1", "extractor_2"])
+                    load_objects.assert_not_called()
+
+                    self.assertEqual(
+                        stored_metadata.extractor_runs_for_extractor(
+                            "extractor_1"),
+                        metadata.extractor_runs_for_extractor("extractor_1"))
+                    self.assertEqual(load_objects.call_count, 1)
+                    self.assertEqual(len(load_objects.call_args[0][1]), 1)
+
+                # Only the modified instance set is written, in addition
+                # to the metadata blob
+                stored_metadata = Metadata(realm=realm, reference=reference)
+                _add_extractor_run(stored_metadata, "extractor_2", "b")
+                with mock.patch(
+                        "dataladmetadatamodel.mapper.gitmapper"
+                        ".metadatamapper.git_save_json",
+                        wraps=metadatamapper.git_save_json) as save_json:
+                    reference = stored_metadata.write_out(realm)
+                    self.assertEqual(save_json.call_count, 2)
+
+                # Both layouts are read independently of the selection
+                _add_extractor_run(metadata, "extractor_2", "b")
+                set_metadata_layout("blob")
+                self.assertEqual(
+                    Metadata(realm=realm, reference=reference).read_in(),
+                    metadata)
+        finally:
+            set_metadata_layout(previous_layout)
+
+    def test_tree_layout_references(self):
+        previous_layout = set_metadata_layout("tree")
+        try:
+            with tempfile.TemporaryDirectory() as td:
+                realm = td
+                create_git_repo(Path(realm), {"readme.md": "test repo"})
+
+                file_tree = FileTree()
+                for index in range(5):
+                    metadata = Metadata()
+                    _add_extractor_run(metadata, "extractor", str(index))
+                    file_tree.add_metadata(
+                        MetadataPath(f"file_{index}"),
+                        metadata)
+
+                # One reference for the file tree, and one for the tree
+                # of the instance set trees
+                with mock.patch(
+                        "dataladmetadatamodel.mapper.gitmapper"
+                        ".metadatamapper.add_tree_reference",
+                        wraps=metadatamapper.add_tree_reference) as add_reference:
+                    file_tree.write_out(realm)
+                    self.assertEqual(add_reference.call_count, 1)
+                self.assertEqual(
+                    len(get_object_references(realm).references),
+                    2)
+
+                # The instance sets are reachable from the object references
+                flush_object_references(Path(realm))
+                reachable = subprocess.run(
+                    ["git", "-C", realm, "rev-list", "--objects",
+                     GitReference.OBJECT_REFERENCES.value],
+                    stdout=subprocess.PIPE,
+                    check=True).stdout.decode()
+                for path, metadata in file_tree.get_paths_recursive():
+                    instance_sets = metadata.instance_sets
+                    self.assertIn(
+                        instance_sets.get_stored_location("extractor", realm),
+                        reachable)
+        finally:
+            set_metadata_layout(previous_layout)
 
     def test_double_cache_detection(self):
         metadata_mapper: MetadataGitMapper = cast(
@@ -9,8 +9,6 @@ from dataladmetadatamodel.metadatapath import MetadataPath
 from dataladmetadatamodel.metadatarootrecord import MetadataRootRecord
 from dataladmetadatamodel.tests.utils import create_file_tree_with_metadata
 
-from .... import version_string
-
 
 uuid_0 = UUID("00000000000000000000000000000000")
 dataset_version = "000000011111222223333"
@@ -35,7 +33,7 @@ class TestMetadataMapper(unittest.TestCase):
 
     def test_basic_unmapping(self):
         from dataladmetadatamodel.mapper.gitmapper.objectreference import (
-            cached_object_references,
+            get_object_references,
         )
 
         file_tree = create_file_tree_with_metadata(default_paths, [
@@ -53,15 +51,15 @@ class TestMetadataMapper(unittest.TestCase):
              mock.patch("dataladmetadatamodel.mapper.gitmapper."
                         "metadatamapper.git_save_str") as str_save, \
              mock.patch("dataladmetadatamodel.mapper.gitmapper."
-                        "gitblobcache.git_save_file_list") as file_list_save, \
+                        "gitblobcache.git_save_blobs") as blobs_save, \
              mock.patch("dataladmetadatamodel.mapper.gitmapper."
                         "mtreenodemapper.git_save_tree_node") as save_tree_node:
 
             save.configure_mock(return_value=location_0)
             str_save.configure_mock(return_value=location_1)
             save_tree_node.configure_mock(return_value=location_3)
-            file_list_save.side_effect = lambda r, l: [
-                hash_blob(open(e, "rb").read())
+            blobs_save.side_effect = lambda r, l: [
+                hash_blob(e)
                 for e in l
             ]
 
@@ -76,24 +74,17 @@ class TestMetadataMapper(unittest.TestCase):
                     'dataset_identifier': str(uuid_0),
                     'dataset_version': dataset_version,
                     'dataset_level_metadata': {
-                        '@': {
-                            'type': 'Reference',
-                            'version': version_string
-                        },
                         'class_name': 'Metadata',
                         'location': location_1
                     },
                     'file_tree': {
-                        '@': {
-                            'type': 'Reference',
-                            'version': version_string
-                        },
                         'class_name': 'MTreeNode',
                         'location': location_3}
                 }
             )
 
             # check for object references
+            cached_object_references = get_object_references("/tmp/t1")
             assert (EntryType.File, location_1) in cached_object_references, \
                 "Dataset-level metadata reference not found in object cache"
             assert (EntryType.Directory, location_3) in cached_object_references, \
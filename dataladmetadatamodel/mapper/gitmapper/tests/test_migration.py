@@ -0,0 +1,133 @@
+import subprocess
+from contextlib import contextmanager
+from pathlib import Path
+from unittest import mock
+
+from ..gitbackend.subprocess import (
+    git_load_str,
+    git_save_str,
+)
+from ..metadatamapper import MetadataGitMapper
+from ..migration import migrate_realm
+from ..objectreference import (
+    add_blob_reference,
+    flush_object_references,
+)
+from ...reference import Reference
+from ....common import (
+    get_top_level_metadata_objects,
+    get_top_nodes_and_metadata_root_record,
+)
+from ....metadata import (
+    ExtractorConfiguration,
+    Metadata,
+)
+from ....metadatapath import MetadataPath
+from ....tests.utils import get_uuid
+
+
+file_paths = [MetadataPath(f"dir/file_{index}") for index in range(5)]
+
+
+def _v2_reference_json_obj(reference: Reference):
+    return {
+        "@": dict(type="Reference", version="2.0"),
+        "class_name": reference.class_name,
+        "location": reference.location
+    }
+
+
+def _v2_map_out_impl(self, metadata, realm, force_write) -> Reference:
+    metadata_blob_location = git_save_str(realm, metadata.to_json())
+    add_blob_reference(metadata_blob_location, realm)
+    return Reference(
+        "Metadata",
+        git_save_str(
+            realm,
+            Reference("Metadata", metadata_blob_location).to_json_str()))
+
+
+@contextmanager
+def _version_2_writer():
+    with mock.patch("dataladmetadatamodel.metadata.version_string", "2.0"), \
+         mock.patch.object(Reference, "to_json_obj", _v2_reference_json_obj), \
+         mock.patch.object(MetadataGitMapper, "map_out_impl", _v2_map_out_impl):
+        yield
+
+
+def _create_metadata(content: str) -> Metadata:
+    metadata = Metadata()
+    metadata.add_extractor_run(
+        1.2,
+        "test-extractor",
+        "test-tool",
+        "test-tool@test.com",
+        ExtractorConfiguration("v1", {}),
+        {"content": content})
+    return metadata
+
+
+def _get_metadata_root_record(realm: str, auto_create: bool = False):
+    return get_top_nodes_and_metadata_root_record(
+        mapper_family="git",
+        realm=realm,
+        dataset_id=get_uuid(0),
+        primary_data_version="v1",
+        prefix_path=MetadataPath(""),
+        dataset_tree_path=MetadataPath(""),
+        sub_dataset_id=None,
+        sub_dataset_version=None,
+        auto_create=auto_create)
+
+
+def _check_metadata(realm: str):
+    _, _, mrr = _get_metadata_root_record(realm)
+    assert mrr.get_dataset_level_metadata() == _create_metadata("dataset")
+    file_tree = mrr.get_file_tree()
+    for path in file_paths:
+        assert file_tree.get_metadata(path) == _create_metadata(str(path))
+
+
+def _file_tree_blobs(realm: str):
+    _, _, mrr = _get_metadata_root_record(realm)
+    file_tree_location = mrr.get_file_tree().mtree.reference.location
+    return [
+        git_load_str(realm, f"{file_tree_location}:{path}")
+        for path in file_paths
+    ]
+
+
+def test_migration(tmp_path):
+    realm = str(tmp_path)
+    subprocess.run(["git", "init", realm], check=True)
+
+    with _version_2_writer():
+        tvl, uuid_set, mrr = _get_metadata_root_record(realm, True)
+        mrr.set_dataset_level_metadata(_create_metadata("dataset"))
+        file_tree = mrr.get_file_tree()
+        for path in file_paths:
+            file_tree.add_metadata(path, _create_metadata(str(path)))
+        tvl.write_out(realm)
+        uuid_set.write_out(realm)
+        flush_object_references(Path(realm))
+
+    # Version 2 file trees point to reference blobs
+    assert all(
+        '"type": "Reference", "version": "2.0"' in blob
+        for blob in _file_tree_blobs(realm))
+    _check_metadata(realm)
+
+    assert migrate_realm(realm) is True
+
+    assert all(
+        blob.startswith('{"@": {"type": "Metadata", "version": "3.0"}')
+        for blob in _file_tree_blobs(realm))
+    _check_metadata(realm)
+
+    tvl, uuid_set = get_top_level_metadata_objects("git", realm)
+    assert tvl is not None and uuid_set is not None
+
+
+def test_empty_realm(tmp_path):
+    subprocess.run(["git", "init", str(tmp_path)], check=True)
+    assert migrate_realm(tmp_path) is False
@@ -0,0 +1,236 @@
+import subprocess
+from pathlib import Path
+from typing import List
+from unittest.mock import patch
+
+import pytest
+
+from ..gitbackend import native
+from ..gitbackend.native import (
+    NativeObjectStore,
+    apply_delta,
+    close_object_stores,
+    object_store,
+)
+from ..gitbackend.objectformat import (
+    encode_content,
+    hash_object,
+)
+from ..gitbackend.subprocess import (
+    get_object_reader,
+    get_object_writer,
+    git_load_bytes,
+    git_ls_tree,
+    git_object_exists_locally,
+    git_read_tree_node,
+    git_save_blobs,
+    git_save_str,
+    git_save_tree_node,
+    git_update_ref,
+    set_fsync_policy,
+    set_object_reader,
+    set_object_writer,
+)
+
+
+def _git(realm: Path, *arguments, stdin: bytes = None) -> bytes:
+    return subprocess.run(
+        ["git", "-C", str(realm)] + list(arguments),
+        input=stdin,
+        stdout=subprocess.PIPE,
+        check=True).stdout
+
+
+def _create_repo(realm: Path, versions: int = 5) -> Path:
+    subprocess.run(["git", "init", str(realm)], check=True)
+    (realm / "sub").mkdir()
+    for version in range(versions):
+        (realm / "large").write_text("\n".join(
+            f"line {i}" + (" changed" if i == version * 10 else "")
+            for i in range(2000)))
+        (realm / "sub" / f"file {version}").write_text(f"version {version}")
+        _git(realm, "add", ".")
+        _git(realm, "commit", "-m", f"version {version}")
+    return realm
+
+
+def _all_objects(realm: Path) -> List[str]:
+    output = _git(
+        realm,
+        "cat-file", "--batch-all-objects", "--batch-check=%(objectname)")
+    return output.decode().splitlines()
+
+
+def _compare_all_objects(realm: Path):
+    store = NativeObjectStore(str(realm))
+    objects = _all_objects(realm)
+    assert len(objects) > 10
+    for object_hash in objects:
+        object_type = _git(realm, "cat-file", "-t", object_hash).decode().strip()
+        content = _git(realm, "cat-file", object_type, object_hash)
+        assert store.read_object(object_hash) == (
+            object_hash,
+            object_type,
+            content)
+    store.close()
+
+
+def test_loose_objects(tmp_path):
+    _compare_all_objects(_create_repo(tmp_path))
+
+
+def test_packed_objects(tmp_path):
+    realm = _create_repo(tmp_path)
+    _git(realm, "gc", "--aggressive", "--quiet")
+    assert list((realm / ".git" / "objects" / "pack").glob("*.idx"))
+    _compare_all_objects(realm)
+
+
+def test_reference_resolution(tmp_path):
+    realm = _create_repo(tmp_path)
+    tree_hash = _git(realm, "rev-parse", "HEAD^{tree}").decode().strip()
+    head_hash = _git(realm, "rev-parse", "HEAD").decode().strip()
+    _git(realm, "update-ref", "refs/datalad/test", tree_hash)
+
+    store = NativeObjectStore(str(realm))
+    assert store.resolve("HEAD") == head_hash
+    assert store.resolve("HEAD^{tree}") == tree_hash
+    assert store.resolve("refs/datalad/test") == tree_hash
+    assert store.resolve("refs/datalad/missing") is None
+
+    # Packed references and objects that are packed after
+    # the store was created.
+    _git(realm, "gc", "--quiet")
+    assert not (realm / ".git" / "refs" / "datalad" / "test").exists()
+    assert store.resolve("refs/datalad/test") == tree_hash
+    assert store.read_object("refs/datalad/test")[1] == "tree"
+    assert store.object_exists(head_hash)
+    assert not store.object_exists("0" * 40)
+    store.close()
+
+
+def test_reader_selection(tmp_path):
+    realm = _create_repo(tmp_path)
+    tree_hash = _git(realm, "rev-parse", "HEAD^{tree}").decode().strip()
+
+    subprocess_lines = git_read_tree_node(str(realm), tree_hash)
+    previous_reader = set_object_reader("native")
+    try:
+        assert get_object_reader() == "native"
+        assert git_read_tree_node(str(realm), tree_hash) == subprocess_lines
+        assert git_ls_tree(str(realm), "HEAD") == subprocess_lines
+        assert git_object_exists_locally(str(realm), tree_hash)
+        assert not git_object_exists_locally(str(realm), "1" * 40)
+        with pytest.raises(RuntimeError):
+            git_read_tree_node(str(realm), "1" * 40)
+    finally:
+        set_object_reader(previous_reader)
+
+    with pytest.raises(ValueError):
+        set_object_reader("unknown")
+
+
+def test_apply_delta():
+    base = b"0123456789" * 10
+    # source size 100, target size 14, copy 10 bytes at offset 5,
+    # insert 4 bytes.
+    delta = bytes([100, 14, 0x91, 5, 10, 4]) + b"abcd"
+    assert apply_delta(base, delta) == b"5678901234abcd"
+
+    with pytest.raises(ValueError):
+        apply_delta(base[:-1], delta)
+
+
+@pytest.mark.parametrize("policy", ["none", "object", "batch"])
+def test_object_writing(tmp_path, policy):
+    realm = _create_repo(tmp_path, versions=1)
+    previous_policy = set_fsync_policy(policy)
+    try:
+        for content in (b"", b"text\n", bytes(range(256)), "text"):
+            expected_hash = _git(
+                realm, "hash-object", "--stdin",
+                stdin=encode_content(content)).decode().strip()
+            assert git_save_str(str(realm), content) == expected_hash
+            assert git_load_bytes(str(realm), expected_hash) == \
+                encode_content(content)
+
+        assert git_save_blobs(str(realm), ["a", b"b"]) == [
+            hash_object("blob", b"a"),
+            hash_object("blob", b"b")]
+
+        git_update_ref(
+            str(realm),
+            "refs/datalad/test",
+            git_save_str(str(realm), "ref content"))
+    finally:
+        set_fsync_policy(previous_policy)
+
+    _git(realm, "fsck", "--strict")
+
+
+def test_tree_encoding(tmp_path):
+    realm = _create_repo(tmp_path, versions=1)
+    blob_hash = git_save_str(str(realm), "content")
+    sub_tree_hash = git_save_tree_node(
+        str(realm),
+        [("100644", "blob", blob_hash, "x")])
+
+    entries = [
+        ("100644", "blob", blob_hash, "a-b"),
+        ("040000", "tree", sub_tree_hash, "a"),
+        ("100644", "blob", blob_hash, '"tab\\tname"'),
+        ("100644", "blob", blob_hash, '"\\360\\237\\220\\266"'),
+        ("100644", "blob", blob_hash, "a.b"),
+    ]
+    expected = _git(
+        realm, "mktree",
+        stdin="".join(
+            f"{flag} {object_type} {object_hash}\t{name}\n"
+            for flag, object_type, object_hash, name in entries
+        ).encode()).decode().strip()
+
+    assert git_save_tree_node(str(realm), entries) == expected
+    assert git_read_tree_node(str(realm), expected) == \
+        _git(realm, "cat-file", "-p", expected).decode().splitlines()
+    _git(realm, "fsck", "--strict")
+
+
+def test_writer_selection(tmp_path):
+    realm = _create_repo(tmp_path, versions=1)
+    previous_writer = set_object_writer("subprocess")
+    try:
+        assert get_object_writer() == "subprocess"
+        subprocess_hashes = git_save_blobs(str(realm), ["a", "b\n"])
+    finally:
+        set_object_writer(previous_writer)
+    assert git_save_blobs(str(realm), ["a", "b\n"]) == subprocess_hashes
+
+    with pytest.raises(ValueError):
+        set_object_writer("unknown")
+    with pytest.raises(ValueError):
+        set_fsync_policy("unknown")
+
+
+def test_store_eviction(tmp_path):
+    realms = [
+        _create_repo(tmp_path / f"realm_{index}", versions=1)
+        for index in range(2)]
+    for realm in realms:
+        _git(realm, "gc", "--quiet")
+    head_hash = _git(realms[0], "rev-parse", "HEAD").decode().strip()
+
+    close_object_stores()
+    with patch.object(native, "max_open_stores", 1):
+        with object_store(str(realms[0])) as store:
+            # The used store is evicted, but not closed
+            with object_store(str(realms[1])):
+                pass
+            assert store.evicted is True
+            assert store.packs
+            assert store.read_object(head_hash)[1] == "commit"
+
+        # The evicted store is closed after its last use
+        assert store.packs == dict()
+        with object_store(str(realms[0])) as new_store:
+            assert new_store is not store
+    close_object_stores()
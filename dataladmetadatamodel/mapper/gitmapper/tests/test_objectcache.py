@@ -0,0 +1,118 @@
+import subprocess
+from unittest import mock
+
+from ..gitbackend.objectcache import (
+    ObjectCache,
+    add_cached,
+    get_cached,
+    get_object_cache_statistics,
+    set_object_cache_size,
+)
+from ..gitbackend.subprocess import (
+    git_load_json,
+    git_read_tree_node,
+    git_save_json,
+    git_save_str,
+    git_save_tree_node,
+)
+from ....metadatapath import MetadataPath
+from ....tests.utils import create_dataset_tree
+from ....versionlist import (
+    VersionList,
+    VersionRecord,
+)
+
+
+location = "0123456789abcdef0123456789abcdef01234567"
+
+
+def test_eviction():
+    cache = ObjectCache(10)
+    cache.add("object", "a", "value a", 4)
+    cache.add("object", "b", "value b", 4)
+    assert cache.get("object", "a") == "value a"
+
+    # "b" is the least recently used entry
+    cache.add("object", "c", "value c", 4)
+    assert cache.get("object", "b") is None
+    assert cache.get("object", "c") == "value c"
+
+    # Entries that exceed the limit are not cached
+    cache.add("object", "d", "value d", 11)
+    assert cache.get("object", "d") is None
+
+    statistics = cache.get_statistics()
+    assert (statistics.hits, statistics.misses, statistics.evictions) == \
+        (2, 2, 1)
+    assert (statistics.size, statistics.entries) == (8, 2)
+
+    cache.resize(4)
+    assert cache.get("object", "a") is None
+    assert cache.get_statistics().size == 4
+
+
+def test_object_hashes_only():
+    add_cached("test", location, "value", 10)
+    add_cached("test", "refs/heads/main", "value", 10)
+    add_cached("test", f"{location}:path", "value", 10)
+    assert get_cached("test", location) == "value"
+    assert get_cached("test", "refs/heads/main") is None
+    assert get_cached("test", f"{location}:path") is None
+
+    previous_size = set_object_cache_size(0)
+    try:
+        assert get_cached("test", location) is None
+    finally:
+        set_object_cache_size(previous_size)
+
+
+def test_shared_objects(tmp_path):
+    realms = [str(tmp_path / "r1"), str(tmp_path / "r2")]
+    for realm in realms:
+        subprocess.run(["git", "init", realm], check=True)
+
+    blob_location = git_save_str(realms[0], "content")
+    tree_location = git_save_tree_node(
+        realms[0],
+        [("100644", "blob", blob_location, "file")])
+    json_location = git_save_json(realms[0], {"a": [1, 2]})
+
+    lines = git_read_tree_node(realms[0], tree_location)
+    json_object = git_load_json(realms[0], json_location)
+
+    # Cached objects are read without accessing any repository
+    with mock.patch(
+            "dataladmetadatamodel.mapper.gitmapper.gitbackend"
+            ".subprocess.git_load_object") as load_object:
+        for realm in realms:
+            assert git_read_tree_node(realm, tree_location) == lines
+            assert git_load_json(realm, json_location) is json_object
+        load_object.assert_not_called()
+
+
+def test_read_in_after_purge(tmp_path):
+    realm = str(tmp_path)
+    subprocess.run(["git", "init", realm], check=True)
+
+    version_list = VersionList(initial_set={
+        "v1": {
+            MetadataPath(""): VersionRecord(
+                "0.1",
+                MetadataPath(""),
+                create_dataset_tree())
+        }
+    })
+    version_list.write_out(realm)
+    version_list.purge()
+    version_list.read_in()
+    version_list.purge()
+
+    # The version list is read in again without running git
+    hits = get_object_cache_statistics().hits
+    with mock.patch(
+            "dataladmetadatamodel.mapper.gitmapper.gitbackend"
+            ".batch.cat_file",
+            side_effect=AssertionError("object is read from git")):
+        version_list.read_in()
+    assert get_object_cache_statistics().hits > hits
+    assert version_list.get_versioned_element("v1", MetadataPath(""))[0] == "0.1"
@@ -1,5 +1,6 @@
 import subprocess
 import tempfile
+import threading
 from hashlib import sha1
 from pathlib import Path
 from typing import (
@@ -9,18 +10,30 @@ from typing import (
 )
 from unittest.mock import patch
 
+import pytest
+
+from .. import objectindex
 from ..gitbackend.subprocess import (
     git_ls_tree,
+    git_save_str,
     git_save_tree_node,
     git_update_ref,
 )
 from ...reference import none_location
+from ..objectindex import (
+    ObjectIndex,
+    read_indexed_references,
+    read_segments,
+)
 from ..objectreference import (
     GitReference,
     add_blob_reference,
     add_object_reference,
     add_tree_reference,
     flush_object_references,
+    get_object_references,
+    object_reference_session,
+    set_object_reference_format,
 )
 from ..treeupdater import EntryType
 from ..utils import (
@@ -128,3 +141,216 @@ def test_none_reference_warning():
         add_blob_reference(none_location)
         add_tree_reference(none_location)
     assert logger_mock.warning.call_count == 3
+
+
+@pytest.fixture
+def index_format():
+    previous_format = set_object_reference_format("index")
+    yield
+    set_object_reference_format(previous_format)
+
+
+def _create_blobs(realm: Path, start_index: int, stop_index: int) -> List[str]:
+    return [
+        git_save_str(str(realm), f"blob {index}")
+        for index in range(start_index, stop_index)
+    ]
+
+
+def test_object_index():
+    hashes = [_create_hash(i) for i in range(1000)]
+    index = ObjectIndex.from_entries(
+        (EntryType.File if i % 2 else EntryType.Directory, object_hash)
+        for i, object_hash in enumerate(hashes + hashes[:10]))
+
+    assert len(index) == 1000
+    assert list(index.entries()) == sorted(
+        (
+            (EntryType.File if i % 2 else EntryType.Directory, object_hash)
+            for i, object_hash in enumerate(hashes)
+        ),
+        key=lambda entry: entry[1])
+
+    assert all(object_hash in index for object_hash in hashes)
+    assert _create_hash(1000) not in index
+    assert "00" * 20 not in index
+    assert "ff" * 32 not in index
+
+    first_byte = int(hashes[0][:2], 16)
+    assert all(
+        object_hash.startswith(hashes[0][:2])
+        for _, object_hash in index.entries(first_byte))
+
+    assert len(ObjectIndex(index.content)) == 1000
+    with pytest.raises(ValueError):
+        ObjectIndex(index.content[:-1])
+    with pytest.raises(ValueError):
+        ObjectIndex(b"XXXX" + index.content[4:])
+
+
+def test_index_store(tmp_path, index_format):
+    realm = tmp_path
+    create_git_repo(realm, {"readme.md": "test repo"})
+
+    all_hashes = []
+    with patch.object(objectindex, "max_delta_segments", 3):
+        for start_index in range(0, 100, 10):
+            hashes = _create_blobs(realm, start_index, start_index + 10)
+            # Known references are not stored again
+            for object_hash in hashes + all_hashes[:5]:
+                add_blob_reference(object_hash)
+            flush_object_references(realm)
+            all_hashes.extend(hashes)
+
+            segments = read_segments(realm, GitReference.OBJECT_INDEX.value)
+            assert len(segments) <= 1 + 3
+            assert sum(map(len, (s.index for s in segments))) == len(all_hashes)
+
+    assert sorted(
+        object_hash
+        for _, object_hash in read_indexed_references(
+            realm,
+            GitReference.OBJECT_INDEX.value)) == sorted(all_hashes)
+
+    # All referenced objects are reachable from the reference
+    reachable = subprocess.run(
+        ["git", "-C", str(realm), "rev-list", "--objects",
+         GitReference.OBJECT_INDEX.value],
+        stdout=subprocess.PIPE,
+        check=True).stdout.decode()
+    assert all(object_hash in reachable for object_hash in all_hashes)
+    assert _does_ref_exist(realm, GitReference.OBJECT_REFERENCES.value) is False
+
+
+def test_tree_store_conversion(tmp_path):
+    realm = tmp_path
+    create_git_repo(realm, {"readme.md": "test repo"})
+
+    hashes = _create_blobs(realm, 0, 20)
+    for object_hash in hashes[:10]:
+        add_blob_reference(object_hash)
+    flush_object_references(realm)
+    assert _does_ref_exist(realm, GitReference.OBJECT_REFERENCES.value)
+
+    previous_format = set_object_reference_format("index")
+    try:
+        for object_hash in hashes[10:]:
+            add_blob_reference(object_hash)
+        flush_object_references(realm)
+    finally:
+        set_object_reference_format(previous_format)
+
+    assert sorted(read_indexed_references(
+        realm,
+        GitReference.OBJECT_INDEX.value)) == sorted(
+            (EntryType.File, object_hash)
+            for object_hash in hashes)
+    assert _does_ref_exist(realm, GitReference.OBJECT_REFERENCES.value) is False
+
+
+def _read_tree_store(realm: Path) -> List[str]:
+    return _read_reference_tree(
+        realm,
+        GitReference.OBJECT_REFERENCES.value,
+        [])
+
+
+def test_realm_references(tmp_path):
+    realms = [tmp_path / "realm_0", tmp_path / "realm_1"]
+    for realm in realms:
+        create_git_repo(realm, {"readme.md": "test repo"})
+
+    add_blob_reference(_create_hash(0), realms[0])
+    add_blob_reference(_create_hash(1), realms[1])
+    flush_object_references(realms[0])
+
+    assert _read_tree_store(realms[0]) == [_create_hash(0)]
+    assert (EntryType.File, _create_hash(1)) in get_object_references(realms[1])
+
+    flush_object_references(realms[1])
+    assert _read_tree_store(realms[1]) == [_create_hash(1)]
+
+
+def test_session(tmp_path):
+    create_git_repo(tmp_path, {"readme.md": "test repo"})
+    with object_reference_session(tmp_path) as object_references:
+        add_blob_reference(_create_hash(0))
+        assert len(object_references) == 1
+    assert len(object_references) == 0
+    assert _read_tree_store(tmp_path) == [_create_hash(0)]
+
+
+def test_concurrent_realms(tmp_path):
+    realms = [tmp_path / f"realm_{index}" for index in range(4)]
+    for realm in realms:
+        create_git_repo(realm, {"readme.md": "test repo"})
+
+    errors = []
+
+    def add_references(realm_index: int):
+        try:
+            with object_reference_session(realms[realm_index]):
+                for index in range(realm_index * 100, realm_index * 100 + 100):
+                    add_blob_reference(_create_hash(index))
+                    if index % 25 == 0:
+                        flush_object_references(realms[realm_index])
+        except Exception as exception:
+            errors.append(exception)
+
+    threads = [
+        threading.Thread(target=add_references, args=(realm_index,))
+        for realm_index in range(len(realms))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    for realm_index, realm in enumerate(realms):
+        assert sorted(_read_tree_store(realm)) == sorted(
+            _create_hash(index)
+            for index in range(realm_index * 100, realm_index * 100 + 100))
+
+
+def test_realm_spellings(tmp_path, monkeypatch):
+    realm = tmp_path / "realm"
+    create_git_repo(realm, {"readme.md": "test repo"})
+    (tmp_path / "link").symlink_to(realm)
+    monkeypatch.chdir(tmp_path)
+
+    add_blob_reference(_create_hash(0), "realm")
+    add_blob_reference(_create_hash(1), tmp_path / "link")
+    add_blob_reference(_create_hash(2), str(realm) + "/")
+    assert get_object_references(realm) is get_object_references("link")
+    assert len(get_object_references(realm)) == 3
+
+    flush_object_references(realm)
+    assert sorted(_read_tree_store(realm)) == sorted(
+        _create_hash(index)
+        for index in range(3))
+
+
+def test_failed_flush(tmp_path):
+    realm = tmp_path
+    create_git_repo(realm, {"readme.md": "test repo"})
+    _write_legacy_tree(realm, GitReference.LEGACY_BLOBS.value, EntryType.File, 0, 10)
+
+    add_blob_reference(_create_hash(10))
+    with patch(
+            "dataladmetadatamodel.mapper.gitmapper.objectreference"
+            "._flush_to_tree_store",
+            side_effect=RuntimeError("write failed")):
+        with pytest.raises(RuntimeError):
+            flush_object_references(realm)
+
+    # The references are kept and the legacy store still exists
+    assert len(get_object_references(realm)) == 11
+    assert _does_ref_exist(realm, GitReference.LEGACY_BLOBS.value) is True
+
+    flush_object_references(realm)
+    assert len(get_object_references(realm)) == 0
+    assert sorted(_read_tree_store(realm)) == sorted(
+        _create_hash(index)
+        for index in range(11))
+    assert _does_ref_exist(realm, GitReference.LEGACY_BLOBS.value) is False
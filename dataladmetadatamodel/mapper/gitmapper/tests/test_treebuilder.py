@@ -0,0 +1,84 @@
+import subprocess
+
+import pytest
+
+from ..treebuilder import (
+    SortedTreeBuilder,
+    build_sorted_tree,
+)
+from ....metadatapath import MetadataPath
+from ....mtreenode import MTreeNode
+from ....text import Text
+
+
+paths = [
+    "x",
+    "a/0",
+    "a/1",
+    "a-b",
+    "a/b/0",
+    "a/b/1",
+    "a a/b b b/2 2 2 2",
+    'c/"quoted"',
+]
+
+
+def _items():
+    return [
+        (MetadataPath(path), Text(f"content of: {path}"))
+        for path in sorted(paths, key=lambda path: MetadataPath(path).parts)
+    ]
+
+
+def test_build_sorted_tree(tmp_path):
+    realm = str(tmp_path)
+    subprocess.run(["git", "init", realm], check=True)
+
+    mtree = MTreeNode(Text)
+    mtree.add_children_at(_items())
+    expected_reference = mtree.write_out(realm)
+
+    reference = build_sorted_tree(realm, _items())
+    assert reference == expected_reference
+
+    mtree = MTreeNode(Text, realm=realm, reference=reference)
+    assert {
+        str(path): text.read_in().content
+        for path, text in mtree.get_paths_recursive()
+    } == {
+        path: f"content of: {path}"
+        for path in paths
+    }
+
+    assert build_sorted_tree(realm, []).is_none_reference()
+
+
+def test_closed_directories(tmp_path):
+    realm = str(tmp_path)
+    subprocess.run(["git", "init", realm], check=True)
+
+    builder = SortedTreeBuilder(realm)
+    builder.add(MetadataPath("a/b/c/0"), Text("0"))
+    assert [name for name, _ in builder.open_directories] == ["", "a", "b", "c"]
+    builder.add(MetadataPath("a/x"), Text("1"))
+    assert [name for name, _ in builder.open_directories] == ["", "a"]
+    assert len(builder.open_directories[1][1]) == 2
+    builder.add(MetadataPath("b"), Text("2"))
+    assert len(builder.open_directories) == 1
+    assert not builder.finish().is_none_reference()
+
+
+@pytest.mark.parametrize("invalid_paths", [
+    ["b", "a"],
+    ["a/b", "a/a"],
+    ["a", "a"],
+    ["a", "a/b"],
+])
+def test_invalid_paths(tmp_path, invalid_paths):
+    realm = str(tmp_path)
+    subprocess.run(["git", "init", realm], check=True)
+
+    with pytest.raises(ValueError):
+        build_sorted_tree(
+            realm,
+            [(MetadataPath(path), Text(path)) for path in invalid_paths])
@@ -1,9 +1,19 @@
+import hashlib
+import sys
 import tempfile
 from collections import defaultdict
+from contextlib import nullcontext
 from pathlib import Path
 from unittest.mock import patch
 
+import pytest
+
+from .. import treeupdater
 from ..utils import create_git_repo
+from ..gitbackend.objectformat import (
+    encode_tree,
+    hash_object,
+)
 from ..gitbackend.subprocess import (
     git_ls_tree,
     git_ls_tree_recursive,
@@ -194,3 +204,118 @@ def test_minimal_invocation():
         lines = git_ls_tree_recursive(str(repo_path), result)
         for path_info in path_infos:
             assert f"100644 blob {path_info.object_hash}\t{'/'.join(path_info.elements)}" in lines
+
+
+def test_duplicated_and_conflicting_names():
+    file_hash = "000000000000000000000000000000000000000c"
+    with pytest.raises(ValueError, match="duplicated file names: b"):
+        add_paths(
+            Path("/"),
+            [
+                PathInfo(["a", "b"], file_hash, EntryType.File),
+                PathInfo(["a", "b"], file_hash, EntryType.File),
+            ],
+            [])
+
+    with pytest.raises(ValueError, match="leafs and directories: b"):
+        add_paths(
+            Path("/"),
+            [
+                PathInfo(["a", "b"], file_hash, EntryType.File),
+                PathInfo(["a", "b", "c"], file_hash, EntryType.File),
+            ],
+            [])
+
+
+def _object_reference_path_infos(count: int):
+    result = []
+    for index in range(count):
+        object_hash = hashlib.sha1(str(index).encode()).hexdigest()
+        result.append(
+            PathInfo(
+                [
+                    object_hash[0:3],
+                    object_hash[3:6],
+                    object_hash[6:9],
+                    object_hash[9:],
+                ],
+                object_hash,
+                EntryType.File))
+    return result
+
+
+def _directories(path_infos) -> set:
+    return {
+        tuple(path_info.elements[:length])
+        for path_info in path_infos
+        for length in range(1, len(path_info.elements))}
+
+
+def _count_calls(function, *args) -> int:
+    """ Return the number of python function calls that function makes """
+    calls = 0
+
+    def count_call(frame, event, arg):
+        nonlocal calls
+        if event == "call":
+            calls += 1
+
+    sys.setprofile(count_call)
+    try:
+        function(*args)
+    finally:
+        sys.setprofile(None)
+    return calls
+
+
+def test_linear_scaling():
+
+    objects = dict()
+    read_calls = defaultdict(int)
+    save_calls = []
+
+    def read_tree_node(repo, object_hash):
+        read_calls[object_hash] += 1
+        return [
+            f"{flag} {object_type} {entry_hash}\t{name}"
+            for flag, object_type, entry_hash, name in objects[object_hash]]
+
+    def save_tree_node(repo, entries):
+        save_calls.append(entries)
+        object_hash = hash_object("tree", encode_tree(entries))
+        objects[object_hash] = entries
+        return object_hash
+
+    function_calls = []
+    with \
+            patch.object(treeupdater, "git_read_tree_node", new=read_tree_node), \
+            patch.object(treeupdater, "git_save_tree_node", new=save_tree_node), \
+            patch.object(treeupdater, "git_prefetched_objects", new=lambda *args: nullcontext(), create=True):
+
+        for count in (300, 3000):
+            path_infos = _object_reference_path_infos(2 * count)
+            existing_infos, new_infos = path_infos[:count], path_infos[count:]
+            root_entries = _get_dir(
+                Path("/"),
+                add_paths(Path("/"), existing_infos, []))
+
+            read_calls.clear()
+            save_calls.clear()
+            function_calls.append(
+                _count_calls(add_paths, Path("/"), new_infos, root_entries))
+
+            # Every updated directory is written once, and every existing
+            # directory that is updated is read once.
+            new_directories = _directories(new_infos)
+            assert len(save_calls) == len(new_directories) + 1
+            assert all(calls == 1 for calls in read_calls.values())
+            assert len(read_calls) == len(
+                new_directories & _directories(existing_infos))
+            assert len(read_calls) <= 3 * count
+            assert len(save_calls) <= 3 * count + 1
+
+    # The work, measured in python function calls, e.g. comparisons of
+    # path infos, grows linearly: ten times as many paths take roughly
+    # ten times as many calls, a quadratic implementation would take
+    # about a hundred times as many.
+    assert function_calls[1] < 15 * function_calls[0]
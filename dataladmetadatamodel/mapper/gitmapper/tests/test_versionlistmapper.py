@@ -49,7 +49,7 @@ class TestVersionListMapper(unittest.TestCase):
              mock.patch("dataladmetadatamodel.mapper.gitmapper."
                         "mtreenodemapper.git_save_tree_node") as save_tree_node, \
              mock.patch("dataladmetadatamodel.mapper.gitmapper."
-                        "gitblobcache.git_save_file_list") as file_list_save, \
+                        "gitblobcache.git_save_blobs") as blobs_save, \
              mock.patch("dataladmetadatamodel.mapper.gitmapper."
                         "versionlistmapper.git_update_ref"):
 
@@ -57,8 +57,8 @@ class TestVersionListMapper(unittest.TestCase):
             save_str.return_value = get_location(1)
             save_json_2.return_value = get_location(3)
             save_tree_node.return_value = get_location(4)
-            file_list_save.side_effect = lambda r, l: [
-                hash_blob(open(e, "rb").read())
+            blobs_save.side_effect = lambda r, l: [
+                hash_blob(e)
                 for e in l
             ]
 
@@ -89,10 +89,6 @@ class TestVersionListMapper(unittest.TestCase):
                     'time_stamp': '1.1',
                     'path': 'subset0',
                     'dataset_tree': {
-                        '@': {
-                            'type': 'Reference',
-                            'version': '2.0'
-                        },
                         'class_name': 'MetadataRootRecord',
                         'location': get_location(3)
                     }
@@ -0,0 +1,131 @@
+import subprocess
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+from dataladmetadatamodel.metadatapath import MetadataPath
+from dataladmetadatamodel.tests.utils import create_dataset_tree
+from dataladmetadatamodel.versionlist import (
+    TreeVersionList,
+    VersionRecord,
+)
+from ..gitbackend import subprocess as gitbackend
+from ..gitbackend.fastimport import fast_import_session
+from ..gitbackend.subprocess import (
+    git_load_str,
+    git_ls_tree,
+    git_object_exists_locally,
+    git_save_str,
+    git_save_tree_node,
+    git_update_ref,
+)
+from ..writecache import (
+    cache_realm,
+    flush_realm,
+    get_write_cache,
+    write_cache,
+)
+
+
+def _git(realm: Path, *arguments) -> str:
+    return subprocess.run(
+        ["git", "-C", str(realm)] + list(arguments),
+        stdout=subprocess.PIPE,
+        check=True).stdout.decode()
+
+
+def _init(realm: Path) -> Path:
+    subprocess.run(["git", "init", str(realm)], check=True)
+    return realm
+
+
+def _object_count(realm: Path) -> int:
+    return len(_git(
+        realm,
+        "cat-file", "--batch-all-objects", "--batch-check").splitlines())
+
+
+def test_deferred_writes(tmp_path):
+    realm = _init(tmp_path)
+    with write_cache(str(realm)) as cache:
+        with write_cache(str(realm)) as inner_cache:
+            assert inner_cache is cache
+
+        blob_hash = git_save_str(str(realm), "content\n")
+        tree_hash = git_save_tree_node(
+            str(realm),
+            [("100644", "blob", blob_hash, "a")])
+        git_update_ref(str(realm), "refs/datalad/test", tree_hash)
+
+        assert _object_count(realm) == 0
+        assert _git(realm, "for-each-ref") == ""
+
+        assert git_load_str(str(realm), blob_hash) == "content"
+        assert git_object_exists_locally(str(realm), tree_hash)
+        assert git_ls_tree(str(realm), "refs/datalad/test") == [
+            f"100644 blob {blob_hash}\ta"]
+
+    assert get_write_cache(str(realm)) is None
+    assert _object_count(realm) == 2
+    assert _git(realm, "rev-parse", "refs/datalad/test").strip() == tree_hash
+    _git(realm, "fsck", "--strict")
+
+
+def test_model_write_out_order(tmp_path):
+    realm = _init(tmp_path)
+    tree_version_list = TreeVersionList(initial_set={
+        "v1": {
+            MetadataPath(""): VersionRecord(
+                "0.1",
+                MetadataPath(""),
+                create_dataset_tree())
+        }
+    })
+
+    original_update_ref = gitbackend.git_update_ref
+
+    def checked_update_ref(repo_dir, ref_name, location):
+        # All objects are written before the reference is updated
+        _git(realm, "fsck", "--strict", "--no-dangling", location)
+        original_update_ref(repo_dir, ref_name, location)
+
+    with mock.patch.object(
+            gitbackend,
+            "git_update_ref",
+            side_effect=checked_update_ref) as update_ref:
+        tree_version_list.write_out(str(realm))
+
+    update_ref.assert_called_once()
+    assert get_write_cache(str(realm)) is None
+
+
+def test_flush_into_fast_import_session(tmp_path):
+    realm = _init(tmp_path)
+    _git(realm, "config", "fastimport.unpackLimit", "0")
+    with fast_import_session(str(realm)):
+        with write_cache(str(realm)):
+            git_update_ref(
+                str(realm),
+                "refs/datalad/test",
+                git_save_str(str(realm), "content"))
+        assert _object_count(realm) == 0
+
+    assert _object_count(realm) == 1
+    assert list((realm / ".git" / "objects" / "pack").glob("*.pack"))
+
+
+def test_explicit_caching(tmp_path):
+    realm = _init(tmp_path)
+    cache_realm(str(realm))
+    with pytest.raises(RuntimeError):
+        cache_realm(str(realm))
+
+    blob_hash = git_save_str(str(realm), "content")
+    assert _object_count(realm) == 0
+    flush_realm(str(realm))
+    assert _object_count(realm) == 1
+    assert git_load_str(str(realm), blob_hash) == "content"
+
+    with pytest.raises(RuntimeError):
+        flush_realm(str(realm))
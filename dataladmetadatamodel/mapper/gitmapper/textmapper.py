@@ -3,11 +3,11 @@ from dataladmetadatamodel.mapper.gitmapper.gitbackend.subprocess import (
     git_load_str,
     git_save_str
 )
-from dataladmetadatamodel.mapper.mapper import Mapper
+from dataladmetadatamodel.mapper.gitmapper.gitmapper import GitMapper
 from dataladmetadatamodel.mapper.reference import Reference
 
 
-class TextGitMapper(Mapper):
+class TextGitMapper(GitMapper):
 
     def map_in_impl(self,
                     text: "Text",
@@ -0,0 +1,117 @@
+"""
+Streaming builder for git-trees of mappable objects
+
+The sorted tree builder creates the git-tree of an MTreeNode, e.g. of a
+file tree, from (path, mappable object)-pairs that are given in sorted
+path order, i.e. ordered by the elements of the paths. Every object is
+written out when it is added. A directory is written when the first path
+outside of it is added, because no later path can be in the directory.
+Only the entries of the directories on the path of the last added object
+are kept in memory.
+
+Usage:
+
+    reference = build_sorted_tree(
+        realm,
+        sorted(metadata_items, key=lambda item: item[0].parts))
+    file_tree = FileTree(realm=realm, reference=reference)
+"""
+from typing import (
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
+
+from dataladmetadatamodel.mappableobject import MappableObject
+from dataladmetadatamodel.metadatapath import MetadataPath
+from dataladmetadatamodel.mapper.reference import Reference
+
+from .gitbackend.subprocess import git_save_tree_node
+from .mtreenodemapper import MTreeNodeGitMapper
+
+
+class SortedTreeBuilder:
+    def __init__(self, realm: str):
+        self.realm = realm
+        self.last_parts: Optional[Tuple[str, ...]] = None
+
+        # The directories on the path of the last added object, with
+        # their names and their entries.
+        self.open_directories: List[Tuple[str, List[Tuple[str, str, str, str]]]] = [
+            ("", [])
+        ]
+
+    def add(self, path: MetadataPath, mappable_object: MappableObject):
+        """ Write out mappable_object and add it at path """
+        parts = path.parts
+        if len(parts) == 0:
+            raise ValueError("child name required")
+        if self.last_parts is not None and parts <= self.last_parts:
+            raise ValueError(
+                f"path {path} is not sorted after "
+                f"{MetadataPath.from_parts(self.last_parts)}")
+
+        # Close all directories that are not on the path
+        common_length = 0
+        for name, (directory_name, _) in zip(
+                parts[:-1],
+                self.open_directories[1:]):
+            if name != directory_name:
+                break
+            common_length += 1
+        while len(self.open_directories) > common_length + 1:
+            self._close_directory()
+
+        # Open the directories on the path. A directory name can only
+        # collide with the last entry of the containing directory.
+        for name in parts[len(self.open_directories) - 1:-1]:
+            entries = self.open_directories[-1][1]
+            if entries and entries[-1][3] == self._escape(name):
+                raise ValueError(
+                    f"non tree-node named {name} exists, cannot be "
+                    f"converted to a tree-node")
+            self.open_directories.append((name, []))
+
+        reference = mappable_object.write_out(self.realm)
+        self.open_directories[-1][1].append(
+            ("100644", "blob", reference.location, self._escape(parts[-1])))
+        self.last_parts = parts
+
+    def finish(self) -> Reference:
+        """ Write all open directories and return the root reference """
+        while len(self.open_directories) > 1:
+            self._close_directory()
+
+        _, root_entries = self.open_directories[0]
+        if not root_entries:
+            return Reference.get_none_reference("MTreeNode")
+        return Reference(
+            "MTreeNode",
+            git_save_tree_node(self.realm, root_entries))
+
+    def _close_directory(self):
+        name, entries = self.open_directories.pop()
+        self.open_directories[-1][1].append((
+            "040000",
+            "tree",
+            git_save_tree_node(self.realm, entries),
+            self._escape(name)))
+
+    @staticmethod
+    def _escape(name: str) -> str:
+        return MTreeNodeGitMapper.escape_double_quotes(name)
+
+
+def build_sorted_tree(realm: str,
+                      children: Iterable[Tuple[MetadataPath, MappableObject]]
+                      ) -> Reference:
+    """
+    Write the objects and the git-tree of an MTreeNode that contains
+    them at their paths. The paths must be sorted by their elements.
+    Return the reference of the MTreeNode.
+    """
+    builder = SortedTreeBuilder(realm)
+    for path, mappable_object in children:
+        builder.add(path, mappable_object)
+    return builder.finish()
@@ -10,17 +10,22 @@ references, by using prefixes of the object-hashes as "directory names", i.e. as
 tree reference names.
 """
 import logging
-from dataclasses import dataclass
+from dataclasses import (
+    dataclass,
+    field,
+)
 from enum import Enum
 from pathlib import Path
 from typing import (
     Dict,
     Iterable,
     List,
+    Set,
     Tuple,
     Union,
 )
 
+from .gitbackend.subprocess import git_prefetched_objects
 from .gitbackend.subprocess import git_read_tree_node
 from .gitbackend.subprocess import git_save_tree_node
 from .utils import split_git_lstree_line
@@ -36,6 +41,8 @@ class EntryType(Enum):
 
 @dataclass
 class DirEntry:
+    __slots__ = ("type", "object_hash", "name")
+
     type: EntryType
     object_hash: str
     name: str
@@ -59,6 +66,8 @@ class PathInfo:
     Instances of this class represent object hashes and the prefix_path under which
     those hashes should be, or are, available.
     """
+    __slots__ = ("elements", "object_hash", "type")
+
     elements: List[str]
     object_hash: str
     type: EntryType
@@ -91,46 +100,81 @@ def _check_hash_and_type(obj: Union[DirEntry, PathInfo]):
             f"{type(obj).__name__}: unknown type: {obj.type}")
 
 
-def _check_leaf_or_directory(leaf_infos: List[PathInfo],
-                             directory_infos: Dict[str, PathInfo]):
+@dataclass
+class NewTree:
+    """
+    A directory of the tree that is built from prefix_path infos. Leaf
+    infos and sub-trees are indexed by name, duplicated leaf names are
+    recorded in order to report them.
+    """
+    leaf_infos: Dict[str, PathInfo] = field(default_factory=dict)
+    sub_trees: Dict[str, "NewTree"] = field(default_factory=dict)
+    duplicated_leaf_names: Set[str] = field(default_factory=set)
+    entries: Dict[str, DirEntry] = field(default_factory=dict)
+
+
+def _build_new_tree(path_infos: Iterable[PathInfo]) -> NewTree:
+    """ Sort all prefix_path infos into a tree of directories """
+    root = NewTree()
+    for path_info in path_infos:
+        node = root
+        for element in path_info.elements[:-1]:
+            sub_tree = node.sub_trees.get(element, None)
+            if sub_tree is None:
+                sub_tree = NewTree()
+                node.sub_trees[element] = sub_tree
+            node = sub_tree
+
+        name = path_info.elements[-1]
+        if name in node.leaf_infos:
+            node.duplicated_leaf_names.add(name)
+        node.leaf_infos[name] = path_info
+    return root
+
+
+def _check_leaf_or_directory(new_tree: NewTree):
     """Ensure that a leaf is either a file name or a directory name
 
     While there might only be one file named u, there might be many directories
     named u, but only one type can exist in the new and existing directory info
     entries.
     """
-    # Ensure that a name at this level (a path_info.first()) is either a file
-    # name or a directory name.
     leaf_and_dir_names = [
         name
-        for name in [file_info.first() for file_info in leaf_infos]
-        if name in directory_infos.keys()]
+        for name in new_tree.leaf_infos
+        if name in new_tree.sub_trees]
 
     if leaf_and_dir_names:
         raise ValueError("names used for leafs and directories: " + ", ".join(
             leaf_and_dir_names))
 
 
-def _check_leaf_uniqueness(leaf_infos: List[PathInfo]):
+def _check_leaf_uniqueness(new_tree: NewTree):
     """ Ensure that a file name is only used once"""
-    duplicated_leaf_names = set([
-        file_info.first()
-        for file_info in leaf_infos
-        if [
-            file_info.first()
-            for file_info in leaf_infos
-        ].count(file_info.first()) > 1])
-
-    if duplicated_leaf_names:
+    if new_tree.duplicated_leaf_names:
         raise ValueError("duplicated file names: " + ", ".join(
-            duplicated_leaf_names))
+            sorted(new_tree.duplicated_leaf_names)))
+
 
+def _check_entries_validity(new_tree: NewTree):
 
-def _check_entries_validity(leaf_infos: List[PathInfo],
-                            directory_infos: Dict[str, PathInfo]):
+    _check_leaf_or_directory(new_tree)
+    _check_leaf_uniqueness(new_tree)
+
+    for name, leaf_info in new_tree.leaf_infos.items():
+        existing_entry = new_tree.entries.get(name, None)
+        if existing_entry:
+            if existing_entry.type != leaf_info.type:
+                raise ValueError(
+                    f"cannot convert {existing_entry.type.name} "
+                    f"to {leaf_info.type.name}: {name}")
+            logger.debug(f"modifying existing entry: {name}")
 
-    _check_leaf_or_directory(leaf_infos, directory_infos)
-    _check_leaf_uniqueness(leaf_infos)
+    for directory_name in new_tree.sub_trees:
+        existing_entry = new_tree.entries.get(directory_name, None)
+        if existing_entry and existing_entry.type != EntryType.Directory:
+            raise ValueError(
+                f"cannot convert file to directory: {directory_name}")
 
 
 def _get_dir(repo: Path, object_hash: str) -> List:
@@ -153,79 +197,79 @@ def _write_dir(repo: Path, entries: Iterable[DirEntry]) -> str:
         [entry.get_git_tree_entry_elements() for entry in entries])
 
 
-def add_paths(repo: Path,
-              path_infos: List[PathInfo],
-              root_entries: List[DirEntry]) -> str:
-    """
-    Add all prefix_path infos to the tree object defined by "root-entries". Load
-    subtrees if necessary, write subtrees, when they are completely assembled.
-
-    This method is called recursively, with path_infos shortened by one and
-    corresponding root_entries.
-    """
-
-    # Build a quickly accessible entry structure
-    root_entry_table = {
-        root_entry.name: root_entry
-        for root_entry in root_entries}
-
-    # Collect all leaf entries, i.e. prefix_path info has only one element.
-    leaf_infos = [path_info for path_info in path_infos if path_info.is_leaf()]
-
-    # Collect all directory entries, i.e. for each directory name, get all
-    # sub-paths that start with the directory name.
-    directory_infos = {
-        path_info.first(): [
-            matching_path_info.stripped_by(1)
-            for matching_path_info in path_infos
-            if matching_path_info not in leaf_infos
-            and matching_path_info.first() == path_info.first()
+def _get_dirs(repo: Path, object_hashes: List[str]) -> List[List]:
+    """ Read multiple directories with a single batched request """
+    with git_prefetched_objects(str(repo), object_hashes):
+        return [
+            _get_dir(repo, object_hash)
+            for object_hash in object_hashes
         ]
-        for path_info in path_infos
-        if path_info not in leaf_infos
-    }
 
-    _check_entries_validity(leaf_infos, directory_infos)
 
-    resulting_entries = {**root_entry_table}
+def _read_existing_dirs(repo: Path, root: NewTree):
+    """
+    Read the existing directories that are updated, one level of the
+    tree at a time. Every directory is read once.
+    """
+    level = [root]
+    while level:
+        pending_trees = []
+        for new_tree in level:
+            _check_entries_validity(new_tree)
+            for directory_name, sub_tree in new_tree.sub_trees.items():
+                existing_entry = new_tree.entries.get(directory_name, None)
+                if existing_entry:
+                    pending_trees.append((sub_tree, existing_entry.object_hash))
+
+        existing_dirs = _get_dirs(
+            repo,
+            [directory_hash for _, directory_hash in pending_trees])
+        for (sub_tree, _), dir_entries in zip(pending_trees, existing_dirs):
+            sub_tree.entries = {
+                dir_entry.name: dir_entry
+                for dir_entry in dir_entries}
 
-    # Process leaf entries
-    for leaf_info in leaf_infos:
+        level = [
+            sub_tree
+            for new_tree in level
+            for sub_tree in new_tree.sub_trees.values()]
 
-        name = leaf_info.first()
 
-        existing_entry = root_entry_table.get(name, None)
-        if existing_entry:
-            if existing_entry.type != leaf_info.type:
-                raise ValueError(
-                    f"cannot convert {existing_entry.type.name} "
-                    f"to {leaf_info.type.name}: {name}")
-            logger.debug(f"modifying existing entry: {name}")
+def _write_new_tree(repo: Path, new_tree: NewTree) -> str:
+    """ Write all sub-trees, then the tree itself """
+    resulting_entries = new_tree.entries
 
+    for name, leaf_info in new_tree.leaf_infos.items():
         resulting_entries[name] = DirEntry(
             type=leaf_info.type,
             object_hash=leaf_info.object_hash,
             name=name)
 
-    # Process non-leaf entries
-    for directory_name, sub_path_infos in directory_infos.items():
-        if directory_name in root_entry_table:
-            if root_entry_table[directory_name].type != EntryType.Directory:
-                raise ValueError(
-                    f"cannot convert file to directory: {directory_name}")
-            directory_hash = root_entry_table[directory_name].object_hash
-            sub_dir_entries = _get_dir(repo, directory_hash)
-        else:
-            sub_dir_entries = []
-
-        written_directory_hash = add_paths(
-            repo,
-            sub_path_infos,
-            sub_dir_entries)
-
+    for directory_name, sub_tree in new_tree.sub_trees.items():
         resulting_entries[directory_name] = DirEntry(
             type=EntryType.Directory,
-            object_hash=written_directory_hash,
+            object_hash=_write_new_tree(repo, sub_tree),
             name=directory_name)
 
     return _write_dir(repo, resulting_entries.values())
+
+
+def add_paths(repo: Path,
+              path_infos: List[PathInfo],
+              root_entries: List[DirEntry]) -> str:
+    """
+    Add all prefix_path infos to the tree object defined by "root-entries". Load
+    subtrees if necessary, write subtrees, when they are completely assembled.
+
+    The prefix_path infos are sorted into a tree of new directories first.
+    Existing directories that are updated are read level by level, then
+    all updated directories are written bottom up. The runtime is linear
+    in the number of prefix_path infos.
+    """
+    new_tree = _build_new_tree(path_infos)
+    new_tree.entries = {
+        root_entry.name: root_entry
+        for root_entry in root_entries}
+
+    _read_existing_dirs(repo, new_tree)
+    return _write_new_tree(repo, new_tree)
@@ -5,13 +5,13 @@ from .gitbackend.subprocess import (
     git_save_tree,
     git_update_ref
 )
+from .gitmapper import GitMapper
 from .objectreference import GitReference
 from .utils import split_git_lstree_line
-from ..mapper import Mapper
 from ..reference import Reference
 
 
-class UUIDSetGitMapper(Mapper):
+class UUIDSetGitMapper(GitMapper):
 
     def map_in_impl(self,
                     uuid_set: "UUIDSet",
@@ -30,7 +30,7 @@ class UUIDSetGitMapper(Mapper):
             line_elements = split_git_lstree_line(line)
             version_list = VersionList(
                 realm=realm,
-                reference=Reference("VersionList", line_elements[2]))
+                reference=Reference.intern("VersionList", line_elements[2]))
 
             uuid_set.uuid_set[UUID(line_elements[3])] = version_list
 
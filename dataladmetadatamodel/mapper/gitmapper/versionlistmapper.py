@@ -4,11 +4,11 @@ from dataladmetadatamodel.mapper.gitmapper.gitbackend.subprocess import (
     git_update_ref,
 )
 from dataladmetadatamodel.mapper.gitmapper.objectreference import GitReference
-from dataladmetadatamodel.mapper.mapper import Mapper
+from dataladmetadatamodel.mapper.gitmapper.gitmapper import GitMapper
 from dataladmetadatamodel.mapper.reference import Reference
 
 
-class VersionListGitMapper(Mapper):
+class VersionListGitMapper(GitMapper):
     """
     Map version lists to git objects.
     The objects are blobs containing json strings that
@@ -0,0 +1,246 @@
+"""
+Realm-level write-behind cache
+
+While a write cache is active for a realm, the git backend does not
+write objects to the realm. Instead, it computes the object hashes
+locally and keeps the objects in the cache. Reference updates are
+deferred as well. When the cache is flushed, all blobs are written in
+batches, then all trees in the order in which they were saved, and
+then the references are updated. That ensures that references only
+point to stored objects.
+
+Objects and references that are kept in the cache can be read through
+the git backend.
+
+All git mappers write through a write cache, see GitMapper. The cache
+is flushed when the outermost map_out call of a realm returns.
+"""
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import (
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from dataladmetadatamodel.log import logger
+
+from .gitbackend.objectformat import (
+    encode_tree,
+    hash_object,
+)
+
+
+# Maximum number of trees that are kept before the cache is flushed
+max_cached_trees = 10000
+
+_caches: Dict[str, "RealmWriteCache"] = dict()
+_caches_lock = threading.Lock()
+_bypass = threading.local()
+
+
+class RealmWriteCache:
+    def __init__(self, realm: str):
+        from .gitblobcache import GitBlobCache
+
+        self.realm = realm
+        self.blob_cache = GitBlobCache(realm)
+        self.trees: Dict[str, List[Tuple[str, str, str, str]]] = OrderedDict()
+        # Pending reference updates, a location of None deletes a reference
+        self.ref_updates: Dict[str, Optional[str]] = OrderedDict()
+        self.lock = threading.RLock()
+        # A closed cache was flushed and removed from the registry,
+        # writes that reach it are not cached anymore.
+        self.closed = False
+
+    # Writing
+
+    def save_blob(self, content: Union[str, bytes]) -> str:
+        from .gitbackend.subprocess import git_save_str
+
+        with self.lock, _writing_through():
+            if self.closed:
+                return git_save_str(self.realm, content)
+            return self.blob_cache.cache_blob(self.realm, content)
+
+    def save_tree(self, entry_set: Iterable[Tuple[str, str, str, str]]) -> str:
+        from .gitbackend.subprocess import git_save_tree_node
+
+        entries = list(entry_set)
+        object_hash = hash_object("tree", encode_tree(entries))
+        with self.lock:
+            if self.closed:
+                with _writing_through():
+                    return git_save_tree_node(self.realm, entries)
+            self.trees[object_hash] = entries
+            if len(self.trees) > max_cached_trees:
+                self.flush()
+        return object_hash
+
+    def update_ref(self, ref_name: str, location: Optional[str]):
+        from .gitbackend.subprocess import (
+            git_delete_ref,
+            git_update_ref,
+        )
+
+        with self.lock:
+            if self.closed:
+                with _writing_through():
+                    if location is None:
+                        git_delete_ref(self.realm, ref_name)
+                    else:
+                        git_update_ref(self.realm, ref_name, location)
+                return
+            self.ref_updates.pop(ref_name, None)
+            self.ref_updates[ref_name] = location
+
+    def delete_ref(self, ref_name: str):
+        self.update_ref(ref_name, None)
+
+    # Reading
+
+    def resolve(self, object_reference: str) -> str:
+        """ Replace a reference name by its pending location """
+        name, suffix = object_reference, ""
+        if name.endswith("^{tree}"):
+            name, suffix = name[:-7], "^{tree}"
+
+        with self.lock:
+            if name not in self.ref_updates:
+                return object_reference
+            location = self.ref_updates[name]
+
+        if location is None:
+            raise RuntimeError(
+                f"Reference {name} was deleted in {self.realm}")
+        return location + suffix
+
+    def read_object(self, object_hash: str) -> Optional[Tuple[str, bytes]]:
+        """ Read a cached object, return None for other objects """
+        is_tree_reference = object_hash.endswith("^{tree}")
+        if is_tree_reference:
+            object_hash = object_hash[:-7]
+
+        with self.lock:
+            if object_hash in self.trees:
+                return "tree", encode_tree(self.trees[object_hash])
+            blob = self.blob_cache.get_blob(object_hash)
+
+        if blob is None or is_tree_reference:
+            return None
+        return "blob", blob.encode() if isinstance(blob, str) else blob
+
+    def contains(self, object_hash: str) -> bool:
+        with self.lock:
+            return (
+                object_hash in self.trees
+                or self.blob_cache.get_blob(object_hash) is not None)
+
+    # Flushing
+
+    def close(self):
+        with self.lock:
+            try:
+                self.flush()
+            finally:
+                self.closed = True
+
+    def flush(self):
+        """ Write all cached objects, then update the references """
+        from .gitbackend.subprocess import (
+            git_delete_ref,
+            git_save_tree_node,
+            git_update_ref,
+        )
+
+        with self.lock, _writing_through():
+            logger.debug(
+                f"write cache: flushing "
+                f"{len(self.blob_cache.cached_objects)} blobs, "
+                f"{len(self.trees)} trees, and {len(self.ref_updates)} "
+                f"reference updates to {self.realm}")
+
+            self.blob_cache.flush()
+
+            trees, self.trees = self.trees, OrderedDict()
+            for expected_hash, entries in trees.items():
+                object_hash = git_save_tree_node(self.realm, entries)
+                if object_hash != expected_hash:
+                    raise RuntimeError(
+                        f"wrote tree {object_hash} instead of "
+                        f"{expected_hash} to {self.realm}")
+
+            ref_updates, self.ref_updates = self.ref_updates, OrderedDict()
+            for ref_name, location in ref_updates.items():
+                if location is None:
+                    git_delete_ref(self.realm, ref_name)
+                else:
+                    git_update_ref(self.realm, ref_name, location)
+
+
+@contextmanager
+def _writing_through():
+    """ Let the git backend bypass the write caches of this thread """
+    previous_state = getattr(_bypass, "active", False)
+    _bypass.active = True
+    try:
+        yield
+    finally:
+        _bypass.active = previous_state
+
+
+def get_write_cache(realm: str) -> Optional[RealmWriteCache]:
+    if getattr(_bypass, "active", False):
+        return None
+    return _caches.get(str(realm), None)
+
+
+def cache_realm(realm: str) -> RealmWriteCache:
+    with _caches_lock:
+        if str(realm) in _caches:
+            raise RuntimeError(f"already caching realm: {realm}")
+        cache = RealmWriteCache(str(realm))
+        _caches[str(realm)] = cache
+    return cache
+
+
+def _close(cache: RealmWriteCache):
+    # Flush before the cache is removed from the registry, in order to
+    # keep cached objects readable until they are written.
+    try:
+        cache.close()
+    finally:
+        with _caches_lock:
+            del _caches[cache.realm]
+
+
+def flush_realm(realm: str):
+    with _caches_lock:
+        cache = _caches.get(str(realm), None)
+    if cache is None:
+        raise RuntimeError(f"realm is not cached: {realm}")
+    _close(cache)
+
+
+@contextmanager
+def write_cache(realm: str):
+    """
+    Cache all writes to realm until the outermost write_cache-context
+    of the realm is left.
+    """
+    with _caches_lock:
+        cache = _caches.get(str(realm), None)
+        is_outermost = cache is None
+        if is_outermost:
+            cache = RealmWriteCache(str(realm))
+            _caches[str(realm)] = cache
+
+    try:
+        yield cache
+    finally:
+        if is_outermost:
+            _close(cache)
@@ -2,12 +2,26 @@ from abc import (
     ABCMeta,
     abstractmethod
 )
-from typing import Optional
+from collections import defaultdict
+from contextlib import nullcontext
+from typing import (
+    ContextManager,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
 
 from dataladmetadatamodel.log import logger
 from dataladmetadatamodel.mapper.reference import Reference
 
 
+# Returned by Mapper.map_in_object_at_path, if the backend cannot look
+# up paths, in contrast to None, which indicates that there is no object.
+lookup_not_supported = object()
+
+
 class Mapper(metaclass=ABCMeta):
     """
     Mapper are responsible for populating an existing
@@ -33,7 +47,12 @@ class Mapper(metaclass=ABCMeta):
             logger.warning(f"Mapper.map_in(): converting reference to class "
                            f"{reference.class_name} to a reference to class "
                            f"MTreeNode")
-            reference.class_name = "MTreeNode"
+            # References may be shared, the given reference is replaced
+            # instead of being modified.
+            converted_reference = Reference("MTreeNode", reference.location)
+            if getattr(mappable_object, "reference", None) is reference:
+                mappable_object.reference = converted_reference
+            reference = converted_reference
 
         # TODO: this is not too nice, but required since FileTree and
         #  DatasetTree are proxies for MTreeNode which just add some
@@ -54,6 +73,47 @@ class Mapper(metaclass=ABCMeta):
 
         self.map_in_impl(mappable_object, realm, reference)
 
+    def map_in_many(self,
+                    mappable_objects: List["MappableObject"],
+                    realm: str) -> None:
+        """
+        Map in multiple objects of this mapper's class from realm.
+        Backends can override this method to fetch the backing
+        objects of all mappable objects at once.
+        """
+        for mappable_object in mappable_objects:
+            self.map_in(mappable_object, realm, mappable_object.reference)
+
+    def read_stored_trees_many(self,
+                               mappable_objects: List["MappableObject"],
+                               realm: str
+                               ) -> Optional[Dict[str, List[Tuple[str, bool, str]]]]:
+        """
+        Read the stored trees of the tree-like objects in mappable_objects,
+        which are stored in realm, and of all their sub-trees. Return the
+        stored entries (name, is-tree, object hash) of the trees by tree
+        location. The entries allow to map in the objects and their
+        sub-trees without reading them again. Backends that can read
+        trees together override this method, the default implementation
+        returns None.
+        """
+        return None
+
+    def map_in_object_at_path(self,
+                              mappable_object: "MappableObject",
+                              realm: str,
+                              reference: Reference,
+                              path: "MetadataPath"
+                              ) -> Optional["MappableObject"]:
+        """
+        Return the object that is stored at path in the tree-like
+        object stored at reference, or None if there is no such object.
+        The returned object is not mapped in. Backends that can look up
+        paths without mapping in the intermediate objects override this
+        method, the default implementation returns lookup_not_supported.
+        """
+        return lookup_not_supported
+
     def map_out(self,
                 mappable_object: "MappableObject",
                 realm: Optional[str] = None,
@@ -64,7 +124,16 @@ class Mapper(metaclass=ABCMeta):
                 raise Exception(
                     "'destination' not set and no default destination provided")
             realm = self.destination
-        return self.map_out_impl(mappable_object, realm, force_write)
+        with self.write_scope(realm):
+            return self.map_out_impl(mappable_object, realm, force_write)
+
+    def write_scope(self, realm: str) -> ContextManager:
+        """
+        Return a context manager that is active while an object is
+        mapped out to realm. Backends can use it to defer writes until
+        the outermost map_out call returns.
+        """
+        return nullcontext()
 
     @abstractmethod
     def map_in_impl(self,
@@ -79,3 +148,33 @@ class Mapper(metaclass=ABCMeta):
                      realm: str,
                      force_write: bool) -> Reference:
         raise NotImplementedError
+
+
+def read_in_many(mappable_objects: Iterable["MappableObject"],
+                 backend_type: str = "git"
+                 ) -> List["MappableObject"]:
+    """
+    Read in all given mappable objects. Unmapped objects are grouped
+    by realm and class. Each group is mapped in with a single call to
+    Mapper.map_in_many.
+    """
+    from dataladmetadatamodel.mapper import get_mapper
+    from dataladmetadatamodel.memorybudget import object_mapped
+
+    mappable_objects = list(mappable_objects)
+    groups: Dict[Tuple[str, str], List["MappableObject"]] = defaultdict(list)
+    for mappable_object in mappable_objects:
+        if mappable_object.needs_map_in():
+            groups[(
+                mappable_object.realm,
+                type(mappable_object).__name__
+            )].append(mappable_object)
+
+    for (realm, class_name), group in groups.items():
+        get_mapper(class_name, backend_type).map_in_many(group, realm)
+        for mappable_object in group:
+            mappable_object.mapped = True
+            mappable_object.invalidate_saved_status()
+            object_mapped(mappable_object)
+
+    return mappable_objects
@@ -1,20 +1,30 @@
 import json
 import logging
-from typing import Optional
-
-from dataladmetadatamodel import (
-    check_serialized_version,
-    version_string
+import threading
+import weakref
+from typing import (
+    Dict,
+    Optional,
 )
 
+from dataladmetadatamodel import check_serialized_version
+
 
 logger = logging.getLogger("datalad.metadatamodel.mapper")
 
 none_class_name = "*None*"
 none_location = "*None*"
 
+# References that were read from storage, by class name and location.
+# Entries are removed when the last user of the reference is deleted.
+_interned_references: Dict[str, weakref.WeakValueDictionary] = dict()
+_interned_references_lock = threading.Lock()
+
 
 class Reference:
+
+    __slots__ = ("class_name", "location", "__weakref__")
+
     def __init__(self,
                  class_name: str,
                  location: Optional[str] = None):
@@ -40,6 +50,7 @@ class Reference:
         )
 
     def assign_from(self, other: "Reference"):
+        """ Copy other, interned references must not be modified """
         self.class_name = other.class_name
         self.location = other.location
 
@@ -50,14 +61,11 @@ class Reference:
         return json.dumps(self.to_json_obj())
 
     def to_json_obj(self):
-        return {
-            "@": dict(
-                type="Reference",
-                version=version_string),
-            **dict(
-                class_name=self.class_name,
-                location=self.location)
-        }
+        # References are stored without type- and version-header,
+        # they are always read in the context of their container.
+        return dict(
+            class_name=self.class_name,
+            location=self.location)
 
     @classmethod
     def from_json_str(cls, json_str: str) -> "Reference":
@@ -65,15 +73,37 @@ class Reference:
 
     @classmethod
     def from_json_obj(cls, obj) -> "Reference":
-        assert obj["@"]["type"] == "Reference"
-        check_serialized_version(obj)
+        if "@" in obj:
+            # Version 2 references carry a header
+            assert obj["@"]["type"] == "Reference"
+            check_serialized_version(obj)
         if "mapper_family" in obj or "realm" in obj:
             logger.info(f"old reference object found: {obj}")
-        return cls(
+        return cls.intern(
             obj["class_name"],
             obj["location"]
         )
 
+    @classmethod
+    def intern(cls,
+               class_name: str,
+               location: Optional[str]
+               ) -> "Reference":
+        """
+        Return a shared reference to location. Interned references
+        must not be modified.
+        """
+        with _interned_references_lock:
+            references = _interned_references.get(class_name)
+            if references is None:
+                references = weakref.WeakValueDictionary()
+                _interned_references[class_name] = references
+            reference = references.get(location)
+            if reference is None:
+                reference = cls(class_name, location)
+                references[location] = reference
+        return reference
+
     @classmethod
     def get_none_reference(cls, referred_class_name: str) -> "Reference":
         return cls(referred_class_name, none_location)
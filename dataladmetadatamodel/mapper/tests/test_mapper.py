@@ -1,11 +1,19 @@
 import unittest
-from typing import Union
+from typing import (
+    List,
+    Union,
+)
 
-from ..mapper import Mapper
+from .. import set_mapper
+from ..mapper import (
+    Mapper,
+    read_in_many,
+)
 from ..reference import Reference
 from ...datasettree import DatasetTree
 from ...filetree import FileTree
 from ...mappableobject import MappableObject
+from ...text import Text
 
 
 class DummyMapper(Mapper):
@@ -17,6 +25,7 @@ class DummyMapper(Mapper):
         super().__init__(class_name, destination)
         self.location = location
         self.map_in_call_count = 0
+        self.map_in_many_calls = []
 
     def map_in_impl(self,
                     mappable_object: MappableObject,
@@ -25,6 +34,12 @@ class DummyMapper(Mapper):
         self.map_in_call_count += 1
         return
 
+    def map_in_many(self,
+                    mappable_objects: List[MappableObject],
+                    realm: str) -> None:
+        self.map_in_many_calls.append((realm, len(mappable_objects)))
+        super().map_in_many(mappable_objects, realm)
+
     def map_out_impl(self,
                      mappable_object: MappableObject,
                      realm: str,
@@ -52,6 +67,28 @@ class TestMapper(unittest.TestCase):
     def test_compatibility_filetree(self):
         self._test_compatibility_tree(FileTree)
 
+    def test_read_in_many(self):
+        mapper = DummyMapper("Text", "/tmp/1", "loc-1")
+        set_mapper("Text", "dummy", mapper)
+
+        texts = [
+            Text(realm=realm, reference=Reference("Text", f"location{i}"))
+            for i, realm in enumerate(["/tmp/1", "/tmp/2", "/tmp/1"])
+        ]
+        mapped_text = Text("content")
+        none_text = Text(
+            realm="/tmp/1",
+            reference=Reference.get_none_reference("Text"))
+
+        result = read_in_many(texts + [mapped_text, none_text], "dummy")
+
+        self.assertEqual(result, texts + [mapped_text, none_text])
+        self.assertEqual(
+            sorted(mapper.map_in_many_calls),
+            [("/tmp/1", 2), ("/tmp/2", 1)])
+        self.assertEqual(mapper.map_in_call_count, 3)
+        self.assertTrue(all(text.mapped for text in texts))
+
 
 if __name__ == '__main__':
     unittest.main()
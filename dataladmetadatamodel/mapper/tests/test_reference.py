@@ -1,7 +1,11 @@
+import gc
 import unittest
 from unittest.mock import patch
 
-from ..reference import Reference
+from ..reference import (
+    Reference,
+    _interned_references,
+)
 
 
 class TestReference(unittest.TestCase):
@@ -38,6 +42,27 @@ class TestReference(unittest.TestCase):
             self.assertEqual(reference1, reference2)
             logger.info.assert_called_once()
 
+    def test_interned_references(self):
+        json_object = Reference("SomeClass", "some-location").to_json_obj()
+        reference1 = Reference.from_json_obj(json_object)
+        reference2 = Reference.from_json_obj(json_object)
+        self.assertIs(reference1, reference2)
+        self.assertIs(
+            Reference.intern("SomeClass", "some-location"),
+            reference1)
+        self.assertIsNot(
+            Reference.intern("OtherClass", "some-location"),
+            reference1)
+
+        # Unused references are removed from the intern table
+        del reference1, reference2
+        gc.collect()
+        self.assertNotIn("some-location", _interned_references["SomeClass"])
+
+    def test_slots(self):
+        reference = Reference("SomeClass", "some-location")
+        self.assertRaises(AttributeError, setattr, reference, "realm", "/tmp/t")
+
     def test_remote(self):
         for realm in ("git:x.com", "http://x.com/", "https://x.com/", "ssh:x@x.com"):
             self.assertTrue(Reference.is_remote(realm))
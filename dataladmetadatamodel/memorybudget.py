@@ -0,0 +1,170 @@
+"""
+Memory budgets for mapped objects
+
+A memory budget limits the estimated size of the mapped objects of a
+realm, or of all realms. Mapped objects that are saved on their realm
+are kept in a least-recently-used list. If the size of the mapped
+objects exceeds the budget, the least recently used objects that are
+not modified, and that have no mapped sub-objects, are purged. Purged
+objects are transparently mapped in again when they are accessed
+through their methods.
+
+Sizes are coarse estimates, see MappableObject.estimated_size().
+
+Usage:
+
+    with memory_budget(500 * 1024 * 1024):
+        for path, metadata in file_tree.get_paths_recursive():
+            ...
+"""
+import threading
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import (
+    Dict,
+    Optional,
+    Tuple,
+)
+
+from dataladmetadatamodel.log import logger
+
+
+# Number of most recently used objects that are never purged. That
+# keeps the objects on the path to the currently accessed object, e.g.
+# the ancestors of a tree node that is modified, mapped.
+protected_objects = 64
+
+
+class ResidentObjects:
+    """ Least-recently-used list of mapped objects with a size limit """
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.size = 0
+        self.entries: Dict[int, Tuple[weakref.ref, int]] = OrderedDict()
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, mappable_object: "MappableObject"):
+        """ Add or refresh an object and purge cold objects if required """
+        key = id(mappable_object)
+        size = mappable_object.estimated_size()
+        with self.lock:
+            entry = self.entries.get(key, None)
+            if entry is not None and entry[0]() is mappable_object:
+                self.size -= entry[1]
+                self.entries.move_to_end(key)
+                object_ref = entry[0]
+            else:
+                object_ref = weakref.ref(
+                    mappable_object,
+                    lambda dead_ref: self._collected(key, dead_ref))
+            self.entries[key] = object_ref, size
+            self.size += size
+            if self.size > self.max_size:
+                self._evict(mappable_object)
+
+    def remove(self, mappable_object: "MappableObject"):
+        with self.lock:
+            entry = self.entries.get(id(mappable_object), None)
+            if entry is not None and entry[0]() is mappable_object:
+                del self.entries[id(mappable_object)]
+                self.size -= entry[1]
+
+    def _collected(self, key: int, object_ref: weakref.ref):
+        with self.lock:
+            entry = self.entries.get(key, None)
+            if entry is not None and entry[0] is object_ref:
+                del self.entries[key]
+                self.size -= entry[1]
+
+    def _evict(self, keep: "MappableObject"):
+        # Visit every unprotected entry at most once. Objects with mapped
+        # sub-objects are purged after their sub-objects, which protects
+        # the sub-objects that were used recently.
+        for _ in range(len(self.entries) - protected_objects):
+            if self.size <= self.max_size:
+                break
+
+            key, (object_ref, size) = next(iter(self.entries.items()))
+            mappable_object = object_ref()
+            if mappable_object is None or mappable_object.mapped is False:
+                del self.entries[key]
+                self.size -= size
+            elif not mappable_object.is_saved_on(mappable_object.realm):
+                # Modified objects are added again when they are saved
+                del self.entries[key]
+                self.size -= size
+            elif mappable_object is keep or any(
+                    sub_object.mapped
+                    for sub_object in mappable_object.modifiable_sub_objects):
+                self.entries.move_to_end(key)
+            else:
+                logger.debug(
+                    f"memory budget: purging {mappable_object}, resident "
+                    f"size: {self.size}, budget: {self.max_size}")
+                # Purging removes the object, and its mapped
+                # sub-objects, from the list.
+                mappable_object.purge()
+                self.remove(mappable_object)
+
+
+_budgets: Dict[Optional[str], ResidentObjects] = dict()
+_budgets_lock = threading.Lock()
+
+
+def _get_resident_objects(realm: Optional[str]) -> Optional[ResidentObjects]:
+    resident_objects = _budgets.get(str(realm), None)
+    if resident_objects is None:
+        resident_objects = _budgets.get(None, None)
+    return resident_objects
+
+
+def set_memory_budget(max_size: Optional[int],
+                      realm: Optional[str] = None) -> Optional[int]:
+    """
+    Set the memory budget in bytes for the mapped objects of realm, or
+    for all realms without their own budget if realm is None. A budget
+    of None removes the budget. Return the previous budget.
+    """
+    realm = str(realm) if realm is not None else None
+    with _budgets_lock:
+        resident_objects = _budgets.pop(realm, None)
+        if max_size is not None:
+            _budgets[realm] = ResidentObjects(max_size)
+    return resident_objects.max_size if resident_objects else None
+
+
+@contextmanager
+def memory_budget(max_size: Optional[int], realm: Optional[str] = None):
+    """ Limit the size of mapped objects while the context is active """
+    previous_max_size = set_memory_budget(max_size, realm)
+    try:
+        yield
+    finally:
+        set_memory_budget(previous_max_size, realm)
+
+
+def get_resident_size(realm: Optional[str] = None) -> int:
+    """ Return the estimated size of the objects in the budget of realm """
+    resident_objects = _budgets.get(
+        str(realm) if realm is not None else None,
+        None)
+    return resident_objects.size if resident_objects else 0
+
+
+def object_mapped(mappable_object: "MappableObject"):
+    """ Record that a saved object was mapped or accessed """
+    if _budgets and mappable_object.saved_on:
+        resident_objects = _get_resident_objects(mappable_object.realm)
+        if resident_objects is not None:
+            resident_objects.add(mappable_object)
+
+
+def object_purged(mappable_object: "MappableObject"):
+    if _budgets:
+        resident_objects = _get_resident_objects(mappable_object.realm)
+        if resident_objects is not None:
+            resident_objects.remove(mappable_object)
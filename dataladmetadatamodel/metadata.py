@@ -1,13 +1,19 @@
 import copy
 import json
+import threading
 import time
+import weakref
+from collections.abc import MutableMapping
 from typing import (
+    Callable,
     Dict,
     Generator,
     Iterable,
+    Iterator,
     List,
     Optional,
-    Tuple
+    Tuple,
+    Union,
 )
 
 from dataladmetadatamodel import (
@@ -20,8 +26,62 @@ from dataladmetadatamodel.mapper.reference import Reference
 
 
 class ParameterDict(dict):
+    """
+    A parameter dictionary that can be frozen. Frozen parameter
+    dictionaries are shared and raise RuntimeError if they are modified,
+    their hash is computed once.
+    """
+    _frozen = False
+    _hash: Optional[int] = None
+
+    def freeze(self):
+        self._frozen = True
+
+    def is_frozen(self) -> bool:
+        return self._frozen
+
     def __hash__(self):
-        return hash(tuple(sorted(self.items())))
+        if self._hash is not None:
+            return self._hash
+        hash_value = hash(tuple(sorted(self.items())))
+        if self._frozen:
+            self._hash = hash_value
+        return hash_value
+
+    def __copy__(self):
+        return ParameterDict(self)
+
+    def __deepcopy__(self, memo):
+        return ParameterDict(copy.deepcopy(dict(self), memo))
+
+    def __reduce__(self):
+        return ParameterDict, (dict(self),)
+
+
+def _mutating_method(name: str):
+    dict_method = getattr(dict, name)
+
+    def method(self, *args, **kwargs):
+        if self._frozen:
+            raise RuntimeError(
+                f"{name}() called on shared extractor parameters")
+        return dict_method(self, *args, **kwargs)
+
+    method.__name__ = name
+    return method
+
+
+# "__ior__" is only defined in Python 3.9 and later
+for _name in ("__setitem__", "__delitem__", "__ior__", "clear", "pop",
+              "popitem", "setdefault", "update"):
+    if hasattr(dict, _name):
+        setattr(ParameterDict, _name, _mutating_method(_name))
+
+
+# Configurations that were read from storage, by version and parameter.
+# Entries are removed when the last user of the configuration is deleted.
+_interned_configurations = weakref.WeakValueDictionary()
+_interned_configurations_lock = threading.Lock()
 
 
 class ExtractorConfiguration:
@@ -35,6 +95,22 @@ class ExtractorConfiguration:
         self.version = version
         self.parameter = ParameterDict(parameter)
 
+    def __setattr__(self, name, value):
+        if self.__dict__.get("parameter") is not None \
+                and self.parameter.is_frozen():
+            raise RuntimeError(
+                f"attribute {name} of a shared extractor configuration "
+                f"assigned")
+        super().__setattr__(name, value)
+
+    def __deepcopy__(self, memo):
+        # Shared configurations cannot be modified and are not copied
+        if self.parameter.is_frozen():
+            return self
+        return ExtractorConfiguration(
+            self.version,
+            copy.deepcopy(self.parameter, memo))
+
     def to_json_obj(self) -> JSONObject:
         return {
             "@": dict(
@@ -42,7 +118,7 @@ class ExtractorConfiguration:
                 version=version_string
             ),
             "version": self.version,
-            "parameter": self.parameter
+            "parameter": dict(self.parameter)
         }
 
     def to_json_str(self) -> str:
@@ -57,14 +133,47 @@ class ExtractorConfiguration:
     def __hash__(self):
         return hash((self.version, self.parameter))
 
+    @classmethod
+    def intern(cls,
+               configuration: "ExtractorConfiguration",
+               frozen_copy: bool = True
+               ) -> "ExtractorConfiguration":
+        """
+        Return a shared configuration that is equal to configuration.
+        Shared configurations are frozen, i.e. they raise RuntimeError
+        if they are modified. If configuration is not frozen, a frozen
+        copy is shared, or configuration itself, if frozen_copy is
+        False. Configurations with unhashable parameters are not
+        interned.
+        """
+        key = configuration.version, configuration.parameter
+        try:
+            hash(key)
+        except TypeError:
+            return configuration
+
+        with _interned_configurations_lock:
+            interned_configuration = _interned_configurations.get(key)
+            if interned_configuration is None:
+                if not configuration.parameter.is_frozen():
+                    if frozen_copy:
+                        configuration = cls(*key)
+                    configuration.parameter.freeze()
+                _interned_configurations[
+                    configuration.version,
+                    configuration.parameter] = configuration
+                interned_configuration = configuration
+        return interned_configuration
+
     @classmethod
     def from_json_obj(cls, obj: JSONObject) -> "ExtractorConfiguration":
         assert obj["@"]["type"] == "ExtractorConfiguration"
         check_serialized_version(obj)
-        return cls(
-            obj["version"],
-            obj["parameter"]
-        )
+        return cls.intern(
+            cls(
+                obj["version"],
+                obj["parameter"]),
+            frozen_copy=False)
 
     @classmethod
     def from_json_str(cls, json_str: str) -> "ExtractorConfiguration":
@@ -145,6 +254,7 @@ class MetadataInstanceSet:
                  initial_metadata_instances: Optional[Iterable[MetadataInstance]] = None):
 
         self.parameter_set = list()
+        self._configuration_indices: Dict[ExtractorConfiguration, int] = dict()
         self._instances = dict()
         for metadata_instance in initial_metadata_instances or []:
             self.add_metadata_instance(metadata_instance)
@@ -152,10 +262,36 @@ class MetadataInstanceSet:
     def __iter__(self):
         yield from self._instances.values()
 
+    def _get_configuration_index(self,
+                                 configuration: ExtractorConfiguration
+                                 ) -> Optional[int]:
+        try:
+            return self._configuration_indices.get(configuration)
+        except TypeError:
+            # Configurations with unhashable parameters are not indexed
+            for index, known_configuration in enumerate(self.parameter_set):
+                if known_configuration == configuration:
+                    return index
+            return None
+
+    def _add_configuration(self, configuration: ExtractorConfiguration) -> int:
+        # Indexed configurations are frozen, so that their hash does
+        # not change.
+        configuration = ExtractorConfiguration.intern(configuration)
+        index = len(self.parameter_set)
+        self.parameter_set.append(configuration)
+        try:
+            self._configuration_indices.setdefault(configuration, index)
+        except TypeError:
+            pass
+        return index
+
     def add_metadata_instance(self, metadata_instance: MetadataInstance):
-        if metadata_instance.configuration not in self.parameter_set:
-            self.parameter_set.append(metadata_instance.configuration)
-        instance_key = self.parameter_set.index(metadata_instance.configuration)
+        instance_key = self._get_configuration_index(
+            metadata_instance.configuration)
+        if instance_key is None:
+            instance_key = self._add_configuration(
+                metadata_instance.configuration)
         self._instances[instance_key] = metadata_instance
 
     @property
@@ -170,7 +306,10 @@ class MetadataInstanceSet:
         return self._instances[index]
 
     def get_instance_for_configuration(self, configuration: ExtractorConfiguration):
-        return self._instances[self.parameter_set.index(configuration)]
+        index = self._get_configuration_index(configuration)
+        if index is None:
+            raise ValueError(f"unknown configuration: {configuration}")
+        return self._instances[index]
 
     def to_json_obj(self) -> JSONObject:
         return {
@@ -197,10 +336,9 @@ class MetadataInstanceSet:
         check_serialized_version(obj)
 
         metadata_instance_set = cls()
-        metadata_instance_set.parameter_set = [
-            ExtractorConfiguration.from_json_obj(json_obj)
-            for json_obj in obj["parameter_set"]
-        ]
+        for json_obj in obj["parameter_set"]:
+            metadata_instance_set._add_configuration(
+                ExtractorConfiguration.from_json_obj(json_obj))
         metadata_instance_set._instances = {
             int(configuration_id): MetadataInstance.from_json_obj(json_obj)
             for configuration_id, json_obj in obj["instance_set"].items()
@@ -216,6 +354,162 @@ class MetadataInstanceSet:
                and self._instances == other._instances
 
 
+class InstanceSets(MutableMapping):
+    """
+    The instance sets of a metadata object by extractor name.
+
+    Instance sets that are read from a stored metadata object are kept in
+    their decoded JSON-representation until they are accessed. Instance
+    sets that are not accessed are written out in their stored
+    representation, if it has the current version.
+
+    Mappers that store instance sets individually add them as stored
+    instance sets, which are loaded with the given loader when they are
+    accessed, and which do not have to be written out again as long as
+    they are not accessed.
+    """
+
+    __slots__ = ("_instance_sets", "_stored_locations", "_loader")
+
+    def __init__(self):
+        # Values are None for stored instance sets that are not loaded
+        self._instance_sets: Dict[
+            str,
+            Union[MetadataInstanceSet, JSONObject, None]] = dict()
+        self._stored_locations: Dict[str, Tuple[str, str]] = dict()
+        self._loader: Optional[
+            Callable[[str, List[str]], List[JSONObject]]] = None
+
+    def __getitem__(self, extractor_name: str) -> MetadataInstanceSet:
+        instance_set = self._instance_sets[extractor_name]
+        if instance_set is None:
+            self._load([extractor_name])
+            instance_set = self._instance_sets[extractor_name]
+
+        # The caller might modify the instance set
+        self._stored_locations.pop(extractor_name, None)
+
+        if not isinstance(instance_set, MetadataInstanceSet):
+            instance_set = MetadataInstanceSet.from_json_obj(instance_set)
+            self._instance_sets[extractor_name] = instance_set
+        return instance_set
+
+    def __setitem__(self,
+                    extractor_name: str,
+                    instance_set: MetadataInstanceSet):
+        self._instance_sets[extractor_name] = instance_set
+        self._stored_locations.pop(extractor_name, None)
+
+    def __delitem__(self, extractor_name: str):
+        del self._instance_sets[extractor_name]
+        self._stored_locations.pop(extractor_name, None)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._instance_sets)
+
+    def __len__(self) -> int:
+        return len(self._instance_sets)
+
+    def __repr__(self):
+        return f"InstanceSets({self._instance_sets!r})"
+
+    def set_json_obj(self, extractor_name: str, json_obj: JSONObject):
+        """ Add a stored instance set that is decoded on access """
+        self._instance_sets[extractor_name] = json_obj
+
+    def set_stored(self,
+                   extractor_name: str,
+                   realm: str,
+                   location: str,
+                   loader: Callable[[str, List[str]], List[JSONObject]]):
+        """
+        Add an instance set that is stored at location in realm. It is
+        loaded with loader(realm, locations) when it is accessed.
+        """
+        self._instance_sets[extractor_name] = None
+        self._stored_locations[extractor_name] = realm, location
+        self._loader = loader
+
+    def set_saved(self, extractor_name: str, realm: str, location: str):
+        """ Record that the instance set is stored at location in realm """
+        self._stored_locations[extractor_name] = realm, location
+
+    def get_stored_location(self,
+                            extractor_name: str,
+                            realm: str) -> Optional[str]:
+        """
+        Return the location of the instance set in realm, if it is stored
+        there and has not been accessed since, else return None.
+        """
+        stored_realm, location = self._stored_locations.get(
+            extractor_name,
+            (None, None))
+        return location if stored_realm == realm else None
+
+    def load_all(self):
+        """ Load all stored instance sets with a single request per realm """
+        self._load([
+            extractor_name
+            for extractor_name, instance_set in self._instance_sets.items()
+            if instance_set is None
+        ])
+
+    def _load(self, extractor_names: List[str]):
+        missing: Dict[str, List[str]] = dict()
+        for extractor_name in extractor_names:
+            realm, _ = self._stored_locations[extractor_name]
+            missing.setdefault(realm, []).append(extractor_name)
+
+        for realm, extractor_names in missing.items():
+            json_objs = self._loader(
+                realm,
+                [
+                    self._stored_locations[extractor_name][1]
+                    for extractor_name in extractor_names
+                ])
+            for extractor_name, json_obj in zip(extractor_names, json_objs):
+                self._instance_sets[extractor_name] = json_obj
+
+    def is_decoded(self, extractor_name: str) -> bool:
+        return isinstance(
+            self._instance_sets[extractor_name],
+            MetadataInstanceSet)
+
+    def get_instance_count(self, extractor_name: str) -> int:
+        """
+        Return the number of instances without decoding the set, instance
+        sets that are not loaded have no instances in memory.
+        """
+        instance_set = self._instance_sets[extractor_name]
+        if instance_set is None:
+            return 0
+        if isinstance(instance_set, MetadataInstanceSet):
+            return len(instance_set.instances)
+        return len(instance_set["instance_set"])
+
+    def get_json_obj(self, extractor_name: str) -> JSONObject:
+        """
+        Return the JSON-representation of the instance set in the current
+        version, without decoding it if possible.
+        """
+        instance_set = self._instance_sets[extractor_name]
+        if instance_set is None:
+            self._load([extractor_name])
+            instance_set = self._instance_sets[extractor_name]
+        if not isinstance(instance_set, MetadataInstanceSet):
+            if instance_set["@"]["version"] == version_string:
+                return instance_set
+            instance_set = self[extractor_name]
+        return instance_set.to_json_obj()
+
+    def to_json_obj(self) -> JSONObject:
+        self.load_all()
+        return {
+            extractor_name: self.get_json_obj(extractor_name)
+            for extractor_name in self._instance_sets
+        }
+
+
 class Metadata(MappableObject):
     """
     Holds entries for all metadata of a single object.
@@ -225,6 +519,12 @@ class Metadata(MappableObject):
     associated metadata, i.e. objects that contain
     the extractor result, aka the real metadata.
     """
+
+    __slots__ = ("instance_sets",)
+
+    # Estimated memory size of a metadata instance in bytes
+    instance_size = 1024
+
     def __init__(self,
                  realm: Optional[str] = None,
                  reference: Optional[Reference] = None):
@@ -233,7 +533,7 @@ class Metadata(MappableObject):
         assert isinstance(reference, (type(None), Reference))
 
         super().__init__(realm, reference)
-        self.instance_sets: Dict[str, MetadataInstanceSet] = dict()
+        self.instance_sets = InstanceSets()
 
     def __eq__(self, other):
         return self.instance_sets == other.instance_sets
@@ -244,7 +544,12 @@ class Metadata(MappableObject):
         return Metadata(realm, reference)
 
     def purge_impl(self):
-        self.instance_sets = dict()
+        self.instance_sets = InstanceSets()
+
+    def estimated_size(self) -> int:
+        return self.base_size + self.instance_size * sum(
+            self.instance_sets.get_instance_count(extractor_name)
+            for extractor_name in self.instance_sets)
 
     def modifiable_sub_objects_impl(self) -> Iterable[MappableObject]:
         return []
@@ -257,6 +562,7 @@ class Metadata(MappableObject):
     @property
     def extractor_runs(self) -> Generator[Tuple[str, MetadataInstanceSet], None, None]:
         self.ensure_mapped()
+        self.instance_sets.load_all()
         yield from self.instance_sets.items()
 
     def extractor_runs_for_extractor(self, extractor_name: str) -> MetadataInstanceSet:
@@ -289,25 +595,26 @@ class Metadata(MappableObject):
         self.instance_sets[extractor_name] = instance_set
 
     def to_json(self) -> str:
-        return json.dumps({
+        return json.dumps(self.to_json_obj())
+
+    def to_json_obj(self) -> JSONObject:
+        return {
             "@": dict(
                 type="Metadata",
                 version=version_string
             ),
-            "instance_sets": {
-                format_name: instance_set.to_json_obj()
-                for format_name, instance_set in self.instance_sets.items()
-            }
-        })
+            "instance_sets": self.instance_sets.to_json_obj()
+        }
 
     def init_from_json(self, json_str) -> None:
-        obj = json.loads(json_str)
+        self.init_from_json_obj(json.loads(json_str))
+
+    def init_from_json_obj(self, obj) -> None:
         check_serialized_version(obj)
 
         assert obj["@"]["type"] == "Metadata"
         for format_name, instance_set_json_obj in obj["instance_sets"].items():
-            self.instance_sets[format_name] = \
-                MetadataInstanceSet.from_json_obj(instance_set_json_obj)
+            self.instance_sets.set_json_obj(format_name, instance_set_json_obj)
 
     @classmethod
     def from_json(cls, json_str: str) -> "Metadata":
@@ -1,38 +1,216 @@
+"""
+Relative paths of objects in metadata trees
+
+A MetadataPath is an immutable tuple of path elements. It supports the
+parts of the PurePosixPath-interface that are used with metadata paths,
+e.g. parts, name, parent, joining with "/", relative_to, comparison,
+and hashing. Metadata paths are equal to, and hash like, pure posix
+paths with the same parts. Joining two metadata paths concatenates their element
+tuples, and the string representation is computed once, when it is
+first used.
+
+Strings are parsed with PurePosixPath, absolute paths are converted to
+relative paths. The elements of the empty path are an empty tuple, its
+string representation is "".
+"""
+import sys
 from pathlib import PurePosixPath
+from typing import (
+    Iterable,
+    Optional,
+    Tuple,
+)
 
 from dataladmetadatamodel.log import logger
 
 
-class MetadataPath(PurePosixPath):
+class MetadataPath:
+
+    __slots__ = ("_parts", "_str")
+
     def __new__(cls, *args):
 
-        posix_args = []
-        for arg in args:
-            if isinstance(arg, str):
-                arg.replace("\\", "/")
-            posix_args.append(arg)
+        if len(args) == 1 and isinstance(args[0], str):
+            original_path = PurePosixPath(args[0])
+            if not original_path.is_absolute():
+                return cls.from_parts(original_path.parts)
+
+        elif all(isinstance(arg, MetadataPath) for arg in args):
+            parts = ()
+            for arg in args:
+                parts += arg._parts
+            return cls.from_parts(parts)
 
-        original_path = PurePosixPath(*posix_args)
+        original_path = PurePosixPath(*(
+            str(arg) if isinstance(arg, MetadataPath) else arg
+            for arg in args))
         if not original_path.is_absolute():
-            created_path = super().__new__(
-                cls,
-                "/".join(original_path.parts))
-        else:
-            modified_path = "/".join(original_path.parts[1:])
-            created_path = super().__new__(cls, modified_path)
-            logger.warning(
-                f"Denied creation of absolute metadata path: {original_path}, "
-                f"created {modified_path} instead. This is considered an error "
-                f"in the calling code.")
-
-        return created_path
-
-    def __str__(self):
-        path_str = PurePosixPath.__str__(self)
-        return (
-            ""
-            if path_str == "."
-            else path_str)
-
-    def __len__(self):
-        return len(self.parts)
+            return cls.from_parts(original_path.parts)
+
+        modified_path = "/".join(original_path.parts[1:])
+        logger.warning(
+            f"Denied creation of absolute metadata path: {original_path}, "
+            f"created {modified_path} instead. This is considered an error "
+            f"in the calling code.")
+        return cls.from_parts(original_path.parts[1:])
+
+    @classmethod
+    def from_parts(cls, parts: Iterable[str]) -> "MetadataPath":
+        """
+        Create a metadata path from path elements without parsing them.
+        The elements must be non-empty and must not contain "/".
+        """
+        path = object.__new__(cls)
+        path._parts = tuple(parts)
+        path._str = None
+        return path
+
+    @property
+    def parts(self) -> Tuple[str, ...]:
+        return self._parts
+
+    @property
+    def name(self) -> str:
+        return self._parts[-1] if self._parts else ""
+
+    @property
+    def suffix(self) -> str:
+        return PurePosixPath(self.name).suffix if self._parts else ""
+
+    @property
+    def suffixes(self):
+        return PurePosixPath(self.name).suffixes if self._parts else []
+
+    @property
+    def stem(self) -> str:
+        return PurePosixPath(self.name).stem if self._parts else ""
+
+    @property
+    def parent(self) -> "MetadataPath":
+        if not self._parts:
+            return self
+        return MetadataPath.from_parts(self._parts[:-1])
+
+    @property
+    def parents(self) -> Tuple["MetadataPath", ...]:
+        return tuple(
+            MetadataPath.from_parts(self._parts[:length])
+            for length in range(len(self._parts) - 1, -1, -1))
+
+    drive = ""
+    root = ""
+    anchor = ""
+
+    def is_absolute(self) -> bool:
+        return False
+
+    def is_relative_to(self, *other) -> bool:
+        other_parts = MetadataPath(*other)._parts
+        return self._parts[:len(other_parts)] == other_parts
+
+    def relative_to(self, *other) -> "MetadataPath":
+        other_parts = MetadataPath(*other)._parts
+        if self._parts[:len(other_parts)] != other_parts:
+            raise ValueError(
+                f"{str(self)!r} is not in the subpath of "
+                f"{str(MetadataPath.from_parts(other_parts))!r}")
+        return MetadataPath.from_parts(self._parts[len(other_parts):])
+
+    def joinpath(self, *args) -> "MetadataPath":
+        return MetadataPath(self, *args)
+
+    def with_name(self, name: str) -> "MetadataPath":
+        return MetadataPath(PurePosixPath(str(self) or ".").with_name(name))
+
+    def with_suffix(self, suffix: str) -> "MetadataPath":
+        return MetadataPath(PurePosixPath(str(self) or ".").with_suffix(suffix))
+
+    def match(self, path_pattern: str) -> bool:
+        return PurePosixPath(str(self) or ".").match(path_pattern)
+
+    def as_posix(self) -> str:
+        return str(self) or "."
+
+    def __truediv__(self, other) -> "MetadataPath":
+        if isinstance(other, MetadataPath):
+            return MetadataPath.from_parts(self._parts + other._parts)
+        try:
+            return MetadataPath(self, other)
+        except TypeError:
+            return NotImplemented
+
+    def __rtruediv__(self, other) -> "MetadataPath":
+        try:
+            return MetadataPath(other, self)
+        except TypeError:
+            return NotImplemented
+
+    def __str__(self) -> str:
+        if self._str is None:
+            self._str = "/".join(self._parts)
+        return self._str
+
+    def __fspath__(self) -> str:
+        return str(self)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.as_posix()!r})"
+
+    def __reduce__(self):
+        return MetadataPath.from_parts, (self._parts,)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __len__(self) -> int:
+        return len(self._parts)
+
+    # Metadata paths are equal to pure posix paths with the same parts,
+    # and have the same hash. PurePosixPath hashes its parts before
+    # Python 3.12, and its string representation since Python 3.12.
+    if sys.version_info < (3, 12):
+        def __hash__(self) -> int:
+            return hash(self._parts)
+    else:
+        def __hash__(self) -> int:
+            return hash(self.as_posix())
+
+    def _other_parts(self, other) -> Optional[Tuple[str, ...]]:
+        if isinstance(other, MetadataPath):
+            return other._parts
+        if isinstance(other, PurePosixPath):
+            return other.parts
+        return None
+
+    def __eq__(self, other) -> bool:
+        other_parts = self._other_parts(other)
+        if other_parts is None:
+            return NotImplemented
+        return self._parts == other_parts
+
+    def __lt__(self, other) -> bool:
+        other_parts = self._other_parts(other)
+        if other_parts is None:
+            return NotImplemented
+        return self._parts < other_parts
+
+    def __le__(self, other) -> bool:
+        other_parts = self._other_parts(other)
+        if other_parts is None:
+            return NotImplemented
+        return self._parts <= other_parts
+
+    def __gt__(self, other) -> bool:
+        other_parts = self._other_parts(other)
+        if other_parts is None:
+            return NotImplemented
+        return self._parts > other_parts
+
+    def __ge__(self, other) -> bool:
+        other_parts = self._other_parts(other)
+        if other_parts is None:
+            return NotImplemented
+        return self._parts >= other_parts
@@ -1,13 +1,27 @@
+import weakref
 from abc import (
     ABCMeta,
     abstractmethod
 )
 from typing import (
+    Dict,
+    FrozenSet,
     Iterable,
+    List,
     Optional,
+    Set,
 )
 
 
+# Sets of destinations are immutable and shared by all objects that are
+# saved on the same destinations, a process uses only a few of them.
+_destination_sets: Dict[FrozenSet[str], FrozenSet[str]] = dict()
+
+
+def _get_destination_set(destinations: FrozenSet[str]) -> FrozenSet[str]:
+    return _destination_sets.setdefault(destinations, destinations)
+
+
 class ModifiableObject(metaclass=ABCMeta):
     """
     Modifiable objects track their modification status.
@@ -20,20 +34,37 @@ class ModifiableObject(metaclass=ABCMeta):
     Objects determine their modification-relevant
     sub-objects by implementing their version of the
     method "get_modifiable_sub_objects".
+
+    The saved-status of an object and its sub-objects is cached.
+    Sub-objects keep links to the objects that read their status, and
+    a modification of a sub-object invalidates the cached status of
+    all objects that contain it. Objects that add or remove sub-objects
+    have to call touch().
     """
+
+    __slots__ = ("saved_on", "_subtree_saved_on", "_parents", "__weakref__")
+
     def __init__(self, saved_on: Optional[str] = None):
-        self.saved_on = set()
-        if saved_on:
-            self.saved_on.add(saved_on)
+        self.saved_on: FrozenSet[str] = _get_destination_set(
+            frozenset((saved_on,) if saved_on else ()))
+
+        # Destinations on which the object and all its sub-objects are
+        # saved, None if the destinations have to be determined again.
+        self._subtree_saved_on: Optional[Set[str]] = None
+        self._parents: Optional[List[weakref.ref]] = None
 
     def touch(self):
         self.set_unsaved()
 
     def set_saved_on(self, destination: str):
-        self.saved_on.add(destination)
+        if destination not in self.saved_on:
+            self.saved_on = _get_destination_set(
+                self.saved_on | {destination})
+        self.invalidate_saved_status()
 
     def set_unsaved(self):
-        self.saved_on = set()
+        self.saved_on = _get_destination_set(frozenset())
+        self.invalidate_saved_status()
 
     def is_saved_on(self, destination: str) -> bool:
         """
@@ -42,12 +73,53 @@ class ModifiableObject(metaclass=ABCMeta):
         modifiable sub-objects are saved on the
         given destination.
         """
-        if destination not in self.saved_on:
-            return False
-        return all(
-            map(
-                lambda element: element.is_saved_on(destination),
-                self.modifiable_sub_objects))
+        return destination in self.get_subtree_saved_on()
+
+    def get_subtree_saved_on(self) -> Set[str]:
+        """
+        Return the destinations on which the object and all its
+        sub-objects are saved. Only sub-objects that were modified
+        since the last call are visited again.
+        """
+        if self._subtree_saved_on is None:
+            subtree_saved_on = set(self.saved_on)
+            for sub_object in self.modifiable_sub_objects:
+                # Nothing can be added to an empty intersection
+                if not subtree_saved_on:
+                    break
+                sub_object.add_parent(self)
+                subtree_saved_on &= sub_object.get_subtree_saved_on()
+            self._subtree_saved_on = subtree_saved_on
+        return self._subtree_saved_on
+
+    def add_parent(self, parent: "ModifiableObject"):
+        if self._parents is None:
+            self._parents = []
+        elif any(parent_ref() is parent for parent_ref in self._parents):
+            return
+        self._parents.append(weakref.ref(parent))
+
+    def invalidate_saved_status(self):
+        """
+        Invalidate the cached saved-status of the object and of all
+        objects that contain it.
+        """
+        # An object with an invalid status was not read by any
+        # container since it was invalidated, so the containers
+        # that depend on its status are already invalid.
+        if self._subtree_saved_on is None:
+            return
+
+        pending = [self]
+        while pending:
+            modifiable_object = pending.pop()
+            if modifiable_object._subtree_saved_on is None:
+                continue
+            modifiable_object._subtree_saved_on = None
+            for parent_ref in modifiable_object._parents or []:
+                parent = parent_ref()
+                if parent is not None:
+                    pending.append(parent)
 
     @abstractmethod
     def modifiable_sub_objects(self) -> Iterable["ModifiableObject"]:
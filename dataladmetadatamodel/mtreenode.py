@@ -1,6 +1,11 @@
+import weakref
+from collections.abc import MutableMapping
+from contextlib import contextmanager
 from typing import (
     Any,
+    Dict,
     Iterable,
+    Iterator,
     List,
     Optional,
     Tuple,
@@ -11,11 +16,148 @@ from dataladmetadatamodel.mappableobject import (
     MappableObject,
     ensure_mapped,
 )
+from dataladmetadatamodel.memorybudget import object_mapped
 from dataladmetadatamodel.metadatapath import MetadataPath
+from dataladmetadatamodel.mapper.mapper import lookup_not_supported
 from dataladmetadatamodel.mapper.reference import Reference
 
 
+class ChildNodes(MutableMapping):
+    """
+    The child nodes of a tree node by name.
+
+    Children that are read from a stored tree node are kept as stored
+    entries, i.e. as a flag that indicates a tree node and as a binary
+    object hash in packed byte strings. A stored entry is converted into
+    an unmapped mappable object when it is accessed. Stored entries are
+    not modified and are saved on the realm of the tree node.
+    """
+
+    __slots__ = (
+        "_children", "_owner", "_realm", "_tree_flags", "_hashes",
+        "_hash_width", "_stored_count")
+
+    def __init__(self, owner: Optional["MTreeNode"] = None):
+        # Values are indices into the stored entries, or mappable objects
+        self._children: Dict[str, Union[int, MappableObject]] = dict()
+        self._owner = weakref.ref(owner) if owner is not None else None
+        self._realm: Optional[str] = None
+        self._tree_flags = b""
+        self._hashes = b""
+        self._hash_width = 0
+        self._stored_count = 0
+
+    def __getitem__(self, name: str) -> MappableObject:
+        child = self._children[name]
+        if isinstance(child, int):
+            child = self._create_child(child)
+            self._children[name] = child
+            self._stored_count -= 1
+
+            # The cached saved-status of the owner does not depend on
+            # the new object yet.
+            owner = self._owner() if self._owner else None
+            if owner is not None:
+                owner.invalidate_saved_status()
+        return child
+
+    def __setitem__(self, name: str, child: MappableObject):
+        if isinstance(self._children.get(name, None), int):
+            self._stored_count -= 1
+        self._children[name] = child
+
+    def __delitem__(self, name: str):
+        if isinstance(self._children.pop(name), int):
+            self._stored_count -= 1
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._children)
+
+    def __len__(self) -> int:
+        return len(self._children)
+
+    def __contains__(self, name) -> bool:
+        return name in self._children
+
+    def __repr__(self):
+        return f"ChildNodes({list(self._children)!r})"
+
+    def set_stored(self,
+                   realm: str,
+                   entries: List[Tuple[str, bool, str]]):
+        """
+        Replace all children with the stored entries (name, is-tree,
+        object hash) of a tree node in realm.
+        """
+        self._realm = realm
+        self._children = {
+            name: index
+            for index, (name, _, _) in enumerate(entries)
+        }
+        self._tree_flags = bytes(is_tree for _, is_tree, _ in entries)
+        self._hashes = b"".join(
+            bytes.fromhex(object_hash)
+            for _, _, object_hash in entries)
+        self._hash_width = len(entries[0][2]) // 2 if entries else 0
+        self._stored_count = len(entries)
+        if len(self._hashes) != self._hash_width * len(entries):
+            raise ValueError("object hashes of different sizes in tree node")
+
+    @property
+    def stored_count(self) -> int:
+        """ The number of children that were not accessed """
+        return self._stored_count
+
+    def get_stored_entries(self,
+                           realm: str
+                           ) -> Optional[List[Tuple[str, bool, str]]]:
+        """
+        Return the stored entries (name, is-tree, object hash) of children
+        that were not accessed, or None if they are not stored in realm.
+        """
+        if self._stored_count and realm != self._realm:
+            return None
+        return [
+            (name, self._tree_flags[child] == 1, self._get_hash(child))
+            for name, child in self._children.items()
+            if isinstance(child, int)
+        ]
+
+    def accessed_items(self) -> Iterator[Tuple[str, MappableObject]]:
+        """ Return the children that are mappable objects """
+        return (
+            (name, child)
+            for name, child in self._children.items()
+            if not isinstance(child, int)
+        )
+
+    def _get_hash(self, index: int) -> str:
+        return self._hashes[
+            index * self._hash_width:(index + 1) * self._hash_width].hex()
+
+    def _create_child(self, index: int) -> MappableObject:
+        owner = self._owner()
+        object_hash = self._get_hash(index)
+        if self._tree_flags[index] == 1:
+            return MTreeNode(
+                leaf_class=owner.leaf_class,
+                realm=self._realm,
+                reference=Reference.intern("MTreeNode", object_hash))
+        return owner.leaf_class.get_empty_instance(
+            realm=self._realm,
+            reference=Reference.intern(owner.leaf_class_name, object_hash))
+
+
 class MTreeNode(MappableObject):
+
+    __slots__ = ("leaf_class", "leaf_class_name", "child_nodes")
+
+    # Estimated memory size of a child entry in bytes
+    child_size = 256
+
+    # Estimated memory size of a child entry that was not accessed
+    stored_child_size = 96
+
     def __init__(self,
                  leaf_class: Any,
                  realm: Optional[str] = None,
@@ -26,7 +168,7 @@ class MTreeNode(MappableObject):
         super().__init__(realm, reference)
         self.leaf_class = leaf_class
         self.leaf_class_name = leaf_class.__name__
-        self.child_nodes = dict()
+        self.child_nodes = ChildNodes(self)
 
     def __contains__(self, path: MetadataPath) -> bool:
         return self.get_child(path) is not None
@@ -35,12 +177,21 @@ class MTreeNode(MappableObject):
         return f"<{type(self).__name__}: children: {self.child_nodes.keys()}>"
 
     def modifiable_sub_objects_impl(self) -> Iterable["MappableObject"]:
-        yield from self.child_nodes.values()
+        # Children that were not accessed are not modified
+        for _, child_node in self.child_nodes.accessed_items():
+            yield child_node
 
     def purge_impl(self):
-        for child_node in self.child_nodes.values():
+        for _, child_node in self.child_nodes.accessed_items():
             child_node.purge()
-        self.child_nodes = dict()
+        self.child_nodes = ChildNodes(self)
+
+    def estimated_size(self) -> int:
+        stored_count = self.child_nodes.stored_count
+        return (
+            self.base_size
+            + self.child_size * (len(self.child_nodes) - stored_count)
+            + self.stored_child_size * stored_count)
 
     def deepcopy_impl(self,
                       new_mapper_family: Optional[str] = None,
@@ -83,26 +234,26 @@ class MTreeNode(MappableObject):
     def _add_children(self,
                       children: List[Tuple[str, MappableObject]]):
 
+        self.ensure_mapped()
+
         # Assert that no name is "." or contains a "/", and
         # assert that there are no duplicated names in the input
-        assert all(map(lambda nn: nn[0] != ".", children))
-        assert all(map(lambda nn: nn[0].find("/") < 0, children))
-        assert len(set(map(lambda nn: nn[0], children))) == len(children)
-
-        new_names = set(map(lambda nn: nn[0], children))
+        new_names = set()
+        duplicated_names = []
+        for name, _ in children:
+            assert name != "." and "/" not in name
+            assert name not in new_names
+            new_names.add(name)
+            if name in self.child_nodes:
+                duplicated_names.append(name)
 
-        self.ensure_mapped()
-        duplicated_names = set(self.child_nodes.keys()) & new_names
         if duplicated_names:
             raise ValueError(
                 "Child node with the following name(s) already exist(s): "
                 + ", ".join(duplicated_names))
 
         self.touch()
-        self.child_nodes = {
-            **self.child_nodes,
-            **dict(children)
-        }
+        self.child_nodes.update(children)
 
     def add_child_at(self,
                      child: MappableObject,
@@ -138,8 +289,53 @@ class MTreeNode(MappableObject):
 
             existing_child.add_child_at(
                 child,
-                MetadataPath(
-                    "/".join(path.parts[1:])))
+                MetadataPath.from_parts(path.parts[1:]))
+
+    def add_children_at(self,
+                        children: Iterable[Tuple[MetadataPath, MappableObject]]):
+        """
+        Add multiple children at their paths. The paths are grouped by
+        their elements, and every tree node on the paths is visited once.
+        Missing intermediate nodes are created.
+        """
+        self._add_children_at(
+            [(path.parts, child) for path, child in children],
+            0)
+
+    def _add_children_at(self,
+                         children: List[Tuple[Tuple[str, ...], MappableObject]],
+                         depth: int):
+
+        leaf_children = []
+        sub_tree_children: Dict[str, List] = dict()
+        for parts, child in children:
+            assert len(parts) > depth, "child name required"
+            if len(parts) == depth + 1:
+                leaf_children.append((parts[depth], child))
+            else:
+                sub_tree_children.setdefault(parts[depth], []).append(
+                    (parts, child))
+
+        new_sub_trees = []
+        existing_sub_trees = []
+        for name, sub_children in sub_tree_children.items():
+            existing_child = self.get_child(name)
+            if existing_child is None:
+                new_sub_tree = MTreeNode(self.leaf_class)
+                new_sub_trees.append((name, new_sub_tree))
+                new_sub_tree._add_children_at(sub_children, depth + 1)
+            elif isinstance(existing_child, MTreeNode):
+                existing_sub_trees.append((existing_child, sub_children))
+            else:
+                raise ValueError(
+                    f"non tree-node named {name} exists: "
+                    f"{existing_child}, cannot be converted to a "
+                    f"tree-node")
+
+        if new_sub_trees or leaf_children:
+            self._add_children(new_sub_trees + leaf_children)
+        for existing_child, sub_children in existing_sub_trees:
+            existing_child._add_children_at(sub_children, depth + 1)
 
     def remove_child(self,
                      child_name: str):
@@ -151,40 +347,160 @@ class MTreeNode(MappableObject):
     def remove_child_at(self,
                         path: MetadataPath):
 
-        containing_path = MetadataPath("/".join(path.parts[:-1]))
+        containing_path = path.parent
         containing_node = self.get_object_at_path(containing_path)
         containing_node.remove_child(path.parts[-1])
 
     def get_object_at_path(self,
-                           path: Optional[MetadataPath] = None
+                           path: Optional[MetadataPath] = None,
+                           direct_lookup: bool = False
                            ) -> Optional["MTreeNode"]:
+        """
+        Return the object at path, or None if there is no such object.
+
+        If direct_lookup is True, the remaining path below an unmapped
+        node is resolved by the backend, without mapping in the
+        intermediate nodes. The returned object is then not connected
+        to this tree, i.e. modifications of it will not be written out
+        with the tree.
+        """
 
         # Linear search for prefix_path
         path = path or MetadataPath("")
         current_node = self
-        for element in path.parts:
+        for index, element in enumerate(path.parts):
             if not isinstance(current_node, MTreeNode):
                 return None
+            if direct_lookup \
+                    and current_node.mapped is False \
+                    and current_node.needs_map_in():
+                result = current_node._get_unmapped_object_at_path(
+                    MetadataPath.from_parts(path.parts[index:]))
+                if result is not lookup_not_supported:
+                    return result
             current_node = current_node.get_child(element)
             if current_node is None:
                 return None
         return current_node
 
+    def _get_unmapped_object_at_path(self,
+                                     path: MetadataPath,
+                                     backend_type: str = "git"
+                                     ) -> Optional[MappableObject]:
+        """
+        Look up path in the stored tree, return lookup_not_supported if
+        the backend cannot look up paths.
+        """
+        from dataladmetadatamodel.mapper import get_mapper
+
+        return get_mapper(type(self).__name__, backend_type).map_in_object_at_path(
+            self,
+            self.realm,
+            self.reference,
+            path)
+
     def get_paths_recursive(self,
                             show_intermediate: Optional[bool] = False
                             ) -> Iterable[Tuple[MetadataPath, "MappableObject"]]:
 
+        # The stored trees of all unmapped sub-trees of mapped nodes are
+        # read together, and the tree nodes are mapped in from them,
+        # instead of being read one by one.
+        stored_trees = self._read_stored_trees_many(self._get_unmapped_nodes())
+        yield from self._get_paths_recursive(
+            (),
+            show_intermediate,
+            stored_trees)
+
+    def _get_paths_recursive(self,
+                             prefix: Tuple[str, ...],
+                             show_intermediate: Optional[bool],
+                             stored_trees: Dict[str, List[Tuple[str, bool, str]]]
+                             ) -> Iterable[Tuple[MetadataPath, "MappableObject"]]:
+
+        # The path elements of the nodes above are passed down, so that
+        # every path is created once, instead of being joined on every
+        # level of the tree.
         if show_intermediate:
-            yield MetadataPath(""), self
+            yield MetadataPath.from_parts(prefix), self
 
-        with ensure_mapped(self):
+        with self._ensure_mapped_from(stored_trees):
             for child_name, child_node in self.child_nodes.items():
                 if not isinstance(child_node, MTreeNode):
-                    yield MetadataPath(child_name), child_node
+                    yield (
+                        MetadataPath.from_parts(prefix + (child_name,)),
+                        child_node)
                 else:
-                    for sub_path, tree_node in child_node.get_paths_recursive(
-                            show_intermediate):
-                        yield MetadataPath(child_name) / sub_path, tree_node
+                    yield from child_node._get_paths_recursive(
+                        prefix + (child_name,),
+                        show_intermediate,
+                        stored_trees)
+
+    @contextmanager
+    def _ensure_mapped_from(self,
+                            stored_trees: Dict[str, List[Tuple[str, bool, str]]]):
+        """
+        Like ensure_mapped, but map in the node from its stored tree
+        entries, if they were read already.
+        """
+        entries = (
+            stored_trees.get(self.reference.location, None)
+            if self.mapped is False
+            else None)
+        if entries is None or not self.needs_map_in():
+            with ensure_mapped(self):
+                yield self
+            return
+
+        self.child_nodes = ChildNodes(self)
+        self.child_nodes.set_stored(self.realm, entries)
+        self.mapped = True
+        self.invalidate_saved_status()
+        object_mapped(self)
+        try:
+            yield self
+        finally:
+            self.purge()
+
+    def _get_unmapped_nodes(self) -> List["MTreeNode"]:
+        """ Return the unmapped tree nodes that are reached from mapped nodes """
+        unmapped_nodes = []
+        pending = [self]
+        while pending:
+            mtree_node = pending.pop()
+            if mtree_node.mapped is False:
+                if mtree_node.needs_map_in():
+                    unmapped_nodes.append(mtree_node)
+                continue
+            pending.extend(
+                child_node
+                for child_node in mtree_node.child_nodes.values()
+                if isinstance(child_node, MTreeNode))
+        return unmapped_nodes
+
+    @staticmethod
+    def _read_stored_trees_many(mtree_nodes: List["MTreeNode"],
+                                backend_type: str = "git"
+                                ) -> Dict[str, List[Tuple[str, bool, str]]]:
+        """
+        Read the stored trees of the unmapped tree nodes and of all their
+        sub-trees with one request per realm. Return the stored entries
+        (name, is-tree, object hash) by tree location. Trees that cannot
+        be read by the backend are not included.
+        """
+        from dataladmetadatamodel.mapper import get_mapper
+
+        nodes_by_realm: Dict[str, List[MTreeNode]] = dict()
+        for mtree_node in mtree_nodes:
+            nodes_by_realm.setdefault(mtree_node.realm, []).append(mtree_node)
+
+        stored_trees = dict()
+        for realm, realm_nodes in nodes_by_realm.items():
+            realm_trees = get_mapper("MTreeNode", backend_type).read_stored_trees_many(
+                realm_nodes,
+                realm)
+            stored_trees.update(realm_trees or {})
+        return stored_trees
 
     @staticmethod
     def is_root_path(path: MetadataPath) -> bool:
@@ -3,11 +3,14 @@ from typing import (
     Any,
     Iterable,
     Optional,
+    Set,
     Tuple
 )
 
 from dataladmetadatamodel.mappableobject import MappableObject
-from dataladmetadatamodel.mapper.gitmapper.metadatamapper import MetadataGitMapper
+from dataladmetadatamodel.mapper.gitmapper.metadatamapper import (
+    add_instance_set_tree_reference,
+)
 from dataladmetadatamodel.mapper.gitmapper.objectreference import (
     add_tree_reference,
     GitReference,
@@ -62,26 +65,14 @@ class MTreeProxy:
                   backend_type: str = "git",
                   force_write: bool = False) -> Reference:
 
-        # Since a file tree might contain a large number
-        # of metadata entries and since each entry requires
-        # two blobs to be written, we use a write-cache.
-
-        # TODO: ugly:
-        from .filetree import FileTree
-
-        cache_destination = destination or self.mtree.realm
-        if isinstance(self, FileTree):
-            MetadataGitMapper.cache_realm(cache_destination)
-
         reference = self.mtree.write_out(destination,
                                          backend_type,
                                          force_write)
 
-        if isinstance(self, FileTree):
-            MetadataGitMapper.flush_realm(cache_destination)
-
         if not reference.is_none_reference():
-            add_tree_reference(reference.location)
+            realm = destination or self.mtree.realm
+            add_tree_reference(reference.location, realm)
+            add_instance_set_tree_reference(realm)
         return reference
 
     def purge(self):
@@ -90,6 +81,12 @@ class MTreeProxy:
     def is_saved_on(self, destination: str):
         return self.mtree.is_saved_on(destination)
 
+    def get_subtree_saved_on(self) -> Set[str]:
+        return self.mtree.get_subtree_saved_on()
+
+    def add_parent(self, parent: "ModifiableObject"):
+        self.mtree.add_parent(parent)
+
     def deepcopy(self,
                  new_mapper_family: Optional[str] = None,
                  new_destination: Optional[str] = None,
@@ -82,15 +82,15 @@ class TestReferenceCreation(unittest.TestCase):
                 patch("dataladmetadatamodel.mapper.gitmapper."
                       "metadatarootrecordmapper.git_save_json") as save_json, \
                 patch("dataladmetadatamodel.mapper.gitmapper."
-                      "gitblobcache.git_save_file_list") as file_list_save, \
+                      "gitblobcache.git_save_blobs") as blobs_save, \
                 patch("dataladmetadatamodel.mtreeproxy."
                       "add_tree_reference") as add_tree_ref:
 
             save_str.return_value = get_location(1)
             save_tree_node.return_value = get_location(2)
             save_json.return_value = get_location(3)
-            file_list_save.side_effect = lambda r, l: [
-                hash_blob(open(e, "rb").read())
+            blobs_save.side_effect = lambda r, l: [
+                hash_blob(e)
                 for e in l
             ]
 
@@ -49,6 +49,30 @@ class TestFileTree(unittest.TestCase):
                 for entry in returned_entries]:
             self.assertEqual(returned_metadata, Metadata())
 
+    def test_add_metadata_many(self):
+
+        file_tree = FileTree()
+        file_tree.add_metadata(MetadataPath("a/y"), Metadata())
+        file_tree.add_metadata_many(
+            (path, Metadata())
+            for path in default_paths)
+
+        returned_paths = [
+            path
+            for path, _ in file_tree.get_paths_recursive()]
+        self.assertEqual(
+            sorted(default_paths + [MetadataPath("a/y")]),
+            sorted(returned_paths))
+
+        self.assertRaises(
+            ValueError,
+            file_tree.add_metadata_many,
+            [(MetadataPath("a/b/c/d"), Metadata())])
+        self.assertRaises(
+            ValueError,
+            file_tree.add_metadata_many,
+            [(MetadataPath("a/x"), Metadata())])
+
     def test_add_extractor_run(self):
 
         file_tree = create_file_tree_with_metadata(default_paths, [
@@ -110,15 +134,15 @@ class TestReferenceCreation(unittest.TestCase):
                 patch("dataladmetadatamodel.mapper.gitmapper."
                       "metadatarootrecordmapper.git_save_json") as save_json, \
                 patch("dataladmetadatamodel.mapper.gitmapper."
-                      "gitblobcache.git_save_file_list") as file_list_save, \
+                      "gitblobcache.git_save_blobs") as blobs_save, \
                 patch("dataladmetadatamodel.mtreeproxy."
                       "add_tree_reference") as add_tree_ref:
 
             save_str.return_value = get_location(1)
             save_tree_node.return_value = get_location(2)
             save_json.return_value = get_location(3)
-            file_list_save.side_effect = lambda r, l: [
-                hash_blob(open(e, "rb").read())
+            blobs_save.side_effect = lambda r, l: [
+                hash_blob(e)
                 for e in l
             ]
 
@@ -1,10 +1,12 @@
+import copy
 import unittest
 from typing import Tuple
 
 from dataladmetadatamodel.metadata import (
     ExtractorConfiguration,
     MetadataInstance,
-    MetadataInstanceSet
+    MetadataInstanceSet,
+    ParameterDict,
 )
 
 
@@ -107,6 +109,91 @@ class TestUniqueness(TestInstanceSetBase):
         self.assertIn(self.get_configuration("default"), configuration_list)
         self.assertIn(self.get_configuration("new"), configuration_list)
 
+    def test_unhashable_configuration(self):
+        configuration = ExtractorConfiguration("1.0", {"list": [1, 2]})
+        instance = MetadataInstance(
+            1.0, "name", "email", configuration, {"a": "b"})
+        self.metadata_instance_set.add_metadata_instance(instance)
+        self.metadata_instance_set.add_metadata_instance(instance)
+
+        self.assertEqual(2, len(self.metadata_instance_set.configurations))
+        self.assertEqual(
+            instance,
+            self.metadata_instance_set.get_instance_for_configuration(
+                ExtractorConfiguration("1.0", {"list": [1, 2]})))
+        self.assertRaises(
+            ValueError,
+            self.metadata_instance_set.get_instance_for_configuration,
+            ExtractorConfiguration("1.0", {"list": [1, 3]}))
+
+
+class TestConfigurationSharing(TestInstanceSetBase):
+
+    def test_parameter_hash(self):
+        parameter = ParameterDict({"a": "1"})
+        hash_value = hash(parameter)
+        self.assertEqual(hash_value, hash(ParameterDict({"a": "1"})))
+
+        parameter["b"] = "2"
+        self.assertEqual(hash(parameter), hash(ParameterDict(a="1", b="2")))
+        parameter.update(c="3")
+        self.assertEqual(
+            hash(parameter),
+            hash(ParameterDict(a="1", b="2", c="3")))
+        del parameter["b"]
+        parameter.pop("c")
+        self.assertEqual(hash(parameter), hash_value)
+
+    def test_interned_configurations(self):
+        json_obj = self.metadata_instance_set.to_json_obj()
+        instance_sets = [
+            MetadataInstanceSet.from_json_obj(json_obj)
+            for _ in range(3)
+        ]
+        configuration = instance_sets[0].configurations[0]
+        for instance_set in instance_sets:
+            self.assertIs(configuration, instance_set.configurations[0])
+            self.assertIs(
+                configuration,
+                instance_set.get_instance_for_configuration_index(
+                    0).configuration)
+        self.assertEqual(configuration, self.get_configuration("default"))
+
+        # Configurations with unhashable parameters are not shared
+        json_obj = ExtractorConfiguration("1.0", {"l": [1]}).to_json_obj()
+        self.assertIsNot(
+            ExtractorConfiguration.from_json_obj(json_obj),
+            ExtractorConfiguration.from_json_obj(json_obj))
+
+    def test_frozen_configurations(self):
+        configuration = ExtractorConfiguration("1.0", {"a": "1"})
+        instance = MetadataInstance(
+            1.0, "name", "name@example.com", configuration, {})
+        self.metadata_instance_set.add_metadata_instance(instance)
+
+        # The instance set indexes a frozen copy of the configuration
+        shared_configuration = self.metadata_instance_set.configurations[-1]
+        self.assertIsNot(shared_configuration, configuration)
+        configuration.parameter["a"] = "2"
+
+        with self.assertRaises(RuntimeError):
+            shared_configuration.parameter["a"] = "2"
+        with self.assertRaises(RuntimeError):
+            shared_configuration.parameter.update(b="3")
+        with self.assertRaises(RuntimeError):
+            shared_configuration.version = "2.0"
+        self.assertEqual(shared_configuration.parameter, {"a": "1"})
+        self.assertIs(
+            self.metadata_instance_set.get_instance_for_configuration(
+                ExtractorConfiguration("1.0", {"a": "1"})),
+            instance)
+
+        # Copies of shared configurations can be modified
+        json_obj = shared_configuration.to_json_obj()
+        json_obj["parameter"]["a"] = "3"
+        parameter = copy.deepcopy(shared_configuration.parameter)
+        parameter["a"] = "3"
+
 
 if __name__ == '__main__':
     unittest.main()
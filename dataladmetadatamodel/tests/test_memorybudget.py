@@ -0,0 +1,91 @@
+import subprocess
+from unittest import mock
+
+from dataladmetadatamodel import memorybudget
+from dataladmetadatamodel.memorybudget import (
+    get_resident_size,
+    memory_budget,
+    set_memory_budget,
+)
+from dataladmetadatamodel.metadatapath import MetadataPath
+from dataladmetadatamodel.mtreenode import MTreeNode
+from dataladmetadatamodel.text import Text
+
+
+paths = [
+    f"{first_part}/{second_part}"
+    for first_part in range(10)
+    for second_part in range(10)
+]
+
+
+def _write_tree(realm: str) -> MTreeNode:
+    subprocess.run(["git", "init", realm], check=True)
+    mtree = MTreeNode(leaf_class=Text)
+    for path in paths:
+        mtree.add_child_at(
+            Text(content=f"content of: {path}"),
+            MetadataPath(path))
+    reference = mtree.write_out(realm)
+    return MTreeNode(leaf_class=Text, realm=realm, reference=reference)
+
+
+def _read_contents(mtree: MTreeNode):
+    for path in paths:
+        text = mtree.get_object_at_path(MetadataPath(path))
+        text.ensure_mapped()
+        assert text.content == f"content of: {path}"
+
+
+def _mapped_objects(mappable_object) -> int:
+    # Count without accessing, i.e. without refreshing, the objects
+    if not mappable_object.mapped:
+        return 0
+    child_nodes = getattr(mappable_object, "child_nodes", {})
+    return 1 + sum(map(_mapped_objects, child_nodes.values()))
+
+
+def test_budget_limits_mapped_objects(tmp_path):
+    mtree = _write_tree(str(tmp_path))
+    max_size = 20 * MTreeNode.base_size
+
+    with mock.patch.object(memorybudget, "protected_objects", 2), \
+            memory_budget(max_size, str(tmp_path)):
+
+        _read_contents(mtree)
+        assert 0 < get_resident_size(str(tmp_path)) <= max_size
+        assert _mapped_objects(mtree) < 10
+
+        # Purged objects are mapped in again on access
+        _read_contents(mtree)
+
+    assert get_resident_size(str(tmp_path)) == 0
+    _read_contents(mtree)
+    assert _mapped_objects(mtree) == 1 + 10 + len(paths)
+
+
+def test_modified_objects_are_kept(tmp_path):
+    mtree = _write_tree(str(tmp_path))
+
+    previous_budget = set_memory_budget(0)
+    try:
+        with mock.patch.object(memorybudget, "protected_objects", 0):
+            mtree.get_object_at_path(MetadataPath("0")).add_child(
+                "new",
+                Text(content="new"))
+            _read_contents(mtree)
+
+            assert mtree.mapped is True
+            new_text = mtree.get_object_at_path(MetadataPath("0/new"))
+            assert new_text.content == "new"
+            mtree.write_out()
+
+            # Saved objects are purged, except for the last accessed
+            # object and its ancestors.
+            _read_contents(mtree)
+            assert _mapped_objects(mtree) == 3
+    finally:
+        set_memory_budget(previous_budget)
+
+    assert mtree.get_object_at_path(MetadataPath("0/new")).read_in().content \
+        == "new"
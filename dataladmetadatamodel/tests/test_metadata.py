@@ -0,0 +1,75 @@
+import json
+from unittest import mock
+
+from dataladmetadatamodel.metadata import (
+    ExtractorConfiguration,
+    Metadata,
+    MetadataInstanceSet,
+)
+
+
+def _create_metadata() -> Metadata:
+    metadata = Metadata()
+    for index in range(3):
+        metadata.add_extractor_run(
+            1.2 + index,
+            f"extractor_{index}",
+            "test-tool",
+            "test-tool@test.com",
+            ExtractorConfiguration("v3.4", {"p1": str(index)}),
+            {"key1": "this is metadata", "index": index})
+    return metadata
+
+
+def test_lazy_instance_sets():
+    json_str = _create_metadata().to_json()
+
+    with mock.patch.object(
+            MetadataInstanceSet,
+            "from_json_obj",
+            wraps=MetadataInstanceSet.from_json_obj) as from_json_obj:
+
+        metadata = Metadata.from_json(json_str)
+        assert list(metadata.extractors) == [
+            "extractor_0", "extractor_1", "extractor_2"]
+        assert metadata.estimated_size() == \
+            metadata.base_size + 3 * metadata.instance_size
+        from_json_obj.assert_not_called()
+
+        instance_set = metadata.extractor_runs_for_extractor("extractor_1")
+        assert from_json_obj.call_count == 1
+        assert metadata.instance_sets.is_decoded("extractor_1")
+        assert not metadata.instance_sets.is_decoded("extractor_0")
+        assert instance_set is metadata.extractor_runs_for_extractor(
+            "extractor_1")
+        assert from_json_obj.call_count == 1
+
+        assert dict(metadata.extractor_runs) == \
+            dict(_create_metadata().extractor_runs)
+        assert from_json_obj.call_count == 3
+
+
+def test_untouched_instance_sets():
+    json_str = _create_metadata().to_json()
+    metadata = Metadata.from_json(json_str)
+    metadata.extractor_runs_for_extractor("extractor_0")
+
+    with mock.patch.object(
+            MetadataInstanceSet,
+            "to_json_obj",
+            autospec=True,
+            side_effect=MetadataInstanceSet.to_json_obj) as to_json_obj:
+
+        assert json.loads(metadata.to_json()) == json.loads(json_str)
+        assert to_json_obj.call_count == 1
+
+
+def test_version_2_instance_sets():
+    json_obj = _create_metadata().to_json_obj()
+    json_obj["@"]["version"] = "2.0"
+    for instance_set in json_obj["instance_sets"].values():
+        instance_set["@"]["version"] = "2.0"
+
+    metadata = Metadata.from_json(json.dumps(json_obj))
+    assert metadata.to_json_obj() == _create_metadata().to_json_obj()
+    assert metadata == _create_metadata()
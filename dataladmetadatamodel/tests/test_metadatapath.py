@@ -1,6 +1,9 @@
+import copy
+import pickle
 import unittest
 from unittest.mock import patch
 from pathlib import (
+    Path,
     PurePosixPath,
     PureWindowsPath
 )
@@ -50,6 +53,54 @@ class TestMetadataPath(unittest.TestCase):
             metadata_path = MetadataPath("a/b/c")
         self.assertEqual(metadata_path, MetadataPath("a/b/c"))
 
+    def test_path_interface(self):
+        path = MetadataPath("a/b/c.txt")
+        self.assertEqual(path.parts, ("a", "b", "c.txt"))
+        self.assertEqual(path.name, "c.txt")
+        self.assertEqual(path.suffix, ".txt")
+        self.assertEqual(path.stem, "c")
+        self.assertEqual(path.parent, MetadataPath("a/b"))
+        self.assertEqual(path.parents[-1], MetadataPath(""))
+        self.assertEqual(path.relative_to("a"), MetadataPath("b/c.txt"))
+        self.assertRaises(ValueError, path.relative_to, MetadataPath("b"))
+        self.assertEqual(path.with_name("d"), MetadataPath("a/b/d"))
+        self.assertEqual(path, PurePosixPath("a/b/c.txt"))
+        self.assertEqual(len(path), 3)
+        self.assertEqual(str(MetadataPath("")), "")
+        self.assertEqual(MetadataPath("").as_posix(), ".")
+        self.assertEqual(MetadataPath("").parent, MetadataPath(""))
+
+    def test_join(self):
+        path = MetadataPath("a") / "b/c" / MetadataPath("d")
+        self.assertEqual(path, MetadataPath("a/b/c/d"))
+        self.assertEqual("x" / MetadataPath("a"), MetadataPath("x/a"))
+        self.assertEqual(Path("/x") / MetadataPath("a/b"), Path("/x/a/b"))
+        self.assertEqual(
+            MetadataPath.from_parts(("a", "b")) / MetadataPath(""),
+            MetadataPath("a/b"))
+
+    def test_hash_and_order(self):
+        paths = [MetadataPath("b"), MetadataPath("a/b"), MetadataPath("a")]
+        self.assertEqual(
+            sorted(paths),
+            [MetadataPath("a"), MetadataPath("a/b"), MetadataPath("b")])
+        self.assertEqual(
+            {MetadataPath("a") / "b": 1}[MetadataPath.from_parts(["a", "b"])],
+            1)
+        for path_str in ("", "a", "a/b/c.txt"):
+            self.assertEqual(MetadataPath(path_str), PurePosixPath(path_str))
+            self.assertEqual(
+                hash(MetadataPath(path_str)),
+                hash(PurePosixPath(path_str)))
+        self.assertEqual(
+            {PurePosixPath("a/b"): 1}[MetadataPath("a/b")],
+            1)
+
+    def test_copy_and_pickle(self):
+        path = MetadataPath("a/b")
+        self.assertIs(copy.deepcopy(path), path)
+        self.assertEqual(pickle.loads(pickle.dumps(path)), path)
+
 
 if __name__ == '__main__':
     unittest.main()
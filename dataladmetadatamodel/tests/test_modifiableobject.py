@@ -23,6 +23,27 @@ class SUTModifiableObject(ModifiableObject):
         return []
 
 
+class Bag(ModifiableObject):
+    def __init__(self, _sub_objects: List[ModifiableObject]):
+        super().__init__()
+        self.sub_objects = _sub_objects
+        self.visits = 0
+
+    @property
+    def modifiable_sub_objects(self) -> Iterable[ModifiableObject]:
+        self.visits += 1
+        return self.sub_objects
+
+
+def _create_chain(length: int) -> List[Bag]:
+    chain = [Bag([SUTModifiableObject(destination)])]
+    for _ in range(length - 1):
+        chain.insert(0, Bag([chain[0]]))
+    for bag in chain:
+        bag.set_saved_on(destination)
+    return chain
+
+
 class TestModifiableObject(unittest.TestCase):
 
     def test_new_clean(self):
@@ -55,6 +76,58 @@ class TestModifiableObject(unittest.TestCase):
         sub_objects[0].touch()
         self.assertFalse(bag.is_saved_on(destination), f"Expected modified bag is not saved on {destination}")
 
+    def test_cached_saved_status(self):
+        chain = _create_chain(10)
+        self.assertTrue(chain[0].is_saved_on(destination))
+        self.assertEqual([bag.visits for bag in chain], [1] * 10)
+
+        # The cached status is used
+        for bag in chain:
+            self.assertTrue(bag.is_saved_on(destination))
+        self.assertEqual([bag.visits for bag in chain], [1] * 10)
+
+        # Modifications are propagated to all containers
+        chain[-1].sub_objects[0].touch()
+        self.assertFalse(chain[0].is_saved_on(destination))
+        self.assertFalse(chain[5].is_saved_on(destination))
+        self.assertEqual([bag.visits for bag in chain], [2] * 10)
+
+        chain[-1].sub_objects[0].set_saved_on(destination)
+        self.assertTrue(chain[0].is_saved_on(destination))
+        self.assertFalse(chain[0].is_saved_on("/tmp/other"))
+
+    def test_shared_sub_object(self):
+        shared = SUTModifiableObject(destination)
+        bags = [Bag([shared]), Bag([shared])]
+        for bag in bags:
+            bag.set_saved_on(destination)
+            self.assertTrue(bag.is_saved_on(destination))
+
+        shared.touch()
+        for bag in bags:
+            self.assertFalse(bag.is_saved_on(destination))
+
+    def test_shared_destination_sets(self):
+        objects = [SUTModifiableObject(destination) for _ in range(3)]
+        self.assertIs(objects[0].saved_on, objects[1].saved_on)
+
+        objects[2].set_saved_on("/tmp/other")
+        self.assertEqual(objects[2].saved_on, {destination, "/tmp/other"})
+        self.assertEqual(objects[1].saved_on, {destination})
+        objects[1].set_unsaved()
+        self.assertEqual(objects[0].saved_on, {destination})
+
+    def test_added_sub_object(self):
+        bag = Bag([])
+        bag.set_saved_on(destination)
+        self.assertTrue(bag.is_saved_on(destination))
+
+        # Containers touch themselves when sub-objects are added
+        bag.sub_objects.append(SUTModifiableObject())
+        bag.touch()
+        bag.set_saved_on(destination)
+        self.assertFalse(bag.is_saved_on(destination))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -2,7 +2,13 @@ import subprocess
 import tempfile
 import time
 import unittest
+from unittest import mock
 
+from dataladmetadatamodel.mapper.gitmapper import mtreenodemapper
+from dataladmetadatamodel.mapper.gitmapper.gitbackend.subprocess import (
+    set_object_reader,
+)
+from dataladmetadatamodel.mapper.mapper import Mapper
 from dataladmetadatamodel.metadatapath import MetadataPath
 from dataladmetadatamodel.mtreenode import MTreeNode
 from dataladmetadatamodel.text import Text
@@ -39,6 +45,32 @@ class TestMTreeNode(unittest.TestCase):
             self.assertIsInstance(child, Text)
             self.assertEqual(child.content, f"content of: {str(path)}")
 
+    def test_add_children_at(self):
+        mtree_node = MTreeNode(Text)
+        mtree_node.add_child_at(Text("existing"), MetadataPath("a/existing"))
+        mtree_node.add_children_at(
+            (MetadataPath(path), Text(f"content of: {path}"))
+            for path in default_paths)
+
+        self.assertEqual(
+            {
+                str(path): child.content
+                for path, child in mtree_node.get_paths_recursive()
+            },
+            {
+                "a/existing": "existing",
+                **{
+                    path: f"content of: {path}"
+                    for path in default_paths
+                }
+            })
+
+        for path in ("a/0", "a/0/x", "a"):
+            self.assertRaises(
+                ValueError,
+                mtree_node.add_children_at,
+                [(MetadataPath(path), Text("x"))])
+
     def test_get_paths_recursive(self):
         mtree_node = MTreeNode(Text)
 
@@ -116,6 +148,273 @@ class TestMTreeNodeMapping(unittest.TestCase):
             write_out_2nd_duration = time.time() - start_time
             print(f"Written out single entry: {write_out_2nd_duration:4f}")
 
+    def test_listed_traversal(self):
+        with tempfile.TemporaryDirectory() as metadata_store:
+
+            subprocess.run(["git", "init", metadata_store])
+
+            mtree = MTreeNode(leaf_class=Text)
+            paths = default_paths + [
+                f"{first_part}/{second_part}/{third_part}"
+                for first_part in range(5)
+                for second_part in range(5)
+                for third_part in range(3)
+            ]
+            for path in paths:
+                mtree.add_child_at(
+                    Text(content=f"content of: {path}"),
+                    MetadataPath(path))
+            expected = sorted(
+                (str(path), type(node).__name__)
+                for path, node in mtree.get_paths_recursive(True))
+            reference = mtree.write_out(metadata_store)
+
+            listings = []
+            for reader in ("subprocess", "native"):
+                mtree = MTreeNode(leaf_class=Text,
+                                  realm=metadata_store,
+                                  reference=reference)
+
+                previous_reader = set_object_reader(reader)
+                try:
+                    with mock.patch.object(
+                            mtreenodemapper,
+                            "git_read_tree_node",
+                            wraps=mtreenodemapper.git_read_tree_node
+                    ) as read_tree_node:
+                        results = list(mtree.get_paths_recursive(True))
+                finally:
+                    set_object_reader(previous_reader)
+
+                # The unmapped tree is listed without mapping in nodes
+                listing = [
+                    (str(path), type(node).__name__)
+                    for path, node in results]
+                self.assertEqual(sorted(listing), expected)
+                self.assertEqual(read_tree_node.call_count, 0)
+                listings.append(listing)
+                self.assertFalse(mtree.mapped)
+                self.assertTrue(all(
+                    node.mapped is False and node.reference is not None
+                    for _, node in results[1:]))
+                self.assertEqual(
+                    results[-1][1].read_in().content,
+                    f"content of: {results[-1][0]}")
+
+            self.assertEqual(listings[0], listings[1])
+
+            # Modifications of mapped nodes are merged with
+            # the listings of unmapped sub-trees.
+            mtree.get_child("a").add_child_at(
+                Text(content="new"),
+                MetadataPath("b/new"))
+            mtree.remove_child("x")
+            read_paths = [
+                str(path)
+                for path, _ in mtree.get_paths_recursive()]
+            self.assertEqual(
+                sorted(read_paths),
+                sorted(set(paths) - {"x"} | {"a/b/new"}))
+
+    def test_batched_listing(self):
+        with tempfile.TemporaryDirectory() as metadata_store:
+
+            subprocess.run(["git", "init", metadata_store])
+
+            mtree = MTreeNode(leaf_class=Text)
+            paths = [
+                f"{first_part}/{second_part}/{third_part}"
+                for first_part in range(5)
+                for second_part in range(3)
+                for third_part in range(2)
+            ]
+            for path in paths:
+                mtree.add_child_at(Text(content=path), MetadataPath(path))
+            reference = mtree.write_out(metadata_store)
+
+            # A mapped root with five unmapped sub-trees
+            mtree = MTreeNode(leaf_class=Text,
+                              realm=metadata_store,
+                              reference=reference)
+            mtree.read_in()
+
+            with mock.patch.object(
+                    mtreenodemapper,
+                    "git_read_trees_recursive",
+                    wraps=mtreenodemapper.git_read_trees_recursive
+            ) as read_trees_recursive, mock.patch(
+                    "dataladmetadatamodel.mapper.gitmapper.gitbackend"
+                    ".subprocess.execute") as execute:
+                read_paths = [
+                    str(path)
+                    for path, _ in mtree.get_paths_recursive()]
+
+            self.assertEqual(read_paths, paths)
+            self.assertEqual(read_trees_recursive.call_count, 1)
+            self.assertEqual(len(read_trees_recursive.call_args[0][1]), 5)
+            execute.assert_not_called()
+
+    def test_listed_objects_are_attached(self):
+        with tempfile.TemporaryDirectory() as metadata_store:
+
+            subprocess.run(["git", "init", metadata_store])
+
+            mtree = MTreeNode(leaf_class=Text)
+            for path in default_paths:
+                mtree.add_child_at(Text(content=path), MetadataPath(path))
+            reference = mtree.write_out(metadata_store)
+
+            # The listed objects are the children of the tree nodes
+            mtree = MTreeNode(leaf_class=Text,
+                              realm=metadata_store,
+                              reference=reference)
+            mtree.read_in()
+            for path, node in mtree.get_paths_recursive():
+                self.assertIs(mtree.get_object_at_path(path), node)
+
+            # Modifications of listed objects are not silently dropped
+            with self.assertRaises(ValueError):
+                for path, node in mtree.get_paths_recursive():
+                    node.read_in()
+                    node.content = "modified"
+                    node.touch()
+
+    def test_direct_lookup(self):
+        with tempfile.TemporaryDirectory() as metadata_store:
+
+            subprocess.run(["git", "init", metadata_store])
+
+            mtree = MTreeNode(leaf_class=Text)
+            for path in default_paths:
+                mtree.add_child_at(
+                    Text(content=f"content of: {path}"),
+                    MetadataPath(path))
+            reference = mtree.write_out(metadata_store)
+
+            for reader in ("subprocess", "native"):
+                mtree = MTreeNode(leaf_class=Text,
+                                  realm=metadata_store,
+                                  reference=reference)
+
+                previous_reader = set_object_reader(reader)
+                try:
+                    with mock.patch.object(
+                            mtreenodemapper,
+                            "git_read_tree_node",
+                            wraps=mtreenodemapper.git_read_tree_node
+                    ) as read_tree_node:
+                        for path in default_paths:
+                            text = mtree.get_object_at_path(
+                                MetadataPath(path),
+                                direct_lookup=True)
+                            self.assertFalse(text.mapped)
+                            self.assertEqual(
+                                text.read_in().content,
+                                f"content of: {path}")
+
+                        sub_tree = mtree.get_object_at_path(
+                            MetadataPath("a/b"),
+                            direct_lookup=True)
+                        self.assertIsInstance(sub_tree, MTreeNode)
+                        self.assertFalse(sub_tree.mapped)
+
+                        for missing_path in ("a/x", "x/y", "a/b/2/3"):
+                            self.assertIsNone(mtree.get_object_at_path(
+                                MetadataPath(missing_path),
+                                direct_lookup=True))
+
+                    # No intermediate node was mapped in
+                    self.assertEqual(read_tree_node.call_count, 0)
+                    self.assertFalse(mtree.mapped)
+
+                    # Mapped nodes are searched in memory
+                    mtree.get_child("a").add_child(
+                        "new",
+                        Text(content="new"))
+                    self.assertEqual(
+                        mtree.get_object_at_path(
+                            MetadataPath("a/new"),
+                            direct_lookup=True).content,
+                        "new")
+                    self.assertEqual(
+                        mtree.get_object_at_path(
+                            MetadataPath("a/b/1"),
+                            direct_lookup=True).read_in().content,
+                        "content of: a/b/1")
+                finally:
+                    set_object_reader(previous_reader)
+
+            # Backends that cannot look up paths map in the nodes
+            mtree = MTreeNode(leaf_class=Text,
+                              realm=metadata_store,
+                              reference=reference)
+            with mock.patch.object(
+                    mtreenodemapper.MTreeNodeGitMapper,
+                    "map_in_object_at_path",
+                    new=Mapper.map_in_object_at_path):
+                self.assertEqual(
+                    mtree.get_object_at_path(
+                        MetadataPath("a/b/1"),
+                        direct_lookup=True).read_in().content,
+                    "content of: a/b/1")
+                self.assertIsNone(mtree.get_object_at_path(
+                    MetadataPath("a/x"),
+                    direct_lookup=True))
+            self.assertTrue(mtree.mapped)
+
+    def test_stored_children(self):
+        with tempfile.TemporaryDirectory() as metadata_store:
+
+            subprocess.run(["git", "init", metadata_store])
+
+            mtree = MTreeNode(leaf_class=Text)
+            for index in range(100):
+                mtree.add_child(f"file_{index}", Text(f"content {index}"))
+            mtree.add_child_at(Text("content x"), MetadataPath("dir/x"))
+            reference = mtree.write_out(metadata_store)
+
+            mtree = MTreeNode(leaf_class=Text,
+                              realm=metadata_store,
+                              reference=reference)
+            mtree.read_in()
+            self.assertEqual(len(mtree.child_nodes), 101)
+            self.assertEqual(mtree.child_nodes.stored_count, 101)
+            self.assertTrue(mtree.is_saved_on(metadata_store))
+
+            # Children are created on access
+            text = mtree.get_child("file_5")
+            self.assertIs(text, mtree.get_child("file_5"))
+            self.assertEqual(text.read_in().content, "content 5")
+            self.assertIsInstance(mtree.get_child("dir"), MTreeNode)
+            self.assertEqual(mtree.child_nodes.stored_count, 99)
+
+            # Modifications of accessed children are written out,
+            # children that were not accessed are written as stored.
+            text.content = "modified"
+            text.touch()
+            self.assertFalse(mtree.is_saved_on(metadata_store))
+            mtree.add_child("new", Text("new"))
+            reference = mtree.write_out(metadata_store)
+            self.assertEqual(mtree.child_nodes.stored_count, 99)
+
+            mtree = MTreeNode(leaf_class=Text,
+                              realm=metadata_store,
+                              reference=reference)
+            self.assertEqual(
+                {
+                    str(path): text.read_in().content
+                    for path, text in mtree.get_paths_recursive()
+                },
+                {
+                    **{
+                        f"file_{index}": f"content {index}"
+                        for index in range(100)
+                    },
+                    "file_5": "modified",
+                    "dir/x": "content x",
+                    "new": "new"
+                })
+
 
 if __name__ == '__main__':
     unittest.main()
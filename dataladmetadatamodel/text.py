@@ -14,6 +14,8 @@ from dataladmetadatamodel.mapper.reference import Reference
 
 class Text(MappableObject):
 
+    __slots__ = ("content",)
+
     def __init__(self,
                  content: Optional[str] = None,
                  realm: Optional[str] = None,
@@ -36,6 +38,9 @@ class Text(MappableObject):
     def purge_impl(self):
         self.content = None
 
+    def estimated_size(self) -> int:
+        return self.base_size + len(self.content or "")
+
     def deepcopy_impl(self,
                       new_mapper_family: Optional[str] = None,
                       new_destination: Optional[str] = None,
@@ -1,13 +1,15 @@
 from typing import (
     Dict,
     Iterable,
-    Optional
+    Optional,
+    Tuple,
 )
 
 from uuid import UUID
 
 from dataladmetadatamodel.mappableobject import MappableObject
 from dataladmetadatamodel.versionlist import VersionList
+from dataladmetadatamodel.mapper.mapper import read_in_many
 from dataladmetadatamodel.mapper.reference import Reference
 
 
@@ -55,6 +57,15 @@ class UUIDSet(MappableObject):
         self.ensure_mapped()
         return self.uuid_set[uuid].read_in()
 
+    def get_version_lists(self) -> Iterable[Tuple[UUID, VersionList]]:
+        """
+        Get all uuids and their version lists. Version lists that are
+        not mapped yet are mapped at once.
+        """
+        self.ensure_mapped()
+        read_in_many(self.uuid_set.values())
+        return self.uuid_set.items()
+
     def unget_version_list(self, uuid):
         """
         Remove a version list from memory. First, persist the
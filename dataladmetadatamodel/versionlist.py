@@ -19,6 +19,9 @@ unknown_version = "unknown"
 
 
 class VersionRecord:
+
+    __slots__ = ("time_stamp", "prefix_path", "element")
+
     def __init__(self,
                  time_stamp: str,
                  prefix_path: Optional[MetadataPath],
@@ -0,0 +1,96 @@
+"""
+Compare the codecs for metadata, version list, and metadata root record blobs
+
+Every codec encodes and decodes the same JSON-objects. The encode and
+decode throughput, and the total size of the encoded blobs are reported
+per codec.
+"""
+import json
+from typing import (
+    Dict,
+    List,
+)
+
+import click
+
+from dataladmetadatamodel import JSONObject
+from dataladmetadatamodel.mapper.gitmapper.codec import codecs
+from dataladmetadatamodel.mapper.reference import Reference
+
+from tools.benchmark.utils import (
+    create_metadata,
+    timed,
+)
+
+
+def create_json_objects(object_count: int) -> Dict[str, List[JSONObject]]:
+    location = "0123456789abcdef0123456789abcdef01234567"
+    return {
+        "metadata": [
+            create_metadata(index).to_json_obj()
+            for index in range(object_count)
+        ],
+        "version list": [
+            [
+                {
+                    "primary_data_version": f"{index:040x}",
+                    "time_stamp": str(1600000000.0 + index),
+                    "path": f"sub-{index}",
+                    "dataset_tree": Reference(
+                        "MetadataRootRecord",
+                        location).to_json_obj()
+                }
+                for index in range(100)
+            ]
+            for _ in range(max(1, object_count // 100))
+        ],
+        "root record": [
+            {
+                "dataset_identifier": "00000000-0000-0000-0000-000000000000",
+                "dataset_version": f"{index:040x}",
+                "dataset_level_metadata": Reference(
+                    "Metadata",
+                    location).to_json_obj(),
+                "file_tree": Reference("MTreeNode", location).to_json_obj()
+            }
+            for index in range(object_count)
+        ]
+    }
+
+
+@click.command()
+@click.option("-n", "--object-count", type=int, default=10000)
+def main(object_count):
+    """
+    Benchmark encoding and decoding with the available codecs
+    """
+    for kind, json_objects in create_json_objects(object_count).items():
+        # Objects are compared in their JSON-representation
+        expected_objects = json.loads(json.dumps(json_objects))
+        for name, codec in codecs.items():
+            results = {}
+            with timed(results, "encode"):
+                blobs = [
+                    codec.encode(json_object)
+                    for json_object in json_objects
+                ]
+            with timed(results, "decode"):
+                decoded_objects = [
+                    codec.decode(blob)
+                    for blob in blobs
+                ]
+            assert decoded_objects == expected_objects
+
+            size = sum(map(len, blobs))
+            megabytes = size / (1024 * 1024)
+            click.echo(
+                f"{kind:12} {name:8}: "
+                f"size {size:10d} bytes, "
+                f"encode {megabytes / results['encode']:7.1f} MB/s "
+                f"({1e6 * results['encode'] / len(blobs):6.1f}us per blob), "
+                f"decode {megabytes / results['decode']:7.1f} MB/s "
+                f"({1e6 * results['decode'] / len(blobs):6.1f}us per blob)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Measure the memory that is used by mapped file trees
+
+A file tree with the given number of entries is written to a temporary
+realm. The leaves refer to metadata blobs by hash, the blobs are not
+written, because the leaves are never read in. The file tree is then
+mapped in, i.e. every tree node is read in and every child is created,
+as often as the given number of versions, as if every version of a
+dataset had the same file tree. The memory that is allocated by the
+mapped trees is measured with tracemalloc, after the object cache was
+cleared.
+"""
+import gc
+import hashlib
+import tempfile
+import tracemalloc
+from pathlib import Path
+from typing import List
+
+import click
+
+from dataladmetadatamodel.filetree import FileTree
+from dataladmetadatamodel.mapper.gitmapper.gitbackend.objectcache import (
+    clear_object_cache,
+)
+from dataladmetadatamodel.mapper.gitmapper.gitbackend.subprocess import (
+    git_save_tree_node,
+    set_object_writer,
+)
+from dataladmetadatamodel.mapper.reference import Reference
+from dataladmetadatamodel.mtreenode import MTreeNode
+
+from tools.benchmark.utils import (
+    create_realm,
+    timed,
+)
+
+
+def create_file_tree(realm: Path, file_count: int, fan_out: int) -> Reference:
+    """
+    Write the tree nodes of a file tree with file_count leaves. The
+    leaves refer to metadata blobs that do not exist.
+    """
+    def fake_hash(index: int) -> str:
+        return hashlib.sha1(f"metadata {index}".encode()).hexdigest()
+
+    previous_writer = set_object_writer("native")
+    try:
+        entries = [
+            ("100644", "blob", fake_hash(index), f"file-{index}.dat")
+            for index in range(file_count)
+        ]
+        while len(entries) > fan_out:
+            entries = [
+                (
+                    "040000",
+                    "tree",
+                    git_save_tree_node(
+                        str(realm),
+                        entries[start:start + fan_out]),
+                    f"d{start // fan_out}"
+                )
+                for start in range(0, len(entries), fan_out)
+            ]
+        return Reference("MTreeNode", git_save_tree_node(str(realm), entries))
+    finally:
+        set_object_writer(previous_writer)
+
+
+def map_file_tree(realm: Path, reference: Reference) -> FileTree:
+    """ Read in every tree node and create every child """
+    file_tree = FileTree(realm=str(realm), reference=reference)
+    file_tree.read_in()
+    pending: List[MTreeNode] = [file_tree.mtree]
+    while pending:
+        mtree_node = pending.pop()
+        mtree_node.read_in()
+        for child in mtree_node.child_nodes.values():
+            if isinstance(child, MTreeNode):
+                pending.append(child)
+    return file_tree
+
+
+@click.command()
+@click.option("-n", "--file-count", type=int, default=1000000)
+@click.option("-f", "--fan-out", type=int, default=100)
+@click.option("-v", "--versions", type=int, default=2)
+def main(file_count, fan_out, versions):
+    """
+    Benchmark the memory usage of mapped file trees
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        realm = Path(temp_dir)
+        create_realm(realm)
+        reference = create_file_tree(realm, file_count, fan_out)
+
+        gc.collect()
+        tracemalloc.start()
+        file_trees = []
+        for version in range(1, versions + 1):
+            results = {}
+            with timed(results, "map"):
+                file_trees.append(map_file_tree(realm, reference))
+            clear_object_cache()
+            gc.collect()
+            size, peak = tracemalloc.get_traced_memory()
+            click.echo(
+                f"{version} mapped file tree(s) of {file_count} entries: "
+                f"{size / (1024 * 1024):7.1f} MiB "
+                f"({size / (version * file_count):6.1f} bytes per entry), "
+                f"peak {peak / (1024 * 1024):7.1f} MiB, "
+                f"mapped in {results['map']:.2f}s")
+        tracemalloc.stop()
+
+
+if __name__ == "__main__":
+    main()
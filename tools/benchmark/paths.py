@@ -0,0 +1,93 @@
+"""
+Measure path-heavy operations on in-memory trees
+
+Path operations, i.e. parsing, joining, hashing, and sorting, are timed
+for MetadataPath and, for comparison, for PurePosixPath. The traversal of
+a deep file tree with get_paths_recursive and the listing of the dataset
+paths of a dataset tree are timed with MetadataPath only.
+"""
+from pathlib import PurePosixPath
+from typing import List
+from uuid import UUID
+
+import click
+
+from dataladmetadatamodel.datasettree import DatasetTree
+from dataladmetadatamodel.metadatapath import MetadataPath
+from dataladmetadatamodel.metadatarootrecord import MetadataRootRecord
+from dataladmetadatamodel.mtreenode import MTreeNode
+from dataladmetadatamodel.text import Text
+
+from tools.benchmark.utils import timed
+
+
+def get_path_strings(path_count: int, depth: int) -> List[str]:
+    return [
+        "/".join(
+            [f"d{(index >> level) & 7}" for level in range(depth - 1)]
+            + [f"file-{index}"])
+        for index in range(path_count)
+    ]
+
+
+def time_path_operations(path_class, path_strings: List[str]) -> dict:
+    results = {}
+    with timed(results, "parse"):
+        paths = [path_class(path_string) for path_string in path_strings]
+    with timed(results, "join"):
+        prefix = path_class("prefix")
+        joined_paths = [prefix / path for path in paths]
+    with timed(results, "str"):
+        for _ in range(3):
+            for path in joined_paths:
+                str(path)
+    with timed(results, "hash"):
+        path_set = set(joined_paths)
+        assert all(path in path_set for path in joined_paths)
+    with timed(results, "sort"):
+        sorted(paths)
+    return results
+
+
+@click.command()
+@click.option("-n", "--path-count", type=int, default=50000)
+@click.option("-d", "--depth", type=int, default=8)
+def main(path_count, depth):
+    """
+    Benchmark path operations and path-heavy tree traversals
+    """
+    path_strings = get_path_strings(path_count, depth)
+    for path_class in (MetadataPath, PurePosixPath):
+        results = time_path_operations(path_class, path_strings)
+        click.echo(
+            f"{path_class.__name__:13}: " + ", ".join(
+                f"{name} {1e6 * duration / path_count:5.2f}us"
+                for name, duration in results.items()))
+
+    results = {}
+    tree = MTreeNode(Text)
+    tree.add_children_at(
+        (MetadataPath(path_string), Text(path_string))
+        for path_string in path_strings)
+    with timed(results, "get_paths_recursive"):
+        count = sum(1 for _ in tree.get_paths_recursive(True))
+
+    dataset_tree = DatasetTree()
+    dataset_count = max(1, path_count // 10)
+    for path_string in path_strings[:dataset_count]:
+        dataset_tree.add_dataset(
+            MetadataPath(path_string),
+            MetadataRootRecord(UUID(int=0), "0" * 40, None, None))
+    with timed(results, "dataset_paths"):
+        dataset_paths = dataset_tree.dataset_paths
+    assert len(dataset_paths) == dataset_count
+
+    click.echo(
+        f"get_paths_recursive: {count} nodes of depth {depth} in "
+        f"{results['get_paths_recursive']:.3f}s, "
+        f"dataset_paths: {dataset_count} datasets in "
+        f"{results['dataset_paths']:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
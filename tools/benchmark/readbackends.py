@@ -0,0 +1,76 @@
+"""
+Compare the subprocess object reader and the native object reader
+
+A file tree with the given number of entries is created in a temporary
+realm. The tree is then read with every object reader, once with loose
+objects and once after the realm was packed with "git gc". The object
+cache is cleared before every run, so that every run reads all objects
+with its reader.
+"""
+import subprocess
+import tempfile
+from pathlib import Path
+
+import click
+
+from dataladmetadatamodel.filetree import FileTree
+from dataladmetadatamodel.mapper.gitmapper.gitbackend.objectcache import (
+    clear_object_cache,
+)
+from dataladmetadatamodel.mapper.gitmapper.gitbackend.subprocess import (
+    object_readers,
+    set_object_reader,
+)
+from dataladmetadatamodel.mapper.reference import Reference
+
+from tools.benchmark.utils import (
+    create_file_tree,
+    create_realm,
+    timed,
+)
+
+
+def read_file_tree(realm: Path, reference: Reference) -> int:
+    file_tree = FileTree(realm=str(realm), reference=reference)
+    count = 0
+    for _, metadata in file_tree.get_paths_recursive():
+        metadata.read_in()
+        list(metadata.extractors)
+        metadata.purge()
+        count += 1
+    return count
+
+
+@click.command()
+@click.option("-n", "--file-count", type=int, default=10000)
+def main(file_count):
+    """
+    Benchmark reading a FileTree with the available object readers
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        realm = Path(temp_dir)
+        create_realm(realm)
+        reference = create_file_tree(realm, file_count)
+
+        for state in ("loose", "packed"):
+            if state == "packed":
+                subprocess.run(
+                    ["git", "-C", str(realm), "gc", "--quiet"],
+                    check=True)
+
+            results = {}
+            for reader in object_readers:
+                set_object_reader(reader)
+                clear_object_cache()
+                with timed(results, reader):
+                    count = read_file_tree(realm, reference)
+                assert count == file_count
+
+            for reader, duration in results.items():
+                click.echo(
+                    f"{state:6} {reader:10}: {duration:8.3f}s "
+                    f"({1e6 * duration / file_count:8.1f}us per file)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import subprocess
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import (
+    Dict,
+    Iterable,
+)
+
+from dataladmetadatamodel.filetree import FileTree
+from dataladmetadatamodel.metadata import (
+    ExtractorConfiguration,
+    Metadata,
+)
+from dataladmetadatamodel.metadatapath import MetadataPath
+from dataladmetadatamodel.mapper.gitmapper.objectreference import flush_object_references
+from dataladmetadatamodel.mapper.reference import Reference
+
+
+@contextmanager
+def timed(results: Dict[str, float], name: str):
+    start_time = time.perf_counter()
+    yield
+    results[name] = time.perf_counter() - start_time
+
+
+def create_realm(realm: Path):
+    subprocess.run(["git", "init", "--quiet", str(realm)], check=True)
+
+
+def get_paths(file_count: int, fan_out: int = 20) -> Iterable[MetadataPath]:
+    for index in range(file_count):
+        yield MetadataPath(
+            f"d{index // (fan_out * fan_out)}/"
+            f"d{(index // fan_out) % fan_out}/"
+            f"file-{index}.dat")
+
+
+def create_metadata(index: int) -> Metadata:
+    metadata = Metadata()
+    metadata.add_extractor_run(
+        1.0,
+        "benchmark_extractor",
+        "benchmark",
+        "benchmark@example.com",
+        ExtractorConfiguration("1.0", {"parameter": "value"}),
+        {"index": index, "content": f"metadata of file {index}"})
+    return metadata
+
+
+def create_file_tree(realm: Path, file_count: int) -> Reference:
+    """ Create a file tree with file_count entries in realm """
+    file_tree = FileTree()
+    for index, path in enumerate(get_paths(file_count)):
+        file_tree.add_metadata(path, create_metadata(index))
+    reference = file_tree.write_out(str(realm))
+    flush_object_references(realm)
+    return reference